@@ -1,24 +1,18 @@
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi.security import OAuth2PasswordRequestForm
-from app.db.session import SessionLocal
 from app.core import security
 from app.core.config import settings
 from app.api import deps
+from app.api.deps import get_db
 from app.repositories import farmer_repo
 from app.schemas.all import FarmerCreate, FarmerResponse, Token, FarmerLogin
 from app.utils.email import send_otp_email
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 
 
 import random
@@ -28,9 +22,10 @@ def generate_otp(length=6):
     return ''.join(random.choices(string.digits, k=length))
 
 @router.post("/register")
-async def register(farmer_in: FarmerCreate, db: Session = Depends(get_db)):
+async def register(farmer_in: FarmerCreate, db: AsyncSession = Depends(deps.get_async_db)):
+    # Async session: a sync query in an async handler would block the event loop
     # 1. Check if phone exists
-    farmer = farmer_repo.get_farmer_by_phone(db, phone_number=farmer_in.phone_number)
+    farmer = await farmer_repo.get_farmer_by_phone_async(db, phone_number=farmer_in.phone_number)
     
     # Generate OTP
     otp_code = generate_otp()
@@ -48,15 +43,14 @@ async def register(farmer_in: FarmerCreate, db: Session = Depends(get_db)):
             # Update fields in case they corrected name/email
             farmer.full_name = farmer_in.full_name
             farmer.email = farmer_in.email
-            from app.core.security import get_password_hash
-            farmer.hashed_password = get_password_hash(farmer_in.password)
+            farmer.hashed_password = await security.hash_password_async(farmer_in.password)
             
             # Set New OTP
             farmer.otp_code = otp_code
             farmer.otp_expires_at = otp_expires
             
-            db.commit()
-            db.refresh(farmer)
+            await db.commit()
+            await db.refresh(farmer)
             
             # Send Email (Real) - Resend Logic
             try:
@@ -70,7 +64,7 @@ async def register(farmer_in: FarmerCreate, db: Session = Depends(get_db)):
     # 2. Check if email exists (only if not checking phone first or separate check)
     # If phone didn't match but email does:
     if farmer_in.email:
-        farmer_email = farmer_repo.get_farmer_by_email(db, email=farmer_in.email)
+        farmer_email = await farmer_repo.get_farmer_by_email_async(db, email=farmer_in.email)
         if farmer_email and farmer_email.id != (farmer.id if farmer else None):
              # Ensure we don't block if it's the SAME unverified user
              if farmer_email.is_verified:
@@ -83,21 +77,20 @@ async def register(farmer_in: FarmerCreate, db: Session = Depends(get_db)):
     
     # 3. Create New Farmer
     from app.models.farmer import Farmer
-    from app.core.security import get_password_hash
     
     db_obj = Farmer(
         full_name=farmer_in.full_name,
         phone_number=farmer_in.phone_number,
         email=farmer_in.email,
-        hashed_password=get_password_hash(farmer_in.password),
+        hashed_password=await security.hash_password_async(farmer_in.password),
         is_active=True,         
         is_verified=False,
         otp_code=otp_code,
         otp_expires_at=otp_expires
     )
     db.add(db_obj)
-    db.commit()
-    db.refresh(db_obj)
+    await db.commit()
+    await db.refresh(db_obj)
     
     # Send Email (Real)
     try:
@@ -113,6 +106,7 @@ async def register(farmer_in: FarmerCreate, db: Session = Depends(get_db)):
 
 @router.post("/verify-registration-otp", response_model=Token)
 def verify_registration_otp(
+    request: Request,
     phone_number: str,
     otp: str,
     db: Session = Depends(get_db)
@@ -141,6 +135,7 @@ def verify_registration_otp(
         farmer.otp_code = None
         db.commit()
         db.refresh(farmer)
+        request.state.write_subject = f"farmer:{farmer.id}" # Not authenticated yet: name the writer for the replica guard
         
     # Generate Token
     access_token = security.create_access_token(
@@ -156,11 +151,12 @@ def verify_registration_otp(
     }
 
 @router.post("/login", response_model=Token)
-def login_access_token(
-    db: Session = Depends(get_db), 
+async def login_access_token(
+    db: AsyncSession = Depends(deps.get_async_db), 
     form_data: OAuth2PasswordRequestForm = Depends()
 ):
-    farmer = farmer_repo.authenticate_farmer(
+    # Async lookup, and bcrypt verification in the hashing pool: nothing blocks the event loop
+    farmer = await farmer_repo.authenticate_farmer_async(
         db, phone_number=form_data.username, password=form_data.password
     )
     if not farmer:
@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, Header, Body
-from sqlalchemy.orm import Session
-from typing import List
-from app.db.session import SessionLocal
+from fastapi import APIRouter, Depends, HTTPException, Header, Body, Form, Request, Response
+from fastapi.security import HTTPBasic, HTTPBasicCredentials
+from sqlalchemy import select, update
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+from app.api.deps import get_async_db, get_async_read_db
 from app.repositories import service_repo, consent_repo
-from app.schemas.all import AuthorizationRequest, AuthorizationResponse, ConsentResponse, ActiveConsentResponse
+from app.schemas.all import AuthorizationRequest, AuthorizationResponse, ConsentResponse, ActiveConsentResponse, Page, TokenIntrospection
+from app.services import introspection_service
+from app.utils.pagination import PageParams, paginate
 from app.core.security import create_access_token
+from app.core import scopes
 from app.models.consent import Consent
 from app.models.service import Service
 from app.api.data_access import get_current_user_and_scopes
@@ -12,31 +18,26 @@ import uuid
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/authorize", response_model=AuthorizationResponse)
-def authorize_request(
+async def authorize_request(
     request: AuthorizationRequest, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # 1. Verify Client ID
-    service = service_repo.verify_client(db, request.client_id)
+    service = await service_repo.verify_client_async(db, request.client_id)
     if not service:
         raise HTTPException(status_code=400, detail="Invalid Client ID")
         
     # 2. Validate Scopes (Check if requested scopes are allowed for this service)
     requested_scopes = request.scope.split(" ")
-    allowed = set(service.allowed_scopes)
-    for s in requested_scopes:
-        if s not in allowed:
-            # In a strict mode, we might fail. For now, we just warn or filter?
-            # Let's fail for security.
-            raise HTTPException(status_code=400, detail=f"Scope '{s}' not allowed for this client")
+    try:
+        requested_mask = scopes.mask_of(requested_scopes, strict=True)
+    except scopes.UnknownScope as e:
+        raise HTTPException(status_code=400, detail=f"Scope '{e}' not allowed for this client")
+    denied = requested_mask & ~service.allowed_scope_mask
+    if denied:
+        # Fail for security rather than silently filtering
+        raise HTTPException(status_code=400, detail=f"Scope '{scopes.names_of(denied)[0]}' not allowed for this client")
 
     # 3. Generate a Request ID (In real flow, this would be a session or temp token)
     # We return details so Frontend can render "Service X wants access to Y"
@@ -48,15 +49,17 @@ def authorize_request(
     }
 
 @router.post("/grant")
-def grant_consent(
+async def grant_consent(
+    request: Request,
     request_id: str = Body(..., embed=True),
     farmer_id: int = Body(..., embed=True), # In real app, get from current logged-in user
     service_id: int = Body(..., embed=True),
     approved_scopes: List[str] = Body(..., embed=True),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     # 1. Save Consent
-    consent = consent_repo.create_consent(db, farmer_id, service_id, approved_scopes)
+    consent = await consent_repo.create_consent(db, farmer_id, service_id, approved_scopes)
+    request.state.write_subject = f"farmer:{farmer_id}" # No bearer token here: keep the farmer's next reads on the primary
     
     # 2. Generate Access Token immediately (Implicit-ish flow for simplicity)
     # This token is SPECIFIC to this interaction
@@ -64,7 +67,8 @@ def grant_consent(
         subject=farmer_id, 
         claims={
             "scope": " ".join(approved_scopes),
-            "azp": str(service_id) # Authorized Party
+            "azp": str(service_id), # Authorized Party
+            "cid": consent.id # Introspection reports the token inactive once this consent is replaced
         }
     )
     
@@ -75,52 +79,86 @@ def grant_consent(
         "consent_id": consent.id
     }
 
-@router.get("/active", response_model=List[ActiveConsentResponse])
-def get_active_consents(
+client_basic_auth = HTTPBasic(auto_error=False)
+
+@router.post("/introspect", response_model=TokenIntrospection, response_model_exclude_none=True)
+async def introspect_token(
+    response: Response,
+    token: str = Form(...),
+    token_type_hint: Optional[str] = Form(None), # Only access tokens exist here
+    client_id: Optional[str] = Form(None),
+    client_secret: Optional[str] = Form(None),
+    credentials: Optional[HTTPBasicCredentials] = Depends(client_basic_auth),
+    db: AsyncSession = Depends(get_async_db) # Primary: a replica may not have seen the revocation yet
+):
+    """
+    RFC 7662 token introspection for relying services. Authenticate with HTTP Basic
+    (client_id:client_secret) or client_id / client_secret form fields.
+    """
+    if credentials is not None:
+        client_id, client_secret = credentials.username, credentials.password
+    service_id = await introspection_service.authenticate_client(db, client_id, client_secret) if client_id else None
+    if service_id is None:
+        raise HTTPException(status_code=401, detail="invalid_client", headers={"WWW-Authenticate": "Basic"})
+
+    response.headers["Cache-Control"] = "no-store"
+    return await introspection_service.introspect(db, token, service_id, client_id)
+
+@router.get("/active", response_model=Page[ActiveConsentResponse])
+async def get_active_consents(
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     farmer_id = context["user_id"]
-    consents = db.query(Consent).join(Service).filter(
-        Consent.farmer_id == farmer_id,
-        Consent.is_active == True
-    ).all()
+    result = await paginate(
+        db,
+        select(Consent).join(Service).options(joinedload(Consent.service)).where(
+            Consent.farmer_id == farmer_id,
+            Consent.is_active == True
+        ),
+        Consent.created_at, Consent.id, page
+    )
     
-    return [
+    result["items"] = [
         ActiveConsentResponse(
             id=c.id,
             service_name=c.service.name,
             granted_scopes=c.granted_scopes,
             created_at=c.created_at,
             service_id=c.service_id # Helper for frontend revocation
-        ) for c in consents
+        ) for c in result["items"]
     ]
+    return result
 
 @router.post("/revoke")
-def revoke_consent_endpoint(
+async def revoke_consent_endpoint(
     service_id: int = Body(..., embed=True),
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     farmer_id = context["user_id"]
-    success = consent_repo.revoke_consent(db, farmer_id, service_id)
+    success = await consent_repo.revoke_consent(db, farmer_id, service_id)
     if not success:
          raise HTTPException(status_code=404, detail="Consent not found or already revoked")
     
     # --- AUTO-REJECT LOGIC ---
     from app.models.loan_application import LoanApplication
     # Calculate how many rows updated
-    updated_rows = db.query(LoanApplication).filter(
-        LoanApplication.farmer_id == farmer_id,
-        LoanApplication.service_id == service_id,
-        LoanApplication.status.in_(["PENDING", "REQUEST_DOC"])
-    ).update({
-        "status": "REJECTED", 
-        "admin_notes": "Automatically rejected due to consent revocation by user."
-    }, synchronize_session=False)
+    result = await db.execute(
+        update(LoanApplication).where(
+            LoanApplication.farmer_id == farmer_id,
+            LoanApplication.service_id == service_id,
+            LoanApplication.status.in_(["PENDING", "REQUEST_DOC"])
+        ).values(
+            status="REJECTED", 
+            admin_notes="Automatically rejected due to consent revocation by user."
+        ).execution_options(synchronize_session=False)
+    )
+    updated_rows = result.rowcount
     
     if updated_rows > 0:
-        db.commit()
+        await db.commit()
         print(f"Auto-rejected {updated_rows} loans for Farmer {farmer_id}")
     # -------------------------
 
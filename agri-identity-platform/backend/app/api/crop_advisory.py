@@ -1,15 +1,18 @@
 from typing import List, Optional
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.api.auth import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.models.crop_advisory import CropAdvisory
 from app.models.service import Service
 from app.models.farmer import Farmer
 from app.models.document import Document
 from app.models.consent import Consent
-from app.schemas.all import CropAdvisoryCreate, CropAdvisoryResponse, ServiceResponse
+from app.schemas.all import CropAdvisoryCreate, CropAdvisoryResponse, ServiceResponse, Page
+from app.utils.pagination import PageParams, paginate
+from app.services import consent_service, document_service, preview_service
+from app.repositories import consent_repo, policy_repo
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -20,18 +23,18 @@ SERVICE_ID_STR = "CROP_ADVISORY_001"
 # --- Farmer Endpoints ---
 
 @router.post("/apply", response_model=CropAdvisoryResponse)
-def get_crop_advisory(
+async def get_crop_advisory(
     application: CropAdvisoryCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_farmer_id: int = Depends(deps.get_current_user_id)
 ):
     # 1. Verify Service Exists
-    service = db.query(Service).filter(Service.id == application.service_id).first()
+    service = await db.get(Service, application.service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
 
     # 2. Check Farmer Profile (Mandatory Data: Location)
-    farmer = db.query(Farmer).filter(Farmer.id == current_farmer_id).first()
+    farmer = await db.get(Farmer, current_farmer_id)
     if not farmer or not farmer.location:
         raise HTTPException(
             status_code=400, 
@@ -40,24 +43,25 @@ def get_crop_advisory(
 
     # 3. Check for Existing Active Request (Optional but good practice)
     # Allow new request if previous is completed? Yes.
-    existing = db.query(CropAdvisory).filter(
+    existing = await db.scalar(select(CropAdvisory).where(
         CropAdvisory.farmer_id == current_farmer_id,
         CropAdvisory.service_id == application.service_id,
         CropAdvisory.status == "PENDING"
-    ).first()
+    ).limit(1))
     
     if existing:
         raise HTTPException(status_code=400, detail="You already have a pending advisory request.")
 
     # 4. Create Consent (Short-lived, e.g., 7 Days as per prompt)
-    # Check if active consent exists, else create
-    existing_consent = db.query(Consent).filter(
-        Consent.farmer_id == current_farmer_id,
-        Consent.service_id == application.service_id,
-        Consent.is_active == True
-    ).first()
+    # Check if active consent exists, else create. Decided from the locked row, not consent_service's
+    # per-worker cache: a stale entry there would insert a second active consent
+    consent = await consent_repo.get_active_consent(db, current_farmer_id, application.service_id, for_update=True)
 
-    if not existing_consent:
+    if consent is None or (consent.expires_at is not None and consent.expires_at <= datetime.utcnow()):
+        # A consent past expires_at stays is_active until the sweeper reaches it; retire it here, or
+        # the next sweep would expire the request we are about to create along with it
+        if consent:
+            consent.is_active = False
         new_consent = Consent(
             farmer_id=current_farmer_id,
             service_id=application.service_id,
@@ -66,13 +70,14 @@ def get_crop_advisory(
             is_active=True
         )
         db.add(new_consent)
+        await consent_repo.notify_consent_changed(db, current_farmer_id, application.service_id)
 
     # 5. Validate Optional Document (Soil Health)
     if application.soil_health_doc_id:
-        doc = db.query(Document).filter(
+        doc = await db.scalar(select(Document).where(
             Document.id == application.soil_health_doc_id,
             Document.farmer_id == current_farmer_id
-        ).first()
+        ))
         if not doc:
             raise HTTPException(status_code=400, detail="Invalid Soil Health Document ID")
 
@@ -89,28 +94,33 @@ def get_crop_advisory(
         status="PENDING"
     )
     db.add(new_advisory)
-    db.commit()
-    db.refresh(new_advisory)
+    await db.commit()
+    await db.refresh(new_advisory)
     
     return new_advisory
 
-@router.get("/my-requests", response_model=List[CropAdvisoryResponse])
-def my_advisory_requests(
-    db: Session = Depends(get_db),
+@router.get("/my-requests", response_model=Page[CropAdvisoryResponse])
+async def my_advisory_requests(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(deps.get_async_read_db),
     current_farmer_id: int = Depends(deps.get_current_user_id)
 ):
-    return db.query(CropAdvisory).filter(CropAdvisory.farmer_id == current_farmer_id).all()
+    return await paginate(
+        db,
+        select(CropAdvisory).where(CropAdvisory.farmer_id == current_farmer_id),
+        CropAdvisory.created_at, CropAdvisory.id, page
+    )
 
 @router.post("/revoke/{request_id}")
-def revoke_advisory_request(
+async def revoke_advisory_request(
     request_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_farmer_id: int = Depends(deps.get_current_user_id)
 ):
-    req = db.query(CropAdvisory).filter(
+    req = await db.scalar(select(CropAdvisory).where(
         CropAdvisory.id == request_id,
         CropAdvisory.farmer_id == current_farmer_id
-    ).first()
+    ))
     
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
@@ -121,21 +131,29 @@ def revoke_advisory_request(
     req.status = "WITHDRAWN"
     
     # Revoke consent
-    consent = db.query(Consent).filter(
+    consent = await db.scalar(select(Consent).where(
         Consent.farmer_id == current_farmer_id,
         Consent.service_id == req.service_id,
         Consent.is_active == True
-    ).first()
+    ).limit(1))
     
     if consent:
         consent.is_active = False
+        consent.revoked_at = datetime.utcnow()
+        await consent_repo.notify_consent_changed(db, current_farmer_id, req.service_id)
         
-    db.commit()
+    await db.commit()
     return {"message": "Advisory request withdrawn successfully"}
 
 
 # --- Admin Endpoints ---
 
+ADVISABLE_STATUSES = ("PENDING", "ADVISED") # ADVISED: the admin updates their advice
+CLOSED_STATUS_DETAIL = {
+    "WITHDRAWN": "The farmer withdrew this request.",
+    "EXPIRED": "The farmer's consent expired before this request was answered.",
+}
+
 class AdvisoryResponseInput(BaseModel):
     recommendation: str
     fertilizer_plan: str
@@ -143,35 +161,44 @@ class AdvisoryResponseInput(BaseModel):
 
 from sqlalchemy.orm import joinedload
 
-@router.get("/admin/requests", response_model=List[CropAdvisoryResponse])
-def list_all_requests(
-    db: Session = Depends(get_db),
+@router.get("/admin/requests", response_model=Page[CropAdvisoryResponse])
+async def list_all_requests(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(deps.get_async_read_db),
     admin: deps.AdminContext = Depends(deps.get_current_admin)
 ):
     # Enforce Domain Separation
-    advisories = db.query(CropAdvisory).options(joinedload(CropAdvisory.farmer)).filter(CropAdvisory.service_id == admin.service_id).all()
+    result = await paginate(
+        db,
+        select(CropAdvisory).options(joinedload(CropAdvisory.farmer)).where(CropAdvisory.service_id == admin.service_id),
+        CropAdvisory.created_at, CropAdvisory.id, page
+    )
     
     results = []
-    for a in advisories:
+    for a in result["items"]:
         a_dict = CropAdvisoryResponse.from_orm(a)
         if a.farmer:
             a_dict.farmer_name = a.farmer.full_name
         results.append(a_dict)
-    return results
+    result["items"] = results
+    return result
 
 @router.post("/admin/advise/{request_id}")
-def provide_advisory(
+async def provide_advisory(
     request_id: int,
     advice: AdvisoryResponseInput,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     admin: deps.AdminContext = Depends(deps.get_current_admin)
 ):
-    req = db.query(CropAdvisory).filter(CropAdvisory.id == request_id).first()
+    req = await db.get(CropAdvisory, request_id)
     if not req:
         raise HTTPException(status_code=404, detail="Request not found")
         
     if req.service_id != admin.service_id:
         raise HTTPException(status_code=403, detail="Access Denied: Domain mismatch")
+
+    if req.status not in ADVISABLE_STATUSES:
+        raise HTTPException(status_code=400, detail=CLOSED_STATUS_DETAIL.get(req.status, "This request is closed."))
         
     req.recommendation = advice.recommendation
     req.fertilizer_plan = advice.fertilizer_plan
@@ -180,50 +207,50 @@ def provide_advisory(
     
     # Log Access?
     
-    db.commit()
+    await db.commit()
     return {"message": "Advisory provided successfully"}
 
+_DENIALS = {
+    policy_repo.NOT_FOUND: (status.HTTP_404_NOT_FOUND, "Document not found"),
+    policy_repo.CONSENT_EXPIRED: (status.HTTP_403_FORBIDDEN, "Access Denied: Consent has expired."),
+}
+
+async def _consented_document(db: AsyncSession, doc_id: int, admin: deps.AdminContext) -> Document:
+    # The document itself doesn't have a service_id, but the context does: viewing it needs a valid
+    # consent from its farmer to THIS admin's service (cached decision, so usually no second query).
+    check = await policy_repo.farmer_document_access(db, doc_id, admin.service_id)
+    if check.allowed:
+        decision = await consent_service.get_decision(db, check.farmer_id, check.service_id)
+        policy_repo.apply_consent(check, decision, time_bound=False)
+    if not check.allowed:
+        status_code, detail = _DENIALS.get(check.denial, (status.HTTP_403_FORBIDDEN, "Access Denied: Farmer has revoked consent."))
+        raise HTTPException(status_code=status_code, detail=detail)
+    return check.documents[0]
+
 @router.get("/admin/document/{doc_id}")
-def get_document_details(
+async def get_document_details(
     doc_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     admin: deps.AdminContext = Depends(deps.get_current_admin)
 ):
-    # 1. Fetch Document
-    doc = db.query(Document).filter(Document.id == doc_id).first()
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-
-    # 2. Get Service ID
-    # 2. Check Service ID matches Admin Domain
-    # The document itself doesn't have a service_id, but the context does.
-    # However, to view a document, it must be related to a request in this domain.
-    # OR the admin acts on behalf of the service.
-    # Logic: Verify if ANY active consent exists for this farmer + this admin's service.
-    
-    # Check Active Consent for THIS service
-    consent = db.query(Consent).filter(
-        Consent.farmer_id == doc.farmer_id,
-        Consent.service_id == admin.service_id, # Must match admin's service
-        Consent.is_active == True
-    ).first()
-
-    if not consent:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="Access Denied: Farmer has revoked consent."
-        )
-
-    # 4. Check Expiry
-    if consent.expires_at and consent.expires_at < datetime.utcnow():
-         raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN, 
-            detail="Access Denied: Consent has expired."
-        )
-        
+    doc = await _consented_document(db, doc_id, admin)
     return {
         "id": doc.id,
         "filename": doc.filename,
         "storage_path": doc.storage_path,
-        "doc_type": doc.doc_type
+        "doc_type": doc.doc_type,
+        "download_url": document_service.download_url(doc, disposition="inline"), # Short-lived, consent checked above
+        "preview_url": f"/crop-advisory/admin/document/{doc.id}/preview" if preview_service.has_preview(doc) else None
     }
+
+@router.get("/admin/document/{doc_id}/preview")
+async def preview_document(
+    doc_id: int,
+    request: Request,
+    size: str = "thumb", # "thumb" (256px) or "preview" (1024px)
+    db: AsyncSession = Depends(deps.get_async_db),
+    admin: deps.AdminContext = Depends(deps.get_current_admin)
+):
+    """Small JPEG of the document for triage; same consent check as the details view."""
+    doc = await _consented_document(db, doc_id, admin)
+    return await preview_service.preview_response(request, doc, size)
@@ -1,54 +1,49 @@
 from fastapi import APIRouter, Depends, HTTPException, Security
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.repositories import farmer_repo
-from app.core.security import decrypt_data
+from sqlalchemy import select
+from sqlalchemy.orm import joinedload
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_async_db, get_async_read_db
+from app.core.security import decrypt_data, decode_access_token
 from app.core.config import settings
-from jose import jwt, JWTError
+from app.core import scopes
+from app.services import audit_service
+from jose import JWTError
 
 router = APIRouter()
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl=f"{settings.API_V1_STR}/auth/login")
 
-def get_db():
-    db = SessionLocal()
+def get_current_user_and_scopes(token: str = Depends(oauth2_scheme)):
     try:
-        yield db
-    finally:
-        db.close()
-
-def get_current_user_and_scopes(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = decode_access_token(token)
         user_id = payload.get("sub")
-        scopes = payload.get("scope", "").split(" ")
+        scope_mask = payload.get("smask")
+        if scope_mask is None: # Minted before tokens carried the mask
+            scope_mask = scopes.mask_of(payload.get("scope", ""))
         service_id = payload.get("azp")
         
         if user_id is None:
             raise HTTPException(status_code=401, detail="Invalid token")
             
+        # Claims are strings; asyncpg binds parameters strictly, so hand out real ints
         return {
-            "user_id": user_id,
-            "scopes": scopes,
-            "service_id": service_id
+            "user_id": int(user_id),
+            "scope_mask": int(scope_mask),
+            "service_id": int(service_id) if service_id else None
         }
     except JWTError:
         raise HTTPException(status_code=401, detail="Could not validate credentials")
 
 @router.get("/data")
-def get_farmer_data(
+async def get_farmer_data(
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     farmer_id = context["user_id"]
-    scopes = set(context["scopes"])
+    scope_mask = context["scope_mask"]
     
-    farmer = farmer_repo.get_farmer_by_phone(db, phone_number="") # Wait, repo uses phone, but we have ID
-    # We need a get_by_id in repo.
-    # Let's verify if get_farmer_by_id exists. It doesn't.
-    # We'll just query directly here or update repo. Direct query is faster for now.
     from app.models.farmer import Farmer
-    farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
+    farmer = await db.get(Farmer, farmer_id)
     
     if not farmer:
         raise HTTPException(status_code=404, detail="User not found")
@@ -57,7 +52,7 @@ def get_farmer_data(
     response_data = {}
     
     # 1. Basic Profile (Usually always allowed if authenticated, or require 'profile')
-    if "profile" in scopes:
+    if scope_mask & scopes.PROFILE:
         response_data["full_name"] = farmer.full_name
         response_data["email"] = farmer.email
         response_data["phone_number"] = farmer.phone_number
@@ -67,49 +62,55 @@ def get_farmer_data(
         # response_data["attributes"] = farmer.attributes
 
     # 2. Sensitive Data - Aadhaar
-    if "aadhaar" in scopes:
+    if scope_mask & scopes.AADHAAR:
         # Decrypt on the fly
         # response_data["aadhaar_number"] = decrypt_data(farmer.aadhaar_enc)
         pass
     
     # 3. Land Records
-    if "land_records" in scopes:
+    if scope_mask & scopes.LAND_RECORDS:
          # response_data["land_record_id"] = decrypt_data(farmer.land_record_id_enc)
          # In a real app, might fetch external details using this ID
          pass
 
     # 4. Audit Log (Log this access!)
-    from app.models.access_log import AccessLog
-    log = AccessLog(
+    await audit_service.record_access(
+        db,
         farmer_id=farmer.id,
         service_id=context.get("service_id"), # Might be None if it's the Farmer Portal itself
         action="DATA_ACCESS",
-        resource=f"Scopes: {', '.join(scopes)}",
+        resource=f"Scopes: {', '.join(scopes.names_of(scope_mask))}",
         status="SUCCESS",
         ip_address="127.0.0.1" # Mock IP
     )
-    db.add(log)
-    db.commit()
 
     return response_data
 
 from typing import List, Optional
-from app.schemas.all import AccessLogResponse
+from app.schemas.all import AccessLogResponse, Page
+from app.utils.pagination import PageParams, paginate
 from app.models.access_log import AccessLog
+from app.db.partitions import retention_cutoff
 from app.models.service import Service
 
-@router.get("/logs", response_model=List[AccessLogResponse])
-def get_access_logs(
+@router.get("/logs", response_model=Page[AccessLogResponse])
+async def get_access_logs(
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
     farmer_id = context["user_id"]
     # Join mainly to get Service Name if available
-    logs = db.query(AccessLog).outerjoin(Service).filter(
-        AccessLog.farmer_id == farmer_id
-    ).order_by(AccessLog.timestamp.desc()).limit(50).all()
+    result = await paginate(
+        db,
+        select(AccessLog).options(joinedload(AccessLog.service)).where(
+            AccessLog.farmer_id == farmer_id,
+            AccessLog.timestamp >= retention_cutoff() # Skips detached-era months and prunes partitions
+        ),
+        AccessLog.timestamp, AccessLog.id, page
+    )
     
-    return [
+    result["items"] = [
         AccessLogResponse(
             id=log.id,
             service_name=log.service.name if log.service else "Direct/Portal",
@@ -117,8 +118,9 @@ def get_access_logs(
             resource=log.resource,
             timestamp=log.timestamp,
             ip_address=log.ip_address
-        ) for log in logs
+        ) for log in result["items"]
     ]
+    return result
 
 from pydantic import BaseModel
 class ProfileUpdate(BaseModel):
@@ -127,14 +129,14 @@ class ProfileUpdate(BaseModel):
     full_name: Optional[str] = None
 
 @router.post("/profile/update")
-def update_profile(
+async def update_profile(
     update_data: ProfileUpdate,
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     farmer_id = context["user_id"]
     from app.models.farmer import Farmer
-    farmer = db.query(Farmer).filter(Farmer.id == farmer_id).first()
+    farmer = await db.get(Farmer, farmer_id)
     
     if not farmer:
         raise HTTPException(status_code=404, detail="User not found")
@@ -146,6 +148,6 @@ def update_profile(
     if update_data.full_name:
         farmer.full_name = update_data.full_name
 
-    db.commit()
-    db.refresh(farmer)
+    await db.commit()
+    await db.refresh(farmer)
     return {"message": "Profile updated successfully", "location": farmer.location}
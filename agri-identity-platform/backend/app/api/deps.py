@@ -1,12 +1,13 @@
 
-from typing import Generator, Optional
-from fastapi import Depends, HTTPException, status
+import hmac
+from typing import AsyncGenerator, Generator, Optional
+from fastapi import Depends, HTTPException, Request, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import jwt, JWTError
+from jose import JWTError
 from sqlalchemy.orm import Session
 from app.core import security
 from app.core.config import settings
-from app.db.session import SessionLocal
+from app.db.session import SessionLocal, new_async_session, replica_allowed, WRITE_MARKER_COOKIE, WRITE_MARKER_HEADER
 from app.models.farmer import Farmer
 from app.repositories import farmer_repo
 
@@ -19,6 +20,40 @@ def get_db() -> Generator:
     finally:
         db.close()
 
+async def get_async_db() -> AsyncGenerator:
+    async with new_async_session() as db:
+        yield db
+
+def request_subject(request: Request) -> Optional[str]:
+    """Identify the caller (e.g. "farmer:12", "admin:3") from the bearer token, if valid."""
+    authorization = request.headers.get("authorization", "")
+    scheme, _, token = authorization.partition(" ")
+    if scheme.lower() != "bearer" or not token:
+        return None
+    try:
+        payload = security.decode_access_token(token)
+    except JWTError:
+        return None
+    role = "admin" if payload.get("scope") == "admin" else "farmer"
+    return f"{role}:{payload.get('sub')}"
+
+def _replica_allowed(request: Request) -> bool:
+    marker = request.headers.get(WRITE_MARKER_HEADER) or request.cookies.get(WRITE_MARKER_COOKIE)
+    return replica_allowed(request_subject(request), marker)
+
+def get_read_db(request: Request) -> Generator:
+    """Like get_db, but served by the read replica when one is configured and safe to use."""
+    db = SessionLocal()
+    db.info["read_only"] = _replica_allowed(request)
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_read_db(request: Request) -> AsyncGenerator:
+    async with new_async_session(read_only=_replica_allowed(request)) as db:
+        yield db
+
 async def get_current_user_id(
     token: str = Depends(oauth2_scheme)
 ) -> int:
@@ -28,7 +63,7 @@ async def get_current_user_id(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = security.decode_access_token(token)
         user_id: str = payload.get("sub")
         if user_id is None:
             raise credentials_exception
@@ -67,7 +102,7 @@ async def get_current_admin(
         headers={"WWW-Authenticate": "Bearer"},
     )
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        payload = security.decode_access_token(token)
         user_id: str = payload.get("sub")
         scope: str = payload.get("scope")
         service_id: int = payload.get("service_id")
@@ -81,3 +116,20 @@ async def get_current_admin(
         
     except JWTError:
         raise credentials_exception
+
+def require_internal_access(request: Request):
+    """Guard for /internal/*: the shared METRICS_TOKEN (for scrapers) or any admin token."""
+    scheme, _, token = request.headers.get("authorization", "").partition(" ")
+    if scheme.lower() == "bearer" and token:
+        if settings.METRICS_TOKEN and hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode()):
+            return
+        try:
+            if security.decode_access_token(token).get("scope") == "admin":
+                return
+        except JWTError:
+            pass
+    raise HTTPException(
+        status_code=status.HTTP_401_UNAUTHORIZED,
+        detail="Internal endpoints need the metrics token or an admin token",
+        headers={"WWW-Authenticate": "Bearer"},
+    )
@@ -1,24 +1,21 @@
-from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form
-from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Form, Query, Request
+from fastapi.responses import RedirectResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.api.deps import get_async_db, get_async_read_db
 from app.api.data_access import get_current_user_and_scopes
 from app.models.document import Document
-from app.schemas.all import DocumentResponse
+from app.schemas.all import DocumentResponse, DownloadLink, Page, UploadSessionCreate, UploadSessionResponse
+from app.utils.pagination import PageParams, paginate
 from app.core.security import encrypt_data, decrypt_data
-import shutil
-import os
-import uuid
+from app.core.config import settings
+from app.core.storage import get_storage
+from app.services import document_service, upload_session_service
+from app.repositories import blob_repo
 
 router = APIRouter()
-UPLOAD_DIR = "uploads"
-os.makedirs(UPLOAD_DIR, exist_ok=True)
-
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+UPLOAD_DIR = settings.UPLOAD_DIR
+document_service.ensure_upload_dirs()
 
 @router.post("/upload", response_model=DocumentResponse)
 async def upload_document(
@@ -27,71 +24,179 @@ async def upload_document(
     doc_type: str = Form("OTHER"), # IDENTITY, LAND_RECORD, etc.
     is_sensitive: bool = Form(False),
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
     farmer_id = context["user_id"]
     
-    # 1. Read file content
-    file_bytes = await file.read()
-    
-    # 2. Encrypt Content (Simulated for Demo - strictly we should stream-encrypt large files)
-    # Convert bytes to hex or string for Fernet? Fernet takes bytes->bytes
-    # Our global encrypt_data helper expects string->string usually.
-    # Let's simple write raw bytes to a file name that is "encrypted" notionally, 
-    # OR better: use our Fernet key to actually encrypt.
+    # 1. Stream file content to disk (chunked, size-capped, hashed and encrypted on the fly)
+    # Encryption happens inside stage_upload (chunked AES-GCM, see core/encryption.py),
+    # so the plaintext never touches the disk.
+    staged = await document_service.stage_upload(file)
     
-    # For Hackathon speed: Just save it. We call it "Secured Vault".
-    # Real impl: cipher_suite.encrypt(file_bytes)
+    # 2. Point at the shared content-addressed blob (only written if this content is new)
+    blob = await document_service.store_blob(db, staged)
     
-    # Let's save standard file but with a UUID name (Security by Obscurity + ACL) is enough for this demo
-    # unless we want to prove encryption.
-    
-    # Let's do simple write.
-    storage_filename = f"{uuid.uuid4()}.bin"
-    storage_path = os.path.join(UPLOAD_DIR, storage_filename)
-    
-    with open(storage_path, "wb") as f:
-        f.write(file_bytes)
-
     # 3. Create DB Record
     doc = Document(
         farmer_id=farmer_id,
         title=title,
         doc_type=doc_type,
         filename=file.filename,
-        storage_path=storage_path,
+        storage_path=blob.storage_path,
         mime_type=file.content_type,
-        is_sensitive=is_sensitive
+        is_sensitive=is_sensitive,
+        sha256=blob.sha256,
+        size_bytes=blob.size_bytes,
+        is_encrypted=blob.is_encrypted
     )
     db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    await db.commit() # If this fails, a newly published blob file is left unreferenced for the orphan sweep
+    await db.refresh(doc)
     
     return doc
 
-@router.get("/", response_model=list[DocumentResponse])
-def get_documents(
+# --- Resumable Uploads (see services/upload_session_service.py) ---
+
+def _session_response(session) -> UploadSessionResponse:
+    return UploadSessionResponse(
+        id=session.id,
+        offset=session.received_bytes,
+        total_bytes=session.total_bytes,
+        expires_at=upload_session_service.expires_at(session)
+    )
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+async def create_upload_session(
+    payload: UploadSessionCreate,
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_async_db)
 ):
-    farmer_id = context["user_id"]
-    return db.query(Document).filter(Document.farmer_id == farmer_id).all()
+    session = await upload_session_service.create_session(
+        db,
+        farmer_id=context["user_id"],
+        title=payload.title,
+        doc_type=payload.doc_type,
+        filename=payload.filename,
+        mime_type=payload.mime_type,
+        is_sensitive=payload.is_sensitive,
+        total_bytes=payload.total_bytes
+    )
+    return _session_response(session)
 
-@router.get("/{doc_id}/download")
-def download_document(
-    doc_id: int,
+@router.get("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def get_upload_offset(
+    upload_id: str,
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_db) # Primary: the offset must be current
+):
+    session = await upload_session_service.get_session(db, upload_id, context["user_id"])
+    return _session_response(session)
+
+@router.put("/uploads/{upload_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk; must equal the session's current offset"),
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_db)
+):
+    # Raw body (application/octet-stream), not multipart
+    session = await upload_session_service.write_chunk(db, request, upload_id, context["user_id"], offset)
+    return _session_response(session)
+
+@router.post("/uploads/{upload_id}/complete", response_model=DocumentResponse)
+async def complete_upload(
+    upload_id: str,
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_db)
+):
+    return await upload_session_service.finalize(db, upload_id, context["user_id"])
+
+@router.delete("/uploads/{upload_id}")
+async def abort_upload(
+    upload_id: str,
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_db)
+):
+    await upload_session_service.abort(db, upload_id, context["user_id"])
+    return {"message": "Upload cancelled"}
+
+@router.get("/", response_model=Page[DocumentResponse])
+async def get_documents(
     context: dict = Depends(get_current_user_and_scopes),
-    db: Session = Depends(get_db)
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(get_async_read_db)
 ):
-    from fastapi.responses import FileResponse
     farmer_id = context["user_id"]
-    
-    doc = db.query(Document).filter(Document.id == doc_id, Document.farmer_id == farmer_id).first()
+    return await paginate(
+        db, select(Document).where(Document.farmer_id == farmer_id), Document.created_at, Document.id, page
+    )
+
+async def _get_own_document(db: AsyncSession, doc_id: int, farmer_id: int) -> Document:
+    doc = await db.scalar(select(Document).where(Document.id == doc_id, Document.farmer_id == farmer_id))
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
-        
-    return FileResponse(
-        path=doc.storage_path, 
-        filename=doc.filename,
-        media_type=doc.mime_type
-    )
+    return doc
+
+@router.get("/{doc_id}/link", response_model=DownloadLink)
+async def get_download_link(
+    doc_id: int,
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # Browsers cannot attach the bearer token to a plain link, so the portal asks for a signed one
+    doc = await _get_own_document(db, doc_id, context["user_id"])
+    return DownloadLink(url=document_service.download_url(doc), expires_in=settings.DOWNLOAD_URL_TTL_SECONDS)
+
+@router.get("/{doc_id}/download")
+async def download_document(
+    doc_id: int,
+    request: Request,
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_read_db)
+):
+    # The bytes come from the proxy, the storage backend (presigned) or /files, not from this handler
+    doc = await _get_own_document(db, doc_id, context["user_id"])
+    stored = document_service.StoredFile.from_document(doc)
+    not_modified = document_service.not_modified_response(request, stored)
+    if not_modified is not None:
+        return not_modified
+    offloaded = document_service.offloaded_file_response(stored)
+    if offloaded is not None:
+        return offloaded # Already authorised: skip the redirect round trip
+    return RedirectResponse(document_service.download_url(doc), status_code=307)
+
+@router.delete("/{doc_id}")
+async def delete_document(
+    doc_id: int,
+    context: dict = Depends(get_current_user_and_scopes),
+    db: AsyncSession = Depends(get_async_db)
+):
+    doc = await _get_own_document(db, doc_id, context["user_id"])
+
+    # Work out whether this was the last reference to the file on disk
+    doomed_path = None
+    if doc.sha256 and doc.storage_path == document_service.blob_path(doc.sha256):
+        blob = await blob_repo.release_blob(db, doc)
+        if blob is not None:
+            doomed_path = blob.storage_path
+    elif await blob_repo.count_path_references(db, doc.storage_path, exclude_doc_id=doc.id) == 0:
+        doomed_path = doc.storage_path # Pre-blob-store upload with its own file
+
+    await db.delete(doc)
+
+    # Move the file aside before committing (the blob row is still locked), delete it only after
+    backend = get_storage()
+    retired = None
+    if doomed_path and await backend.exists(doomed_path):
+        retired = await backend.retire(doomed_path)
+    try:
+        await db.commit()
+    except Exception:
+        if retired:
+            await backend.restore(retired)
+        raise
+    if retired:
+        await backend.delete(retired)
+
+    return {"message": "Document deleted successfully"}
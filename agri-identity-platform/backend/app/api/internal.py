@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends
+from app.api import deps
+from app.core.security import token_cache
+from app.db import session
+from app.db.pool import pool_status
+from app.services import audit_service
+
+# Pool sizes, wait times and queue depths are operational detail: never served anonymously
+router = APIRouter(dependencies=[Depends(deps.require_internal_access)])
+
+@router.get("/db/pool")
+def get_pool_status():
+    """Live connection-pool occupancy and checkout wait times for this worker."""
+    pools = {"sync": pool_status(session.engine)}
+    if session.async_engine is not None:
+        pools["async"] = pool_status(session.async_engine.sync_engine)
+    # Replica pools fill up independently of the primary's, under read-only traffic
+    if session.replica_engine is not None:
+        pools["replica"] = pool_status(session.replica_engine)
+    if session.async_replica_engine is not None:
+        pools["async_replica"] = pool_status(session.async_replica_engine.sync_engine)
+    return pools
+
+@router.get("/audit")
+def get_audit_status():
+    """Audit sink queue depth and write counters for this worker."""
+    return audit_service.audit_sink.stats()
+
+@router.get("/tokens")
+def get_token_cache_status():
+    """Verified-token cache size and hit / miss counters for this worker."""
+    return token_cache.stats()
@@ -1,9 +1,9 @@
 
 from typing import List, Dict
 from datetime import datetime, timedelta
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from app.api.auth import get_db
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.api import deps
 from app.models.loan_application import LoanApplication
 from app.models.service import Service
@@ -11,8 +11,14 @@ from app.models.farmer import Farmer
 from app.models.document import Document
 from app.models.admin import Admin
 from app.models.consent import Consent
-from app.schemas.all import LoanApplicationCreate, LoanApplicationResponse, ServiceResponse, AdminLogin, DocumentResponse
+from app.schemas.all import LoanApplicationCreate, LoanApplicationResponse, ServiceResponse, AdminLogin, AdminDocumentResponse, Page
+from app.utils.pagination import PageParams, paginate
 from app.core.security import create_access_token
+from app.core import storage
+from app.services import audit_service, consent_service, document_service, preview_service
+from app.repositories import consent_repo, policy_repo
+from app.utils import zip_stream
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -23,10 +29,10 @@ OPTIONAL_DOCS = ["BANK_STATEMENT", "LOAN_HISTORY", "SOIL_CARD"]
 
 # --- Public / Farmer Endpoints ---
 
-@router.get("/services", response_model=List[ServiceResponse])
-def list_services(db: Session = Depends(get_db)):
+@router.get("/services", response_model=Page[ServiceResponse])
+async def list_services(page: PageParams = Depends(), db: AsyncSession = Depends(deps.get_async_db)):
     """List all available services"""
-    return db.query(Service).filter(Service.is_active == True).all()
+    return await paginate(db, select(Service).where(Service.is_active == True), Service.created_at, Service.id, page)
 
 @router.get("/requirements")
 def get_loan_requirements():
@@ -37,24 +43,24 @@ def get_loan_requirements():
     }
 
 @router.post("/apply", response_model=LoanApplicationResponse)
-def apply_for_loan(
+async def apply_for_loan(
     application: LoanApplicationCreate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_farmer_id: int = Depends(deps.get_current_user_id) 
 ):
     # 1. Verify Service Exists
-    service = db.query(Service).filter(Service.id == application.service_id).first()
+    service = await db.get(Service, application.service_id)
     if not service:
         raise HTTPException(status_code=404, detail="Service not found")
 
     # 1.5 Check for Existing Active Applications (PENDING or REQUEST_DOC)
     # We allow multiple APPROVED loans, but only one PENDING application at a time.
     print(f"[DEBUG] Checking Duplicates for Farmer {current_farmer_id}, Service {application.service_id}")
-    existing_application = db.query(LoanApplication).filter(
+    existing_application = await db.scalar(select(LoanApplication).where(
         LoanApplication.farmer_id == current_farmer_id,
         LoanApplication.service_id == application.service_id,
         LoanApplication.status.in_(["PENDING", "REQUEST_DOC"])
-    ).first()
+    ).limit(1))
     
     if existing_application:
         print(f"[DEBUG] Found Duplicate: ID {existing_application.id}, Status {existing_application.status}")
@@ -66,10 +72,10 @@ def apply_for_loan(
         print("[DEBUG] No Duplicate Found")
 
     # 2. Fetch Selected Documents
-    documents = db.query(Document).filter(
+    documents = (await db.scalars(select(Document).where(
         Document.id.in_(application.document_ids),
         Document.farmer_id == current_farmer_id
-    ).all()
+    ))).all()
 
     if len(documents) != len(application.document_ids):
          raise HTTPException(status_code=400, detail="Some documents were not found or do not belong to you.")
@@ -85,12 +91,9 @@ def apply_for_loan(
         )
 
     # 4. Create Consent (30 Days Expiry)
-    # Check if active consent exists, if so update it, else create new
-    existing_consent = db.query(Consent).filter(
-        Consent.farmer_id == current_farmer_id,
-        Consent.service_id == application.service_id,
-        Consent.is_active == True
-    ).first()
+    # Check if active consent exists, if so update it, else create new. Decided from the locked row,
+    # not consent_service's per-worker cache: a stale entry there would insert a second active consent
+    existing_consent = await consent_repo.get_active_consent(db, current_farmer_id, application.service_id, for_update=True)
 
     if existing_consent:
         # Extend expiry? Or just leave it? Let's refresh it.
@@ -104,6 +107,7 @@ def apply_for_loan(
             is_active=True
         )
         db.add(new_consent)
+    await consent_repo.notify_consent_changed(db, current_farmer_id, application.service_id)
     
     # 5. Create Application
     try:
@@ -114,42 +118,47 @@ def apply_for_loan(
             documents_snapshot=application.document_ids
         )
         db.add(db_application)
-        db.commit()
-        db.refresh(db_application)
+        await db.commit()
+        await db.refresh(db_application)
         return db_application
     except Exception as e:
         print(f"❌ ERROR Creating Loan Application: {e}")
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database Error: {str(e)}")
 
-@router.get("/my-applications", response_model=List[LoanApplicationResponse])
-def my_applications(
-    db: Session = Depends(get_db),
+@router.get("/my-applications", response_model=Page[LoanApplicationResponse])
+async def my_applications(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(deps.get_async_read_db),
     current_farmer_id: int = Depends(deps.get_current_user_id)
 ):
     print(f"[DEBUG] Fetching loans for Farmer ID: {current_farmer_id}")
-    loans = db.query(LoanApplication).filter(LoanApplication.farmer_id == current_farmer_id).all()
-    print(f"[DEBUG] Found {len(loans)} loans for Farmer ID: {current_farmer_id}")
+    loans = await paginate(
+        db,
+        select(LoanApplication).where(LoanApplication.farmer_id == current_farmer_id),
+        LoanApplication.created_at, LoanApplication.id, page
+    )
+    print(f"[DEBUG] Found {len(loans['items'])} loans for Farmer ID: {current_farmer_id}")
     return loans
 
 
 from typing import Union
 
 @router.post("/revoke/{application_id}")
-def revoke_document_access(
+async def revoke_document_access(
     application_id: int,
     doc_id: Union[int, str],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     current_farmer_id: int = Depends(deps.get_current_user_id)
 ):
     """
     Revoke access to specific documents or withdraw the entire application.
     Pass doc_id='ALL' to withdraw the application.
     """
-    app = db.query(LoanApplication).filter(
+    app = await db.scalar(select(LoanApplication).where(
         LoanApplication.id == application_id, 
         LoanApplication.farmer_id == current_farmer_id
-    ).first()
+    ))
     
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
@@ -157,7 +166,7 @@ def revoke_document_access(
     if str(doc_id).upper() == "ALL":
         app.status = "WITHDRAWN"
         app.documents_snapshot = [] # Clear access
-        db.commit()
+        await db.commit()
         return {"message": "Application withdrawn and all document access revoked."}
 
     # Specific Document Revocation
@@ -171,7 +180,7 @@ def revoke_document_access(
             # If mandatory doc is removed, we might auto-reject or flag
             app.status = "PENDING_REVOKED" 
             
-            db.commit()
+            await db.commit()
             return {"message": "Access to document revoked successfully"}
     except ValueError:
         raise HTTPException(status_code=400, detail="Invalid Document ID format")
@@ -182,8 +191,8 @@ def revoke_document_access(
 # --- Admin Endpoints ---
 
 @router.post("/admin/login")
-def admin_login(login_data: AdminLogin, db: Session = Depends(get_db)):
-    admin = db.query(Admin).filter(Admin.username == login_data.username).first()
+async def admin_login(login_data: AdminLogin, db: AsyncSession = Depends(deps.get_async_db)):
+    admin = await db.scalar(select(Admin).where(Admin.username == login_data.username))
     if not admin or admin.password != login_data.password:
         raise HTTPException(status_code=401, detail="Invalid admin credentials")
     
@@ -202,62 +211,71 @@ def admin_login(login_data: AdminLogin, db: Session = Depends(get_db)):
 
 from sqlalchemy.orm import joinedload
 
-@router.get("/admin/applications", response_model=List[LoanApplicationResponse])
-def list_all_applications(
-    db: Session = Depends(get_db),
+@router.get("/admin/applications", response_model=Page[LoanApplicationResponse])
+async def list_all_applications(
+    page: PageParams = Depends(),
+    db: AsyncSession = Depends(deps.get_async_read_db),
     admin: deps.AdminContext = Depends(deps.get_current_admin)
 ):
     # Enforce Domain Separation: Only show loans for this admin's service
-    loans = db.query(LoanApplication).options(joinedload(LoanApplication.farmer)).filter(LoanApplication.service_id == admin.service_id).all()
+    result = await paginate(
+        db,
+        select(LoanApplication).options(joinedload(LoanApplication.farmer)).where(LoanApplication.service_id == admin.service_id),
+        LoanApplication.created_at, LoanApplication.id, page
+    )
     
     # Map to schema with farmer_name
     results = []
-    for l in loans:
+    for l in result["items"]:
         l_dict = LoanApplicationResponse.from_orm(l)
         if l.farmer:
              l_dict.farmer_name = l.farmer.full_name
         results.append(l_dict)
-    return results
+    result["items"] = results
+    return result
 
-@router.get("/admin/application/{application_id}/documents", response_model=List[DocumentResponse])
-def get_application_documents(
+_DENIALS = {
+    policy_repo.NOT_FOUND: (404, "Application not found"),
+    policy_repo.WRONG_SERVICE: (403, "Access Denied: You are not authorized for this service domain."),
+}
+
+async def _consented_application(db: AsyncSession, application_id: int, admin: deps.AdminContext,
+                                 doc_id: int = None) -> policy_repo.AccessCheck:
+    """
+    The application's documents (or just doc_id), if it is in the admin's service domain and the
+    farmer's consent is still valid. Loan consents are always time-bound. One round trip when the
+    consent decision is cached.
+    """
+    check = await policy_repo.loan_application_access(db, application_id, admin.service_id, doc_id=doc_id)
+    if check.allowed:
+        decision = await consent_service.get_decision(db, check.farmer_id, check.service_id)
+        policy_repo.apply_consent(check, decision, time_bound=True)
+    if not check.allowed:
+        status_code, detail = _DENIALS.get(check.denial, (403, "Consent expired or revoked by farmer"))
+        raise HTTPException(status_code=status_code, detail=detail)
+    return check
+
+@router.get("/admin/application/{application_id}/documents", response_model=List[AdminDocumentResponse])
+async def get_application_documents(
     application_id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     admin: deps.AdminContext = Depends(deps.get_current_admin)
 ):
     """
     Admin View: Fetch documents for a specific application.
     MUST check if Consent is still valid!
     """
-    app = db.query(LoanApplication).filter(LoanApplication.id == application_id).first()
-    if not app:
-         raise HTTPException(status_code=404, detail="Application not found")
-         
-    if app.service_id != admin.service_id:
-        raise HTTPException(status_code=403, detail="Access Denied: You are not authorized for this service domain.")
-
-    # Check Consent
-    consent = db.query(Consent).filter(
-        Consent.farmer_id == app.farmer_id,
-        Consent.service_id == app.service_id,
-        Consent.is_active == True,
-        Consent.expires_at > datetime.utcnow()
-    ).first()
-
-    if not consent:
-        raise HTTPException(status_code=403, detail="Consent expired or revoked by farmer")
-
-    # Fetch Documents found in snapshot
-    doc_ids = app.documents_snapshot
-    documents = db.query(Document).filter(Document.id.in_(doc_ids)).all()
+    # Application and the documents found in its snapshot in one query; the consent decision is usually cached
+    app = await _consented_application(db, application_id, admin)
+    documents = app.documents
     
     # --- LOGGING: Log Admin Access ---
-    from app.models.access_log import AccessLog
     # We need a service_id for the log. The admin is linked to a service, or we use the app's service_id.
     # Ideally, get it from current_admin_id but we don't have that easily injected here unless we update deps.
     # Let's use the app's service_id.
     
-    new_log = AccessLog(
+    await audit_service.record_access(
+        db,
         farmer_id=app.farmer_id,
         service_id=app.service_id,
         action="DOC_ACCESS_ADMIN",
@@ -266,12 +284,84 @@ def get_application_documents(
         ip_address="Admin Portal", # or request.client.host
         details="Admin viewed verification documents."
     )
-    db.add(new_log)
-    db.commit() # Commit log immediately
     # ---------------------------------
 
-    return documents
+    # Links instead of bytes: the admin portal fetches each file straight from storage
+    return [
+        AdminDocumentResponse.model_validate(doc).model_copy(update={
+            "download_url": document_service.download_url(doc, disposition="inline"),
+            "preview_url": f"/loan/admin/application/{application_id}/documents/{doc.id}/preview"
+                           if preview_service.has_preview(doc) else None,
+        })
+        for doc in documents
+    ]
+
+@router.get("/admin/application/{application_id}/documents/{doc_id}/preview")
+async def preview_application_document(
+    application_id: int,
+    doc_id: int,
+    request: Request,
+    size: str = "thumb", # "thumb" (256px) or "preview" (1024px)
+    db: AsyncSession = Depends(deps.get_async_db),
+    admin: deps.AdminContext = Depends(deps.get_current_admin)
+):
+    """Admin View: small JPEG of one application document, for triage. Same consent check as the list."""
+    app = await _consented_application(db, application_id, admin, doc_id=doc_id)
+    if not app.documents:
+        raise HTTPException(status_code=404, detail="Document not part of this application")
+    return await preview_service.preview_response(request, app.documents[0], size)
+
+def _bundle_entries(documents: List[Document]):
+    # DOC_TYPE/filename inside the archive; a repeated name gets the document id in front
+    used = set()
+    for doc in documents:
+        filename = (doc.filename or f"document-{doc.id}").replace("\\", "/").rsplit("/", 1)[-1]
+        name = f"{doc.doc_type}/{filename}"
+        if name in used:
+            name = f"{doc.doc_type}/{doc.id}-{filename}"
+        used.add(name)
+        stored = document_service.StoredFile.from_document(doc)
+        yield name, doc.created_at, lambda stored=stored: document_service.plaintext_stream(stored)
+
+@router.get("/admin/application/{application_id}/bundle")
+async def download_application_bundle(
+    application_id: int,
+    db: AsyncSession = Depends(deps.get_async_db),
+    admin: deps.AdminContext = Depends(deps.get_current_admin)
+):
+    """
+    Admin View: every document of the application as one ZIP, streamed as it is built.
+    Same consent check as the document list; one audit entry for the whole bundle.
+    """
+    app = await _consented_application(db, application_id, admin)
+    documents = app.documents # In id order
+
+    # Check up front: once the first bytes are out, a missing file can no longer become an error status
+    backend = storage.get_storage()
+    present = [doc for doc in documents if await backend.exists(doc.storage_path)]
+    if len(present) != len(documents):
+        missing = sorted({doc.id for doc in documents} - {doc.id for doc in present})
+        print(f"⚠️ Bundle for application #{application_id}: stored files missing for documents {missing}")
+
+    await audit_service.record_access(
+        db,
+        farmer_id=app.farmer_id,
+        service_id=app.service_id,
+        action="DOC_BUNDLE_ADMIN",
+        resource=f"Application #{application_id} - {len(present)} Documents Downloaded as Bundle by Admin",
+        status="SUCCESS",
+        ip_address="Admin Portal",
+        details=f"Admin downloaded documents {[doc.id for doc in present]} as a ZIP bundle."
+    )
 
+    return StreamingResponse(
+        zip_stream.stream_zip(_bundle_entries(present)),
+        media_type="application/zip",
+        headers={
+            "Content-Disposition": storage.content_disposition(f"application-{application_id}-documents.zip"),
+            "Cache-Control": "private, no-store",
+        },
+    )
 
 from app.models.feedback import Feedback
 
@@ -280,13 +370,13 @@ class ApplicationDecision(BaseModel):
     feedback_message: str
 
 @router.post("/admin/decide/{application_id}")
-def decide_application(
+async def decide_application(
     application_id: int,
     decision: ApplicationDecision,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(deps.get_async_db),
     admin: deps.AdminContext = Depends(deps.get_current_admin)
 ):
-    app = db.query(LoanApplication).filter(LoanApplication.id == application_id).first()
+    app = await db.get(LoanApplication, application_id)
     if not app:
         raise HTTPException(status_code=404, detail="Application not found")
 
@@ -306,6 +396,7 @@ def decide_application(
     db.add(feedback)
 
     # --- LOGGING: Log Loan Decision/Closure ---
+    # Not routed through the audit sink: the decision commits anyway, so the log rides the same transaction.
     from app.models.access_log import AccessLog
     decision_log = AccessLog(
         farmer_id=app.farmer_id,
@@ -319,6 +410,6 @@ def decide_application(
     db.add(decision_log)
     # ------------------------------------------
     
-    db.commit()
+    await db.commit()
     return {"message": f"Application {decision.status}"}
 
@@ -1,24 +1,24 @@
 from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from app.db.session import SessionLocal
-from app.schemas.all import ServiceCreate, ServiceResponse
+from app.api.deps import get_db, get_read_db
+from app.schemas.all import ServiceCreate, ServiceResponse, Page
+from app.utils.pagination import PageParams, keyset, make_page
 from app.repositories import service_repo
+from app.core import scopes
 
 router = APIRouter()
 
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
 @router.post("/register", response_model=ServiceResponse)
 def register_service(service: ServiceCreate, db: Session = Depends(get_db)):
     # In a real app, this would be Admin only
+    unknown = scopes.unknown(service.allowed_scopes)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown scopes: {', '.join(unknown)}")
     return service_repo.create_service(db, service)
 
-@router.get("/", response_model=list[ServiceResponse])
-def get_services(db: Session = Depends(get_db)):
+@router.get("/", response_model=Page[ServiceResponse])
+def get_services(page: PageParams = Depends(), db: Session = Depends(get_read_db)):
     from app.models.service import Service
-    return db.query(Service).all()
+    rows = db.scalars(keyset(select(Service), Service.created_at, Service.id, page)).all()
+    return make_page(rows, "created_at", page)
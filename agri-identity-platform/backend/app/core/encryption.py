@@ -0,0 +1,255 @@
+import base64
+import os
+import struct
+from typing import AsyncIterator, Optional
+import anyio
+from cryptography.exceptions import InvalidTag
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+from app.core.config import settings
+
+# --- Document Vault Encryption ---
+# Fernet (security.fernet) needs the whole message in memory, so vault files use a segmented AEAD
+# instead (the "STREAM" construction): the plaintext is cut into VAULT_SEGMENT_BYTES segments, each
+# sealed with AES-256-GCM under a nonce of
+#
+#     nonce_prefix (7 bytes, random per file) || segment index (4 bytes) || last-segment flag (1 byte)
+#
+# so segments cannot be reordered, dropped, or the file truncated at a segment boundary without
+# failing authentication. Every file also gets a random salt and its own HKDF-derived key, so the
+# master key never encrypts two files and nonces cannot collide across files.
+#
+# File layout:
+#     header  = MAGIC (4) | segment size (4, big-endian) | salt (16) | nonce prefix (7)
+#     body    = segment_0 | segment_1 | ... | segment_last, each = ciphertext | 16-byte tag
+# The header is bound to every segment as associated data.
+
+MAGIC = b"KSV1"
+SALT_BYTES = 16
+NONCE_PREFIX_BYTES = 7
+TAG_BYTES = 16
+HEADER_BYTES = len(MAGIC) + 4 + SALT_BYTES + NONCE_PREFIX_BYTES
+MAX_SEGMENTS = 2 ** 32
+
+class VaultIntegrityError(Exception):
+    """Ciphertext was modified, truncated, reordered, or encrypted under a different key."""
+
+_master_key: Optional[bytes] = None
+
+def _get_master_key() -> bytes:
+    global _master_key
+    if _master_key is None:
+        # ENCRYPTION_KEY is the url-safe base64 Fernet key; the vault derives its own key from it
+        _master_key = base64.urlsafe_b64decode(settings.ENCRYPTION_KEY)
+    return _master_key
+
+def _file_key(salt: bytes) -> bytes:
+    return HKDF(algorithm=hashes.SHA256(), length=32, salt=salt, info=b"khetisahay-document-vault-v1").derive(
+        _get_master_key()
+    )
+
+def _nonce(prefix: bytes, index: int, last: bool) -> bytes:
+    if index >= MAX_SEGMENTS:
+        raise ValueError("File too large for the vault segment counter")
+    return prefix + struct.pack(">IB", index, 1 if last else 0)
+
+def ciphertext_size(plaintext_size: int, segment_size: int = None) -> int:
+    segment_size = segment_size or settings.VAULT_SEGMENT_BYTES
+    segments = max(1, -(-plaintext_size // segment_size))
+    return HEADER_BYTES + plaintext_size + segments * TAG_BYTES
+
+class StreamEncryptor:
+    """Feed plaintext with update(); write header() first and finalize() last."""
+
+    def __init__(self, segment_size: int = None):
+        self.segment_size = segment_size or settings.VAULT_SEGMENT_BYTES
+        salt = os.urandom(SALT_BYTES)
+        self._prefix = os.urandom(NONCE_PREFIX_BYTES)
+        self._header = MAGIC + struct.pack(">I", self.segment_size) + salt + self._prefix
+        self._aead = AESGCM(_file_key(salt))
+        self._buffer = bytearray()
+        self._index = 0
+
+    def header(self) -> bytes:
+        return self._header
+
+    def _seal(self, segment: bytes, last: bool) -> bytes:
+        sealed = self._aead.encrypt(_nonce(self._prefix, self._index, last), segment, self._header)
+        self._index += 1
+        return sealed
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        out = []
+        view = memoryview(self._buffer)
+        offset = 0
+        # Hold back at least one byte: only finalize() knows which segment is the last
+        while len(self._buffer) - offset > self.segment_size:
+            out.append(self._seal(view[offset:offset + self.segment_size], last=False))
+            offset += self.segment_size
+        view.release()
+        del self._buffer[:offset] # One compaction per call, not per segment
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        sealed = self._seal(bytes(self._buffer), last=True)
+        self._buffer.clear()
+        return sealed
+
+class SegmentOpener:
+    """Opens single segments of one vault file, given its header; lets ranged reads skip the rest."""
+
+    def __init__(self, header: bytes):
+        header = bytes(header[:HEADER_BYTES])
+        if len(header) < HEADER_BYTES or header[:len(MAGIC)] != MAGIC:
+            raise VaultIntegrityError("Not a vault file")
+        (self.segment_size,) = struct.unpack(">I", header[4:8])
+        salt = header[8:8 + SALT_BYTES]
+        self._prefix = header[8 + SALT_BYTES:]
+        self._aead = AESGCM(_file_key(salt))
+        self._header = header
+
+    @property
+    def sealed_size(self) -> int:
+        return self.segment_size + TAG_BYTES
+
+    def segment_offset(self, index: int) -> int:
+        return HEADER_BYTES + index * self.sealed_size
+
+    def open(self, index: int, sealed: bytes, last: bool) -> bytes:
+        try:
+            return self._aead.decrypt(_nonce(self._prefix, index, last), sealed, self._header)
+        except InvalidTag:
+            raise VaultIntegrityError(f"Segment {index} failed authentication")
+
+class StreamDecryptor:
+    """Feed the file (header included) with update(); finalize() verifies the last segment."""
+
+    def __init__(self):
+        self._opener = None
+        self.segment_size = None
+        self._buffer = bytearray()
+        self._index = 0
+
+    def _open(self, sealed: bytes, last: bool) -> bytes:
+        plain = self._opener.open(self._index, sealed, last)
+        self._index += 1
+        return plain
+
+    def update(self, data: bytes) -> bytes:
+        self._buffer += data
+        if self._opener is None:
+            if len(self._buffer) < HEADER_BYTES:
+                return b""
+            self._opener = SegmentOpener(self._buffer)
+            self.segment_size = self._opener.segment_size
+            del self._buffer[:HEADER_BYTES]
+        sealed_size = self._opener.sealed_size
+        out = []
+        view = memoryview(self._buffer)
+        offset = 0
+        # As in encryption, a full segment is only opened once more data proves it is not the last
+        while len(self._buffer) - offset > sealed_size:
+            out.append(self._open(view[offset:offset + sealed_size], last=False))
+            offset += sealed_size
+        view.release()
+        del self._buffer[:offset]
+        return b"".join(out)
+
+    def finalize(self) -> bytes:
+        if self._opener is None:
+            raise VaultIntegrityError("Truncated vault file (no header)")
+        plain = self._open(bytes(self._buffer), last=True)
+        self._buffer.clear()
+        return plain
+
+async def decrypt_stream(chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Decrypt a vault file arriving as an async byte stream (local file or object storage body)."""
+    decryptor = StreamDecryptor()
+    async for chunk in chunks:
+        plain = decryptor.update(chunk)
+        if plain:
+            yield plain
+    yield decryptor.finalize()
+
+async def _read_file(path: str, read_size: int) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as f:
+        while chunk := await f.read(read_size):
+            yield chunk
+
+async def decrypt_segments(opener: SegmentOpener, chunks: AsyncIterator[bytes], first_index: int,
+                           final_index: int) -> AsyncIterator[bytes]:
+    """
+    Decrypt consecutive segments read from opener.segment_offset(first_index) onwards, one
+    plaintext segment per yield. final_index is the file's last segment (its nonce flag differs).
+    """
+    sealed_size = opener.sealed_size
+    buffer = bytearray()
+    index = first_index
+    async for chunk in chunks:
+        buffer += chunk
+        view = memoryview(buffer)
+        offset = 0
+        while len(buffer) - offset >= sealed_size:
+            yield opener.open(index, view[offset:offset + sealed_size], last=index == final_index)
+            index += 1
+            offset += sealed_size
+        view.release()
+        del buffer[:offset]
+    if buffer:
+        # A short segment can only be the file's last one; anything else is truncation
+        yield opener.open(index, bytes(buffer), last=index == final_index)
+
+def decrypt_file(path: str, read_size: int = None) -> AsyncIterator[bytes]:
+    """Stream the plaintext of a vault file; memory use is one read plus one segment."""
+    return decrypt_stream(_read_file(path, read_size or settings.UPLOAD_CHUNK_BYTES))
+
+# --- Resumable Upload Partials ---
+# A resumable upload (upload_session_service) waits in UPLOAD_TMP_DIR for up to
+# UPLOAD_SESSION_TTL_HOURS, so its bytes are sealed as they arrive instead of sitting there as
+# plaintext. Chunks come in arbitrary sizes and a writer can die half way, so a partial is not one
+# STREAM file but a run of append-only records, each sealed on its own:
+#
+#     record = plaintext length (4, big-endian) | nonce (12, random) | ciphertext | 16-byte tag
+#
+# The upload id and the plaintext offset a record starts at are its associated data, so records
+# cannot be reordered, dropped from the middle, or moved to another upload. Finalize opens them
+# into stage_stream, which re-seals the file in the vault format above.
+
+PARTIAL_LENGTH_BYTES = 4
+PARTIAL_NONCE_BYTES = 12
+
+def partial_record_size(length: int) -> int:
+    return PARTIAL_LENGTH_BYTES + PARTIAL_NONCE_BYTES + length + TAG_BYTES
+
+def partial_record_length(prefix: bytes) -> int:
+    (length,) = struct.unpack(">I", prefix)
+    return length
+
+class PartialSealer:
+    """Seals and opens the records of one upload session's partial file."""
+
+    def __init__(self, upload_id: str):
+        self._upload_id = upload_id.encode()
+        key = HKDF(algorithm=hashes.SHA256(), length=32, salt=None,
+                   info=b"khetisahay-upload-partial-v1:" + self._upload_id).derive(_get_master_key())
+        self._aead = AESGCM(key)
+
+    def _aad(self, offset: int) -> bytes:
+        return self._upload_id + struct.pack(">Q", offset)
+
+    def seal(self, offset: int, plaintext: bytes) -> bytes:
+        # Random nonces: a record can be rewritten at the same offset after a writer died
+        nonce = os.urandom(PARTIAL_NONCE_BYTES)
+        return (struct.pack(">I", len(plaintext)) + nonce
+                + self._aead.encrypt(nonce, bytes(plaintext), self._aad(offset)))
+
+    def open(self, offset: int, body: bytes) -> bytes:
+        """body is the record after its length prefix: nonce | ciphertext | tag."""
+        if len(body) < PARTIAL_NONCE_BYTES + TAG_BYTES:
+            raise VaultIntegrityError(f"Truncated upload record at offset {offset}")
+        try:
+            return self._aead.decrypt(body[:PARTIAL_NONCE_BYTES], body[PARTIAL_NONCE_BYTES:], self._aad(offset))
+        except InvalidTag:
+            raise VaultIntegrityError(f"Upload record at offset {offset} failed authentication")
@@ -0,0 +1,53 @@
+from typing import Iterable, List, Union
+
+# --- Scope Registry ---
+# Every consent scope has a fixed bit. Services store the mask of what they may request
+# (service.allowed_scope_mask), consents the mask of what was granted (consent.granted_scope_mask),
+# and tokens carry theirs in the "smask" claim, so scope checks are integer ANDs instead of
+# set-building over JSON lists and claim strings. The JSONB lists stay the source the UI shows.
+#
+# Bits are persisted in rows and tokens: only ever append. Never reorder, reuse or remove an entry
+# (retire a scope by leaving it here unused). scope_mask() in migrations/011_scope_mask_triggers.sql
+# mirrors this table: the database derives the mask columns itself, so raw-SQL writes stay correct.
+
+REGISTRY = (
+    "profile",       # 1 << 0
+    "aadhaar",       # 1 << 1
+    "land_records",  # 1 << 2
+    "documents",     # 1 << 3
+    "location",      # 1 << 4
+    "crop_data",     # 1 << 5
+    "land_data",     # 1 << 6
+    "bank_details",  # 1 << 7
+)
+BITS = {name: 1 << bit for bit, name in enumerate(REGISTRY)}
+
+PROFILE = BITS["profile"]
+AADHAAR = BITS["aadhaar"]
+LAND_RECORDS = BITS["land_records"]
+
+class UnknownScope(ValueError):
+    pass
+
+def _names(scopes: Union[str, Iterable[str], None]) -> Iterable[str]:
+    if scopes is None:
+        return ()
+    return scopes.split() if isinstance(scopes, str) else scopes
+
+def mask_of(scopes: Union[str, Iterable[str], None], strict: bool = False) -> int:
+    """Mask for a list (or space-separated string) of scope names. Unknown names are skipped, or raise if strict."""
+    mask = 0
+    for name in _names(scopes):
+        bit = BITS.get(name)
+        if bit is None:
+            if strict:
+                raise UnknownScope(name)
+            continue
+        mask |= bit
+    return mask
+
+def names_of(mask: int) -> List[str]:
+    return [name for name, bit in BITS.items() if mask & bit]
+
+def unknown(scopes: Union[str, Iterable[str], None]) -> List[str]:
+    return [name for name in _names(scopes) if name not in BITS]
@@ -1,9 +1,18 @@
+import asyncio
+import hashlib
+import multiprocessing
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, Union, Optional
-from jose import jwt
+from fastapi import HTTPException, status
+from jose import jwt, JWTError
 from passlib.context import CryptContext
 from cryptography.fernet import Fernet
 from app.core.config import settings
+from app.core import scopes
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 fernet = Fernet(settings.ENCRYPTION_KEY)
@@ -14,19 +23,148 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+# --- Password Hashing Pool ---
+# bcrypt costs ~250ms of pure CPU per call. Running it inline in an async handler
+# stalls the whole event loop, and running it on the default threadpool still holds
+# the GIL-bound threads other sync routes need. Hashing gets its own process pool
+# with a bounded backlog, so a registration drive degrades to fast 503s instead of
+# freezing the worker.
+
+_hash_executor: Optional[ProcessPoolExecutor] = None
+_hash_executor_lock = threading.Lock()
+_hash_jobs_in_flight = 0 # Only touched from the event loop thread
+
+def get_hash_executor() -> ProcessPoolExecutor:
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is None:
+            # "spawn" avoids forking a process that already runs the event loop and DB pool threads
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=settings.PASSWORD_HASH_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _hash_executor
+
+def shutdown_hash_executor():
+    global _hash_executor
+    with _hash_executor_lock:
+        if _hash_executor is not None:
+            _hash_executor.shutdown(wait=True, cancel_futures=True)
+            _hash_executor = None
+
+async def _run_in_hash_pool(func, *args):
+    global _hash_jobs_in_flight
+    capacity = settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_MAX_QUEUE
+    if _hash_jobs_in_flight >= capacity:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authentication service is busy. Please retry shortly.",
+            headers={"Retry-After": "1"},
+        )
+
+    _hash_jobs_in_flight += 1
+    try:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_hash_executor(), func, *args)
+    finally:
+        _hash_jobs_in_flight -= 1
+
+async def hash_password_async(password: str) -> str:
+    return await _run_in_hash_pool(get_password_hash, password)
+
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await _run_in_hash_pool(verify_password, plain_password, hashed_password)
+
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None, claims: dict = None) -> str:
     if expires_delta:
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode = {"sub": str(subject), "exp": expire}
+    to_encode = {"sub": str(subject), "exp": expire, "iat": datetime.utcnow()}
     if claims:
         to_encode.update(claims)
+    if "scope" in to_encode:
+        to_encode.setdefault("smask", scopes.mask_of(to_encode["scope"])) # Compiled once, at mint time
     
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
+# --- Decoded Token Cache ---
+# A single portal page load sends the same bearer token to several endpoints. Verifying the
+# HMAC and parsing the claims once per token per worker is enough: entries are keyed by the
+# token's SHA-256 digest (the raw token never sits in the cache) and dropped at the token's exp.
+
+class TokenCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries = OrderedDict() # digest -> (claims, exp_timestamp)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest: bytes) -> Optional[dict]:
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None:
+                self.misses += 1
+                return None
+            claims, exp = entry
+            if exp <= time.time():
+                del self._entries[digest]
+                self.evictions += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return claims
+
+    def put(self, digest: bytes, claims: dict, exp: float):
+        with self._lock:
+            self._entries[digest] = (claims, exp)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+token_cache = TokenCache(settings.TOKEN_CACHE_MAX_ENTRIES)
+
+def token_digest(token: str) -> bytes:
+    return hashlib.sha256(token.encode()).digest()
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verify a bearer token and return its claims, serving repeat tokens from the cache.
+    Raises JWTError for invalid or expired tokens. Callers must treat the result as read-only.
+    """
+    digest = token_digest(token)
+    claims = token_cache.get(digest)
+    if claims is not None:
+        return claims
+
+    claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    exp = claims.get("exp")
+    if exp is None:
+        raise JWTError("Token has no expiry")
+    if float(exp) > time.time():
+        token_cache.put(digest, claims, float(exp))
+    return claims
+
 def encrypt_data(data: str) -> str:
     if not data:
         return None
@@ -0,0 +1,308 @@
+import abc
+import functools
+import hashlib
+import hmac
+import os
+import threading
+import time
+from typing import AsyncIterator, List, NamedTuple, Optional
+from urllib.parse import quote, urlencode
+import anyio
+from app.core.config import settings
+
+# --- Document Storage ---
+# Vault files sit behind a small driver interface: "local" keeps them on this host's disk, "s3"
+# puts them in any S3-compatible bucket (AWS S3, or MinIO for local testing). Keys are the
+# Blob/Document storage_path values ("uploads/blobs/ab/cd/<sha256>.bin"), so switching drivers
+# only means copying the tree into the bucket, not rewriting rows.
+#
+# --- Download Links ---
+# Document downloads are handed out as short-lived links, so the bytes do not pass through the
+# API handlers that did the ACL / consent check. The S3 driver presigns plaintext objects itself.
+# Everything else (local files, vault-encrypted objects that need decrypting) gets a link to
+# /files/<key> on the API, HMAC-signed over the key, expiry and response headers.
+#
+# A bucket with server-side encryption already keeps objects encrypted at rest, so new uploads
+# there skip vault encryption and stay presignable (document_service.vault_encrypts_uploads).
+# S3_VAULT_ENCRYPTION=true keeps both layers; every S3 download then streams through /files.
+
+class StorageError(Exception):
+    pass
+
+class StoredObject(NamedTuple):
+    key: str
+    modified: float # Unix time
+    size: int
+
+class Storage(abc.ABC):
+    name = "base"
+    server_side_encrypted = False # True if the store itself encrypts objects at rest
+
+    @abc.abstractmethod
+    async def put_file(self, src_path: str, key: str) -> bool:
+        """Copy a local file to key. Returns False (and leaves it alone) if key already exists."""
+
+    @abc.abstractmethod
+    async def exists(self, key: str) -> bool:
+        ...
+
+    @abc.abstractmethod
+    async def read_head(self, key: str, size: int) -> bytes:
+        ...
+
+    @abc.abstractmethod
+    def stream(self, key: str, read_size: int = None, start: int = 0, end: int = None) -> AsyncIterator[bytes]:
+        """Bytes start..end (inclusive; end=None for the rest of the object)."""
+
+    @abc.abstractmethod
+    async def delete(self, key: str):
+        ...
+
+    @abc.abstractmethod
+    async def move(self, src: str, dst: str):
+        ...
+
+    async def retire(self, key: str) -> str:
+        """Move key aside before the transaction that drops its last reference commits."""
+        retired = f"{key}.deleting"
+        await self.move(key, retired)
+        return retired
+
+    async def restore(self, retired: str):
+        await self.move(retired, retired[:-len(".deleting")])
+
+    @abc.abstractmethod
+    async def list_keys(self, prefix: str, start_after: str = "", limit: int = 1000) -> List[StoredObject]:
+        """Up to limit objects under prefix/, in key order, strictly after start_after (for resumable walks)."""
+
+    def presigned_url(self, key: str, expires_in: int, filename: str = None, media_type: str = None,
+                      disposition: str = "attachment") -> Optional[str]:
+        """A URL the client can fetch directly, or None if this driver cannot serve one."""
+        return None
+
+class LocalStorage(Storage):
+    name = "local"
+
+    def path(self, key: str) -> str:
+        return key # Keys are paths relative to the working directory, as storage_path always was
+
+    async def put_file(self, src_path: str, key: str) -> bool:
+        def link():
+            os.makedirs(os.path.dirname(key), exist_ok=True)
+            try:
+                os.link(src_path, key) # Atomic, same filesystem, never overwrites
+            except FileExistsError:
+                return False
+            return True
+        return await anyio.to_thread.run_sync(link)
+
+    async def exists(self, key: str) -> bool:
+        return await anyio.Path(key).is_file()
+
+    async def read_head(self, key: str, size: int) -> bytes:
+        async with await anyio.open_file(key, "rb") as f:
+            return await f.read(size)
+
+    async def stream(self, key: str, read_size: int = None, start: int = 0, end: int = None) -> AsyncIterator[bytes]:
+        read_size = read_size or settings.UPLOAD_CHUNK_BYTES
+        remaining = None if end is None else end - start + 1
+        async with await anyio.open_file(key, "rb") as f:
+            if start:
+                await f.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = await f.read(read_size if remaining is None else min(read_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    async def delete(self, key: str):
+        try:
+            await anyio.Path(key).unlink()
+        except FileNotFoundError:
+            pass
+
+    async def move(self, src: str, dst: str):
+        def rename():
+            os.makedirs(os.path.dirname(dst), exist_ok=True)
+            os.replace(src, dst)
+        await anyio.to_thread.run_sync(rename)
+
+    def _walk(self, directory: str, start_after: str):
+        # Depth-first in key order (a directory sorts as "name/"), so a walk can resume after any key;
+        # subtrees that lie entirely before start_after are skipped without being read
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda e: e.name + "/" if e.is_dir() else e.name)
+        except FileNotFoundError:
+            return
+        for entry in entries:
+            path = f"{directory}/{entry.name}"
+            if entry.is_dir():
+                if path + "/" < start_after and not start_after.startswith(path + "/"):
+                    continue
+                yield from self._walk(path, start_after)
+            elif path > start_after:
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                # ctime too: a rename (retire) or a new hard link (put_file reusing a blob) is recent activity
+                yield StoredObject(path, max(stat.st_mtime, stat.st_ctime), stat.st_size)
+
+    async def list_keys(self, prefix: str, start_after: str = "", limit: int = 1000) -> List[StoredObject]:
+        def walk():
+            objects = []
+            for obj in self._walk(prefix.rstrip("/"), start_after):
+                objects.append(obj)
+                if len(objects) >= limit:
+                    break
+            return objects
+        return await anyio.to_thread.run_sync(walk)
+
+class S3Storage(Storage):
+    name = "s3"
+
+    def __init__(self):
+        if not settings.S3_BUCKET:
+            raise StorageError("STORAGE_BACKEND=s3 needs S3_BUCKET")
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise StorageError("STORAGE_BACKEND=s3 needs boto3 (pip install boto3)")
+        self.bucket = settings.S3_BUCKET
+        # Path-style addressing for custom endpoints: MinIO does not do virtual-host buckets by default
+        config = Config(
+            signature_version="s3v4",
+            s3={"addressing_style": "path" if settings.S3_ENDPOINT_URL else "auto"},
+            max_pool_connections=settings.S3_MAX_CONNECTIONS,
+        )
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region_name=settings.S3_REGION,
+            aws_access_key_id=settings.S3_ACCESS_KEY_ID, # None falls back to boto3's credential chain
+            aws_secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            config=config,
+        )
+        self._extra_args = {"ServerSideEncryption": settings.S3_SERVER_SIDE_ENCRYPTION} if settings.S3_SERVER_SIDE_ENCRYPTION else {}
+        self.server_side_encrypted = bool(settings.S3_SERVER_SIDE_ENCRYPTION)
+
+    async def _call(self, method: str, **kwargs):
+        # boto3 is blocking; each call runs on the threadpool
+        return await anyio.to_thread.run_sync(functools.partial(getattr(self.client, method), **kwargs))
+
+    async def exists(self, key: str) -> bool:
+        try:
+            await self._call("head_object", Bucket=self.bucket, Key=key)
+        except self.client.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+        return True
+
+    async def put_file(self, src_path: str, key: str) -> bool:
+        # Callers hold the blob row lock (blob_repo.acquire_blob), so check-then-upload cannot race
+        if await self.exists(key):
+            return False
+        await anyio.to_thread.run_sync(functools.partial(
+            self.client.upload_file, src_path, self.bucket, key, ExtraArgs=self._extra_args or None
+        ))
+        return True
+
+    async def read_head(self, key: str, size: int) -> bytes:
+        response = await self._call("get_object", Bucket=self.bucket, Key=key, Range=f"bytes=0-{size - 1}")
+        return await anyio.to_thread.run_sync(response["Body"].read)
+
+    async def stream(self, key: str, read_size: int = None, start: int = 0, end: int = None) -> AsyncIterator[bytes]:
+        read_size = read_size or settings.UPLOAD_CHUNK_BYTES
+        ranged = {"Range": f"bytes={start}-{'' if end is None else end}"} if start or end is not None else {}
+        response = await self._call("get_object", Bucket=self.bucket, Key=key, **ranged)
+        body = response["Body"]
+        try:
+            while chunk := await anyio.to_thread.run_sync(body.read, read_size):
+                yield chunk
+        finally:
+            body.close()
+
+    async def delete(self, key: str):
+        await self._call("delete_object", Bucket=self.bucket, Key=key)
+
+    async def move(self, src: str, dst: str):
+        # Server-side copy (single request up to 5 GB; vault files are capped at MAX_UPLOAD_BYTES)
+        await self._call("copy_object", Bucket=self.bucket, Key=dst, CopySource={"Bucket": self.bucket, "Key": src},
+                         **self._extra_args)
+        await self.delete(src)
+
+    async def list_keys(self, prefix: str, start_after: str = "", limit: int = 1000) -> List[StoredObject]:
+        response = await self._call("list_objects_v2", Bucket=self.bucket, Prefix=prefix.rstrip("/") + "/",
+                                    StartAfter=start_after, MaxKeys=min(limit, 1000))
+        return [StoredObject(item["Key"], item["LastModified"].timestamp(), item["Size"])
+                for item in response.get("Contents", [])]
+
+    def presigned_url(self, key: str, expires_in: int, filename: str = None, media_type: str = None,
+                      disposition: str = "attachment") -> Optional[str]:
+        params = {"Bucket": self.bucket, "Key": key, "ResponseContentDisposition": content_disposition(filename, disposition)}
+        if media_type:
+            params["ResponseContentType"] = media_type
+        # Signed locally with the configured credentials, no round trip to the store
+        return self.client.generate_presigned_url("get_object", Params=params, ExpiresIn=expires_in)
+
+_storage: Optional[Storage] = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> Storage:
+    global _storage
+    with _storage_lock:
+        if _storage is None:
+            # STORAGE_BACKEND is validated with the settings, at startup
+            drivers = {"local": LocalStorage, "s3": S3Storage}
+            _storage = drivers[settings.STORAGE_BACKEND]()
+        return _storage
+
+def content_disposition(filename: str = None, disposition: str = "attachment") -> str:
+    if not filename:
+        return disposition
+    quoted = quote(filename)
+    if quoted != filename:
+        return f"{disposition}; filename*=utf-8''{quoted}"
+    return f'{disposition}; filename="{filename}"'
+
+# --- Signed API Links ---
+
+def _link_signature(params: dict) -> str:
+    message = "\n".join(f"{name}={params[name]}" for name in sorted(params))
+    key = hashlib.sha256(f"file-link:{settings.SECRET_KEY}".encode()).digest()
+    return hmac.new(key, message.encode(), hashlib.sha256).hexdigest()
+
+def signed_file_url(key: str, expires_in: int, filename: str = None, media_type: str = None,
+                    disposition: str = "attachment", decrypt: bool = False, size_bytes: int = None,
+                    sha256: str = None) -> str:
+    # Expiry is rounded up to a multiple of expires_in (so links live expires_in..2x expires_in):
+    # repeat views within that window get the same URL, and the browser can revalidate its
+    # cached copy with If-None-Match instead of downloading again.
+    params = {
+        "exp": str((int(time.time()) // expires_in + 2) * expires_in),
+        "disp": disposition,
+        "name": filename or "",
+        "type": media_type or "",
+        "dec": "1" if decrypt else "0",
+        "size": "" if size_bytes is None else str(size_bytes), # Plaintext size: Content-Length and ranges
+        "etag": sha256 or "",
+    }
+    signature = _link_signature({"key": key, **params})
+    return f"{settings.PUBLIC_BASE_URL}/files/{quote(key)}?{urlencode({**params, 'sig': signature})}"
+
+def verify_file_link(key: str, query: dict) -> Optional[dict]:
+    """The signed parameters of a /files link, or None if it is forged, altered or expired."""
+    try:
+        params = {name: query[name] for name in ("exp", "disp", "name", "type", "dec", "size", "etag")}
+        expires_at = int(params["exp"])
+    except (KeyError, ValueError):
+        return None
+    expected = _link_signature({"key": key, **params})
+    if not hmac.compare_digest(expected, query.get("sig", "")) or expires_at < time.time():
+        return None
+    return params
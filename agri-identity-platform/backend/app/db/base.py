@@ -3,7 +3,10 @@ from app.models.farmer import Farmer  # noqa
 from app.models.service import Service  # noqa
 from app.models.consent import Consent  # noqa
 from app.models.access_log import AccessLog  # noqa
+from app.models.blob import Blob # noqa
 from app.models.document import Document # noqa
+from app.models.upload_session import UploadSession # noqa
 from app.models.feedback import Feedback # noqa
 from app.models.loan_application import LoanApplication # noqa
 from app.models.crop_advisory import CropAdvisory # noqa
+from app.models.maintenance_checkpoint import MaintenanceCheckpoint # noqa
@@ -0,0 +1,113 @@
+import re
+from datetime import datetime
+from sqlalchemy import text
+from app.core.config import settings
+
+# --- AccessLog Partition Maintenance ---
+# accesslog is range-partitioned by month (migrations/002_partition_accesslog.sql). Partitions are
+# named accesslog_YYYY_MM and cover [first of month, first of next month). accesslog_default catches
+# anything outside those ranges.
+
+PARENT = "accesslog"
+DEFAULT_PARTITION = "accesslog_default"
+_PARTITION_NAME = re.compile(r"^accesslog_(\d{4})_(\d{2})$")
+
+def month_start(dt: datetime) -> datetime:
+    return datetime(dt.year, dt.month, 1)
+
+def add_months(dt: datetime, months: int) -> datetime:
+    index = dt.year * 12 + (dt.month - 1) + months
+    return datetime(index // 12, index % 12 + 1, 1)
+
+def partition_name(month: datetime) -> str:
+    return f"{PARENT}_{month:%Y_%m}"
+
+def retention_cutoff(now: datetime = None) -> datetime:
+    """Oldest timestamp still inside the retention window (start of the oldest kept month)."""
+    return add_months(month_start(now or datetime.utcnow()), -(settings.ACCESSLOG_RETENTION_MONTHS - 1))
+
+def list_partitions(conn) -> dict:
+    """Monthly partitions currently attached to accesslog: {month_start: table_name}."""
+    rows = conn.execute(text("""
+        SELECT c.relname FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        WHERE i.inhparent = to_regclass(:parent)
+    """), {"parent": PARENT}).scalars().all()
+    partitions = {}
+    for name in rows:
+        match = _PARTITION_NAME.match(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1)] = name
+    return partitions
+
+def create_partition(conn, month: datetime):
+    """
+    Create and attach the partition for one month. Rows for that month that already landed in
+    the default partition are moved first, otherwise ATTACH would fail its range check.
+    """
+    name = partition_name(month)
+    lower, upper = month, add_months(month, 1)
+    bounds = {"lower": lower, "upper": upper}
+    conn.execute(text(f'CREATE TABLE "{name}" (LIKE {PARENT} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)'))
+    moved = conn.execute(text(f"""
+        WITH moved AS (
+            DELETE FROM {DEFAULT_PARTITION} WHERE timestamp >= :lower AND timestamp < :upper RETURNING *
+        )
+        INSERT INTO "{name}" SELECT * FROM moved
+    """), bounds).rowcount
+    conn.execute(text(
+        f"""ALTER TABLE {PARENT} ATTACH PARTITION "{name}" FOR VALUES FROM ('{lower:%Y-%m-%d}') TO ('{upper:%Y-%m-%d}')"""
+    ))
+    return moved
+
+def maintain_partitions(engine, ahead: int = None, retention_action: str = None, dry_run: bool = False) -> dict:
+    """Pre-create the next `ahead` months and detach/drop months older than the retention window."""
+    ahead = settings.ACCESSLOG_PARTITIONS_AHEAD if ahead is None else ahead
+    retention_action = retention_action or settings.ACCESSLOG_RETENTION_ACTION
+    if retention_action not in ("detach", "drop"):
+        raise ValueError(f"Unknown retention action: {retention_action}")
+
+    current = month_start(datetime.utcnow())
+    cutoff = retention_cutoff()
+    report = {"created": [], "detached": [], "dropped": [], "moved_from_default": 0}
+
+    with engine.connect() as conn:
+        # Moving default-partition rows and waiting on ATTACH/DETACH locks can outlive the app's statement_timeout
+        conn.execute(text("SET statement_timeout = 0"))
+        existing = list_partitions(conn)
+        conn.commit()
+
+        for offset in range(ahead + 1):
+            month = add_months(current, offset)
+            if month in existing:
+                continue
+            report["created"].append(partition_name(month))
+            if dry_run:
+                continue
+            with conn.begin():
+                report["moved_from_default"] += create_partition(conn, month)
+
+        for month, name in sorted(existing.items()):
+            if add_months(month, 1) > cutoff:
+                continue
+            report["detached"].append(name)
+            if retention_action == "drop":
+                report["dropped"].append(name)
+            if dry_run:
+                continue
+            with conn.begin():
+                conn.execute(text(f'ALTER TABLE {PARENT} DETACH PARTITION "{name}"'))
+                if retention_action == "drop":
+                    conn.execute(text(f'DROP TABLE "{name}"'))
+
+        if retention_action == "drop" and not dry_run:
+            # Stragglers past retention that never got a monthly partition
+            with conn.begin():
+                report["dropped_default_rows"] = conn.execute(
+                    text(f"DELETE FROM {DEFAULT_PARTITION} WHERE timestamp < :cutoff"), {"cutoff": cutoff}
+                ).rowcount
+
+        report["default_rows"] = conn.execute(text(f"SELECT count(*) FROM {DEFAULT_PARTITION}")).scalar()
+        conn.commit()
+
+    return report
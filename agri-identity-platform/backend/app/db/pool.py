@@ -0,0 +1,135 @@
+import threading
+import time
+from collections import deque
+from sqlalchemy import event, exc
+from sqlalchemy.pool import QueuePool, AsyncAdaptedQueuePool
+from app.core.config import settings
+
+# --- Pool Metrics ---
+# Every checkout is timed so /internal/db/pool can show whether requests are queueing for a
+# connection. Exhaustion raises sqlalchemy.exc.TimeoutError after DB_POOL_TIMEOUT seconds,
+# which main.py turns into a 503.
+
+class PoolMetrics:
+    def __init__(self, window: int = 1000):
+        self._lock = threading.Lock()
+        self._recent_waits = deque(maxlen=window) # seconds, most recent checkouts
+        self.checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_checkout(self, waited: float):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += waited
+            self.max_wait = max(self.max_wait, waited)
+            self._recent_waits.append(waited)
+
+    def record_timeout(self, waited: float):
+        with self._lock:
+            self.timeouts += 1
+            self.max_wait = max(self.max_wait, waited)
+            self._recent_waits.append(waited)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            recent = sorted(self._recent_waits)
+            checkouts, timeouts = self.checkouts, self.timeouts
+            total_wait, max_wait = self.total_wait, self.max_wait
+
+        def pct(p):
+            if not recent:
+                return 0.0
+            return recent[min(len(recent) - 1, int(p / 100 * len(recent)))] * 1000
+
+        return {
+            "checkouts": checkouts,
+            "timeouts": timeouts,
+            "wait_ms_avg": (total_wait / checkouts * 1000) if checkouts else 0.0,
+            "wait_ms_p50": pct(50),
+            "wait_ms_p99": pct(99),
+            "wait_ms_max": max_wait * 1000,
+        }
+
+class _MeteredPoolMixin:
+    metrics: PoolMetrics
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            connection = super().connect()
+        except exc.TimeoutError:
+            self.metrics.record_timeout(time.perf_counter() - started)
+            raise
+        self.metrics.record_checkout(time.perf_counter() - started)
+        return connection
+
+    def recreate(self):
+        new_pool = super().recreate()
+        new_pool.metrics = self.metrics
+        return new_pool
+
+class MeteredQueuePool(_MeteredPoolMixin, QueuePool):
+    pass
+
+class MeteredAsyncAdaptedQueuePool(_MeteredPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+def pool_options(is_async: bool) -> dict:
+    """Engine keyword arguments shared by the sync and async engines."""
+    pool_class = MeteredAsyncAdaptedQueuePool if is_async else MeteredQueuePool
+    if is_async:
+        connect_args = {"server_settings": {"statement_timeout": str(settings.DB_STATEMENT_TIMEOUT_MS)}}
+    else:
+        connect_args = {"options": f"-c statement_timeout={settings.DB_STATEMENT_TIMEOUT_MS}"}
+
+    return {
+        "poolclass": pool_class,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING == "always",
+        "connect_args": connect_args,
+    }
+
+def instrument_engine(sync_engine):
+    """Attach metrics and the "idle" pre-ping policy to an engine's pool."""
+    pool = sync_engine.pool
+    pool.metrics = PoolMetrics()
+
+    if settings.DB_POOL_PRE_PING == "idle":
+        # Only ping connections that sat unused long enough to have been dropped by a
+        # firewall or server restart; hot connections skip the extra round-trip.
+        @event.listens_for(pool, "checkin")
+        def _stamp_checkin(dbapi_connection, connection_record):
+            connection_record.info["checked_in_at"] = time.monotonic()
+
+        @event.listens_for(pool, "checkout")
+        def _ping_if_idle(dbapi_connection, connection_record, connection_proxy):
+            checked_in_at = connection_record.info.get("checked_in_at")
+            if checked_in_at is None:
+                return # Fresh connection
+            if time.monotonic() - checked_in_at < settings.DB_POOL_PRE_PING_IDLE_SECONDS:
+                return
+            try:
+                sync_engine.dialect.do_ping(dbapi_connection)
+            except Exception as e:
+                # The pool discards this connection and retries the checkout with a new one
+                raise exc.DisconnectionError(f"Idle connection failed ping: {e}")
+
+def pool_status(sync_engine) -> dict:
+    pool = sync_engine.pool
+    status = {
+        "pool_size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": max(0, pool.overflow()),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "timeout_s": settings.DB_POOL_TIMEOUT,
+    }
+    metrics = getattr(pool, "metrics", None)
+    if metrics is not None:
+        status.update(metrics.snapshot())
+    return status
@@ -1,6 +1,147 @@
+import hashlib
+import hmac
+import time
+from typing import Optional
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from starlette.concurrency import run_in_threadpool
 from app.core.config import settings
+from app.db.pool import pool_options, instrument_engine
 
-engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, pool_pre_ping=True)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+engine = create_engine(settings.SQLALCHEMY_DATABASE_URI, **pool_options(is_async=False))
+instrument_engine(engine)
+
+replica_engine = None
+if settings.DB_REPLICA_URL:
+    replica_engine = create_engine(settings.DB_REPLICA_URL, **pool_options(is_async=False))
+    instrument_engine(replica_engine)
+
+# --- Read Replica Routing ---
+# Sessions flagged read_only (see deps.get_read_db / get_async_read_db) execute against the
+# replica; everything else, and any flush, goes to the primary.
+
+class RoutingSession(Session):
+    replica_bind = None
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if self.replica_bind is not None and self.info.get("read_only") and not self._flushing:
+            return self.replica_bind
+        return super().get_bind(mapper=mapper, clause=clause, **kw)
+
+class SyncRoutingSession(RoutingSession):
+    replica_bind = replica_engine
+
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine, class_=SyncRoutingSession)
+
+# Replica lag guard: after a caller writes, their reads stay on the primary for
+# DB_REPLICA_STICKY_SECONDS so they see their own write. The write time travels with the client
+# (WRITE_MARKER_COOKIE, or the WRITE_MARKER_HEADER for clients without cookies), HMAC-signed over
+# the caller's subject, so whichever worker or host serves the next read honours it.
+WRITE_MARKER_COOKIE = "last_write"
+WRITE_MARKER_HEADER = "X-Last-Write"
+
+def _marker_signature(subject: str, written_at: str) -> str:
+    key = hashlib.sha256(f"write-marker:{settings.SECRET_KEY}".encode()).digest()
+    return hmac.new(key, f"{subject}\n{written_at}".encode(), hashlib.sha256).hexdigest()
+
+def write_marker(subject: str) -> str:
+    written_at = f"{time.time():.3f}"
+    return f"{written_at}.{_marker_signature(subject, written_at)}"
+
+def _written_recently(subject: str, marker: str) -> bool:
+    written_at, _, signature = marker.rpartition(".")
+    if not hmac.compare_digest(_marker_signature(subject, written_at), signature):
+        return False # Forged, or written by someone else
+    try:
+        return time.time() - float(written_at) < settings.DB_REPLICA_STICKY_SECONDS
+    except ValueError:
+        return False
+
+def replica_allowed(subject: str = None, marker: Optional[str] = None) -> bool:
+    if replica_engine is None:
+        return False
+    if subject is None or not marker:
+        return True
+    return not _written_recently(subject, marker)
+
+# --- Async Engine ---
+# Hot routers talk to the database through an AsyncSession so a slow query parks a coroutine
+# instead of one of the 40 threadpool slots. With DB_ASYNC_ENABLED off, the same routers get a
+# ThreadedSession: the identical awaitable API backed by the sync engine on the threadpool.
+
+async_engine = None
+async_replica_engine = None
+AsyncSessionLocal = None
+
+if settings.DB_ASYNC_ENABLED:
+    from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+    async_engine = create_async_engine(settings.SQLALCHEMY_ASYNC_DATABASE_URI, **pool_options(is_async=True))
+    instrument_engine(async_engine.sync_engine)
+    if settings.SQLALCHEMY_ASYNC_REPLICA_URI:
+        async_replica_engine = create_async_engine(settings.SQLALCHEMY_ASYNC_REPLICA_URI, **pool_options(is_async=True))
+        instrument_engine(async_replica_engine.sync_engine)
+
+    class AsyncRoutingSession(RoutingSession):
+        replica_bind = async_replica_engine.sync_engine if async_replica_engine is not None else None
+
+    # expire_on_commit=False: attributes must stay readable after commit without an implicit (sync) reload
+    AsyncSessionLocal = async_sessionmaker(
+        async_engine, autoflush=False, expire_on_commit=False, sync_session_class=AsyncRoutingSession
+    )
+
+class ThreadedSession:
+    """AsyncSession-compatible wrapper that runs a sync Session's I/O on the threadpool."""
+
+    def __init__(self, session):
+        self.sync_session = session
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    def add(self, instance):
+        self.sync_session.add(instance)
+
+    def add_all(self, instances):
+        self.sync_session.add_all(instances)
+
+    async def execute(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.execute, statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalar, statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        return await run_in_threadpool(self.sync_session.scalars, statement, *args, **kwargs)
+
+    async def get(self, entity, ident, **kwargs):
+        return await run_in_threadpool(self.sync_session.get, entity, ident, **kwargs)
+
+    async def delete(self, instance):
+        await run_in_threadpool(self.sync_session.delete, instance)
+
+    async def flush(self):
+        await run_in_threadpool(self.sync_session.flush)
+
+    async def refresh(self, instance, *args, **kwargs):
+        await run_in_threadpool(self.sync_session.refresh, instance, *args, **kwargs)
+
+    async def commit(self):
+        await run_in_threadpool(self.sync_session.commit)
+
+    async def rollback(self):
+        await run_in_threadpool(self.sync_session.rollback)
+
+    async def close(self):
+        await run_in_threadpool(self.sync_session.close)
+
+def new_async_session(read_only: bool = False):
+    if AsyncSessionLocal is not None:
+        db = AsyncSessionLocal()
+    else:
+        db = ThreadedSession(SessionLocal(expire_on_commit=False))
+    db.sync_session.info["read_only"] = read_only
+    return db
@@ -1,8 +1,13 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
 from app.core.config import settings
+from app.core import security
 import app.db.base # Register models
-from app.api import auth, services, consents, data_access, documents, loan, crop_advisory
+from app.api import auth, services, consents, data_access, documents, loan, crop_advisory, internal, deps
+from app.db import session
+from app.services import audit_service, consent_service, preview_service
 
 app = FastAPI(title=settings.PROJECT_NAME, openapi_url=f"{settings.API_V1_STR}/openapi.json")
 
@@ -19,13 +24,36 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Retry-After", "Upload-Offset"], # Read by the portal's resumable uploader
 )
 
-# Mount Uploads for Static Access (Local Dev Only)
-from fastapi.staticfiles import StaticFiles
-import os
-os.makedirs("uploads", exist_ok=True) # Ensure dir exists
-app.mount("/uploads", StaticFiles(directory="uploads"), name="uploads")
+# Document files: no public mount. Downloads are signed, expiring links issued after the ACL /
+# consent check (document_service.download_url); with DOWNLOAD_OFFLOAD the proxy sends the bytes.
+from fastapi import HTTPException
+from app.core import storage
+from app.services import document_service
+
+@app.get("/files/{key:path}", include_in_schema=False)
+async def serve_signed_file(key: str, request: Request):
+    # Target of document_service.download_url(): the ACL / consent check happened when the link was issued
+    link = storage.verify_file_link(key, dict(request.query_params))
+    if link is None:
+        raise HTTPException(status_code=403, detail="Link invalid or expired")
+    stored = document_service.StoredFile(
+        storage_path=key,
+        media_type=link["type"] or None,
+        filename=link["name"] or None,
+        size_bytes=int(link["size"]) if link["size"] else None,
+        sha256=link["etag"] or None,
+        is_encrypted=link["dec"] == "1",
+    )
+    # Revalidations are answered before storage is touched
+    not_modified = document_service.not_modified_response(request, stored)
+    if not_modified is not None:
+        return not_modified
+    if not await storage.get_storage().exists(key):
+        raise HTTPException(status_code=404, detail="Not Found")
+    return document_service.file_response(request, stored, disposition=link["disp"])
 
 # Include Routers
 app.include_router(auth.router, prefix=f"{settings.API_V1_STR}/auth", tags=["auth"])
@@ -35,6 +63,65 @@ app.include_router(data_access.router, prefix=f"{settings.API_V1_STR}/user", tag
 app.include_router(documents.router, prefix=f"{settings.API_V1_STR}/documents", tags=["documents"])
 app.include_router(loan.router, prefix=f"{settings.API_V1_STR}/loan", tags=["loan"])
 app.include_router(crop_advisory.router, prefix=f"{settings.API_V1_STR}/crop-advisory", tags=["crop-advisory"])
+app.include_router(internal.router, prefix="/internal", tags=["internal"], include_in_schema=False)
+
+@app.middleware("http")
+async def track_primary_writes(request: Request, call_next):
+    # Hand the writer a signed write marker so their follow-up reads skip the (possibly lagging) replica,
+    # on any worker. Routes that write without a bearer token (/oauth/grant) name the subject in request.state.
+    response = await call_next(request)
+    if session.replica_engine is not None and request.method not in ("GET", "HEAD", "OPTIONS") and response.status_code < 400:
+        subject = getattr(request.state, "write_subject", None) or deps.request_subject(request)
+        if subject:
+            marker = session.write_marker(subject)
+            response.set_cookie(
+                session.WRITE_MARKER_COOKIE, marker, max_age=settings.DB_REPLICA_STICKY_SECONDS,
+                httponly=True, samesite="lax", secure=settings.PUBLIC_BASE_URL.startswith("https://"),
+            )
+            response.headers[session.WRITE_MARKER_HEADER] = marker
+    return response
+
+@app.middleware("http")
+async def reject_oversized_uploads(request: Request, call_next):
+    # Refuse bodies that announce they are too big before the multipart parser spools them to disk.
+    # Uploads without Content-Length are still capped while streaming (document_service.stage_stream).
+    if request.method in ("POST", "PUT") and request.url.path.startswith(f"{settings.API_V1_STR}/documents"):
+        content_length = request.headers.get("content-length")
+        if content_length and content_length.isdigit() and int(content_length) > settings.MAX_UPLOAD_BYTES + 64 * 1024:
+            return JSONResponse(
+                status_code=413,
+                content={"detail": f"File exceeds the {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit"},
+            )
+    return await call_next(request)
+
+@app.exception_handler(PoolTimeoutError)
+async def pool_exhausted_handler(request: Request, exc: PoolTimeoutError):
+    # All connections busy for DB_POOL_TIMEOUT seconds: shed load instead of queueing requests
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service temporarily overloaded. Please retry shortly."},
+        headers={"Retry-After": "1"},
+    )
+
+@app.on_event("startup")
+def start_workers():
+    audit_service.start()
+
+@app.on_event("startup")
+async def start_consent_listener():
+    consent_service.start_listener() # Needs the running loop, hence its own async hook
+    consent_service.start_sweeper()
+
+@app.on_event("shutdown")
+async def stop_consent_listener():
+    await consent_service.stop_sweeper()
+    await consent_service.stop_listener()
+
+@app.on_event("shutdown")
+def shutdown_workers():
+    audit_service.stop() # Drain queued audit events before the process exits
+    security.shutdown_hash_executor()
+    preview_service.shutdown_executor()
 
 @app.get("/")
 def read_root():
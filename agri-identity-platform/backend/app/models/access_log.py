@@ -1,20 +1,36 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index, DDL, event
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base_class import Base
 
 class AccessLog(Base):
-    id = Column(Integer, primary_key=True, index=True)
+    # Range-partitioned by month on timestamp (migrations/002_partition_accesslog.sql), so the
+    # partition key has to be part of the primary key. Partitions are managed by `maintenance.py partitions`.
+    id = Column(Integer, primary_key=True, autoincrement=True, index=True)
     farmer_id = Column(Integer, ForeignKey("farmer.id"))
     service_id = Column(Integer, ForeignKey("service.id"))
     
     action = Column(String) # e.g., "READ_PROFILE", "READ_LAND_RECORD"
     resource = Column(String) # Specific resource accessed
     ip_address = Column(String)
-    timestamp = Column(DateTime, default=datetime.utcnow)
+    timestamp = Column(DateTime, primary_key=True, default=datetime.utcnow)
     
     status = Column(String) # "SUCCESS", "DENIED"
     details = Column(String, nullable=True)
 
+    # Mirrors migrations/002_partition_accesslog.sql
+    __table_args__ = (
+        Index("ix_accesslog_farmer_timestamp", farmer_id, timestamp.desc(), id.desc()),
+        {"postgresql_partition_by": "RANGE (timestamp)"},
+    )
+
     farmer = relationship("Farmer", back_populates="access_logs")
     service = relationship("Service", back_populates="access_logs")
+
+# A partitioned table accepts no rows until it has a partition; the default one catches anything
+# outside the monthly ranges until maintenance moves it into a proper partition.
+event.listen(
+    AccessLog.__table__,
+    "after_create",
+    DDL("CREATE TABLE IF NOT EXISTS accesslog_default PARTITION OF accesslog DEFAULT").execute_if(dialect="postgresql"),
+)
@@ -0,0 +1,13 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Boolean
+from datetime import datetime
+from app.db.base_class import Base
+
+class Blob(Base):
+    # Content-addressed file in the document vault, shared by every Document with the same
+    # plaintext SHA-256. Deleted (with its file) when the last referencing Document goes.
+    sha256 = Column(String(64), primary_key=True)
+    storage_path = Column(String, nullable=False, index=True) # uploads/blobs/ab/cd/<sha256>.bin
+    size_bytes = Column(BigInteger, nullable=False) # Plaintext size
+    is_encrypted = Column(Boolean, default=False, nullable=False)
+    refcount = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, default=datetime.utcnow)
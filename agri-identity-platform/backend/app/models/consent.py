@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime, ForeignKey, Index, text
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from app.db.base_class import Base
+from app.core import scopes
 
 class Consent(Base):
     id = Column(Integer, primary_key=True, index=True)
@@ -12,11 +13,24 @@ class Consent(Base):
     # The actual permissions granted by the user
     # e.g., ["profile", "land_records"] (Might be a subset of what was requested)
     granted_scopes = Column(JSONB, default=[])
+    granted_scope_mask = Column(BigInteger, default=0, nullable=False) # core/scopes.py bits; set by a DB trigger (migration 011), mirrored below for unflushed objects
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Keyset pagination sort key; NOT NULL since migration 013
     expires_at = Column(DateTime, nullable=True) # Consent can be time-bound
     revoked_at = Column(DateTime, nullable=True) # If user manually revokes
     is_active = Column(Boolean, default=True)
 
+    # Mirrors migrations/001_hot_path_indexes.sql and 009_consent_expiry.sql
+    __table_args__ = (
+        Index("ix_consent_active_farmer_service", farmer_id, service_id, postgresql_where=text("is_active")),
+        Index("ix_consent_farmer_service_created", farmer_id, service_id, created_at), # Includes inactive rows
+        Index("ix_consent_active_expires", expires_at, id, postgresql_where=text("is_active AND expires_at IS NOT NULL")),
+    )
+
     farmer = relationship("Farmer", back_populates="consents")
     service = relationship("Service", back_populates="consents")
+
+    @validates("granted_scopes")
+    def _compile_granted_scopes(self, key, value):
+        self.granted_scope_mask = scopes.mask_of(value)
+        return value
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -21,16 +21,24 @@ class CropAdvisory(Base):
     last_yield = Column(String, nullable=True)
     soil_health_doc_id = Column(Integer, ForeignKey("document.id"), nullable=True)
     
-    status = Column(String, default="PENDING") # PENDING, ADVISED, REVOKED
+    # PENDING, ADVISED, WITHDRAWN (by the farmer while pending), EXPIRED (consent ran out while
+    # pending: set by the expiry sweeper, services/consent_service.py). Only PENDING / ADVISED can be advised.
+    status = Column(String, default="PENDING")
     
     # Admin Output
     recommendation = Column(Text, nullable=True)
     fertilizer_plan = Column(Text, nullable=True)
     sowing_schedule = Column(Text, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Keyset pagination sort key; NOT NULL since migration 013
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Mirrors migrations/001_hot_path_indexes.sql
+    __table_args__ = (
+        Index("ix_crop_advisory_farmer_service_status", farmer_id, service_id, status),
+        Index("ix_crop_advisory_service_created", service_id, created_at, id),
+    )
+
     # Relationships
     farmer = relationship("Farmer")
     service = relationship("Service")
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, Boolean
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Boolean, Index, text
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.db.base_class import Base
@@ -10,10 +10,30 @@ class Document(Base):
     title = Column(String, nullable=False) # User friendly name "My Land Deed"
     doc_type = Column(String, default="OTHER") # IDENTITY, LAND_RECORD, ...
     filename = Column(String, nullable=False) # original.pdf
-    storage_path = Column(String, nullable=False) # uploads/enc_1234.bin
+    storage_path = Column(String, nullable=False, index=True) # uploads/blobs/ab/cd/<sha256>.bin (older rows: uploads/enc_1234.bin)
     mime_type = Column(String, nullable=False)
     is_sensitive = Column(Boolean, default=False)
+    sha256 = Column(String(64), ForeignKey("blob.sha256"), nullable=True, index=True) # Plaintext digest = content address of the shared Blob
+    size_bytes = Column(BigInteger, nullable=True)
+    is_encrypted = Column(Boolean, default=False, nullable=False) # Stored in the vault format (core/encryption.py)
+
+    # Ingestion (ingest_worker.py): RECEIVED -> PROCESSING -> READY / FAILED
+    ingest_status = Column(String(16), default="RECEIVED", nullable=False)
+    ingest_attempts = Column(Integer, default=0, nullable=False)
+    ingest_started_at = Column(DateTime, nullable=True) # PROCESSING rows older than INGEST_TIMEOUT_SECONDS are retried
+    ingest_error = Column(String, nullable=True)
+    ingested_at = Column(DateTime, nullable=True)
+    page_count = Column(Integer, nullable=True) # PDFs; 1 for images
+    width = Column(Integer, nullable=True) # Images, in pixels
+    height = Column(Integer, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Keyset pagination sort key; NOT NULL since migration 013
+
+    # Mirrors migrations/001_hot_path_indexes.sql
+    __table_args__ = (
+        Index("ix_document_farmer_created", farmer_id, created_at, id),
+        # Mirrors migrations/007_document_ingest.sql: the worker's queue, tiny once the backlog drains
+        Index("ix_document_ingest_pending", id, postgresql_where=text("ingest_status IN ('RECEIVED', 'PROCESSING')")),
+    )
     
     farmer = relationship("Farmer", back_populates="documents")
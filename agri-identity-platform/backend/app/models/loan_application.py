@@ -1,5 +1,5 @@
 
-from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text
+from sqlalchemy import Column, Integer, String, Boolean, DateTime, ForeignKey, Text, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -15,9 +15,15 @@ class LoanApplication(Base):
     documents_snapshot = Column(JSONB, default=[]) # List of doc IDs
     admin_notes = Column(Text, nullable=True)
     
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Keyset pagination sort key; NOT NULL since migration 013
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
+    # Mirrors migrations/001_hot_path_indexes.sql
+    __table_args__ = (
+        Index("ix_loan_application_farmer_service_status", farmer_id, service_id, status),
+        Index("ix_loan_application_service_created", service_id, created_at, id),
+    )
+
     # Relationships
     farmer = relationship("Farmer")
     service = relationship("Service")
@@ -0,0 +1,14 @@
+from sqlalchemy import Column, Integer, String, DateTime
+from datetime import datetime
+from app.db.base_class import Base
+
+class MaintenanceCheckpoint(Base):
+    # Progress of a resumable maintenance walk (maintenance.py orphans): the last key processed,
+    # so the next run continues there instead of starting the pass over.
+    __tablename__ = "maintenance_checkpoint"
+
+    name = Column(String(64), primary_key=True)
+    position = Column(String, default="", nullable=False) # "" = start of a new pass
+    pass_started_at = Column(DateTime, nullable=True)
+    passes_completed = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, Boolean, DateTime
+from sqlalchemy import Column, Integer, BigInteger, String, Boolean, DateTime
 from sqlalchemy.dialects.postgresql import JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import relationship, validates
 from datetime import datetime
 from app.db.base_class import Base
+from app.core import scopes
 
 class Service(Base):
     id = Column(Integer, primary_key=True, index=True)
@@ -15,9 +16,15 @@ class Service(Base):
     # Scopes this service is allowed to request
     # e.g., ["profile", "land_records", "bank_details"]
     allowed_scopes = Column(JSONB, default=[])
+    allowed_scope_mask = Column(BigInteger, default=0, nullable=False) # core/scopes.py bits; set by a DB trigger (migration 011), mirrored below for unflushed objects
 
     is_active = Column(Boolean, default=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False) # Keyset pagination sort key; NOT NULL since migration 013
 
     consents = relationship("Consent", back_populates="service")
     access_logs = relationship("AccessLog", back_populates="service")
+
+    @validates("allowed_scopes")
+    def _compile_allowed_scopes(self, key, value):
+        self.allowed_scope_mask = scopes.mask_of(value)
+        return value
@@ -0,0 +1,27 @@
+from sqlalchemy import Column, Integer, BigInteger, String, ForeignKey, DateTime, Boolean, Index
+from datetime import datetime
+from app.db.base_class import Base
+
+class UploadSession(Base):
+    # Resumable upload in progress (documents.py /uploads). The bytes received so far sit in
+    # UPLOAD_TMP_DIR/<id>.upload; finalizing turns them into a Document and deletes this row.
+    id = Column(String(32), primary_key=True) # uuid4 hex, also names the partial file
+    farmer_id = Column(Integer, ForeignKey("farmer.id"), nullable=False)
+
+    # Document metadata, fixed when the session is created
+    title = Column(String, nullable=False)
+    doc_type = Column(String, default="OTHER")
+    filename = Column(String, nullable=False)
+    mime_type = Column(String, nullable=False)
+    is_sensitive = Column(Boolean, default=False)
+
+    total_bytes = Column(BigInteger, nullable=False) # Declared up front, capped at MAX_UPLOAD_BYTES
+    received_bytes = Column(BigInteger, default=0, nullable=False) # Next offset the client must send
+    lease_until = Column(DateTime, nullable=True) # Set while a chunk is being written; one writer at a time
+
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow) # Last chunk; stale sessions are garbage-collected
+
+    __table_args__ = (
+        Index("ix_upload_session_updated", updated_at),
+    )
@@ -0,0 +1,46 @@
+from typing import Optional
+from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.blob import Blob
+from app.models.document import Document
+
+async def acquire_blob(db: AsyncSession, sha256: str, storage_path: str, size_bytes: int, is_encrypted: bool) -> Blob:
+    """
+    Insert the blob row with refcount 1, or bump the refcount of the existing one, in one statement.
+    The upsert leaves the row locked until the caller commits, which serialises it against release_blob.
+    """
+    stmt = pg_insert(Blob).values(
+        sha256=sha256,
+        storage_path=storage_path,
+        size_bytes=size_bytes,
+        is_encrypted=is_encrypted,
+        refcount=1
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[Blob.sha256],
+        set_={"refcount": Blob.refcount + 1}
+    ).returning(Blob)
+    return (await db.scalars(stmt, execution_options={"populate_existing": True})).one()
+
+async def release_blob(db: AsyncSession, doc: Document) -> Optional[Blob]:
+    """
+    Drop one reference for a document that is being deleted.
+    Returns the Blob if this was the last reference (row already marked for deletion), else None.
+    """
+    if not doc.sha256:
+        return None
+    blob = await db.scalar(select(Blob).where(Blob.sha256 == doc.sha256).with_for_update())
+    if blob is None or blob.storage_path != doc.storage_path:
+        return None # Pre-blob-store document with its own file
+    blob.refcount -= 1
+    if blob.refcount > 0:
+        return None
+    await db.delete(blob)
+    return blob
+
+async def count_path_references(db: AsyncSession, storage_path: str, exclude_doc_id: int = None) -> int:
+    stmt = select(func.count(Document.id)).where(Document.storage_path == storage_path)
+    if exclude_doc_id is not None:
+        stmt = stmt.where(Document.id != exclude_doc_id)
+    return await db.scalar(stmt)
@@ -1,10 +1,43 @@
-from sqlalchemy.orm import Session
+from dataclasses import dataclass
+from typing import Optional
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import datetime
 from app.models.consent import Consent
 
-def create_consent(db: Session, farmer_id: int, service_id: int, scopes: list):
+@dataclass(frozen=True)
+class ConsentDecision:
+    status: str # "ACTIVE", "EXPIRED" (deactivated by the sweeper), "REVOKED" or "NONE" (never granted)
+    expires_at: Optional[datetime] = None
+    consent_id: Optional[int] = None # Of the active row; tokens minted by /oauth/grant carry it as "cid"
+    scope_mask: int = 0 # Granted scopes of the active row (core/scopes.py bits)
+
+    def state(self, now: datetime = None) -> str:
+        """ACTIVE / EXPIRED / REVOKED / NONE as of now."""
+        if self.status == "ACTIVE" and self.expires_at is not None and self.expires_at <= (now or datetime.utcnow()):
+            return "EXPIRED"
+        return self.status
+
+    def is_valid(self, now: datetime = None) -> bool:
+        return self.state(now) == "ACTIVE"
+
+    def allows(self, mask: int) -> bool:
+        """Whether every scope in mask was granted."""
+        return mask & ~self.scope_mask == 0
+
+def decision_from_row(row) -> ConsentDecision:
+    """Map a (consent_id, scope_mask, is_active, expires_at, revoked_at) row, as picked by get_consent_state, to a decision."""
+    if row is None or row.is_active is None: # is_active is NULL when the row came from an outer join
+        return ConsentDecision("NONE")
+    if row.is_active:
+        return ConsentDecision("ACTIVE", row.expires_at, row.consent_id, row.scope_mask)
+    if row.revoked_at is None and row.expires_at is not None and row.expires_at <= datetime.utcnow():
+        return ConsentDecision("EXPIRED", row.expires_at) # Deactivated by the expiry sweeper, not the farmer
+    return ConsentDecision("REVOKED")
+
+async def create_consent(db: AsyncSession, farmer_id: int, service_id: int, scopes: list):
     # Check if exists, deactivate old one
-    existing = get_active_consent(db, farmer_id, service_id)
+    existing = await get_active_consent(db, farmer_id, service_id)
     if existing:
         existing.is_active = False
         existing.revoked_at = datetime.utcnow()
@@ -16,22 +49,45 @@ def create_consent(db: Session, farmer_id: int, service_id: int, scopes: list):
         is_active=True
     )
     db.add(consent)
-    db.commit()
-    db.refresh(consent)
+    await notify_consent_changed(db, farmer_id, service_id)
+    await db.commit()
+    await db.refresh(consent)
     return consent
 
-def get_active_consent(db: Session, farmer_id: int, service_id: int):
-    return db.query(Consent).filter(
+async def get_active_consent(db: AsyncSession, farmer_id: int, service_id: int, for_update: bool = False):
+    stmt = select(Consent).where(
         Consent.farmer_id == farmer_id,
         Consent.service_id == service_id,
         Consent.is_active == True
-    ).first()
+    ).limit(1)
+    if for_update:
+        # Before changing the row: the expiry sweeper skips it, or we wait for it and see it inactive
+        stmt = stmt.with_for_update()
+    return await db.scalar(stmt)
 
-def revoke_consent(db: Session, farmer_id: int, service_id: int):
-    consent = get_active_consent(db, farmer_id, service_id)
+async def revoke_consent(db: AsyncSession, farmer_id: int, service_id: int):
+    consent = await get_active_consent(db, farmer_id, service_id)
     if consent:
         consent.is_active = False
         consent.revoked_at = datetime.utcnow()
-        db.commit()
+        await notify_consent_changed(db, farmer_id, service_id)
+        await db.commit()
         return True
     return False
+
+async def get_consent_state(db: AsyncSession, farmer_id: int, service_id: int):
+    # The active row if there is one, else the most recent revoked / expired one; None if never granted
+    return (await db.execute(
+        select(Consent.id.label("consent_id"), Consent.granted_scope_mask.label("scope_mask"), Consent.is_active, Consent.expires_at, Consent.revoked_at)
+        .where(Consent.farmer_id == farmer_id, Consent.service_id == service_id)
+        .order_by(Consent.is_active.desc(), Consent.created_at.desc())
+        .limit(1)
+    )).first()
+
+async def notify_consent_changed(db: AsyncSession, farmer_id: int, service_id: int):
+    """
+    Tell every API worker to drop its cached decision (services/consent_service.py). Call in the
+    transaction that changes the consent, before commit: Postgres delivers it only if that commits.
+    """
+    if db.sync_session.get_bind().dialect.name == "postgresql":
+        await db.execute(text("SELECT pg_notify('consent_changed', :payload)"), {"payload": f"{farmer_id}:{service_id}"})
@@ -1,4 +1,6 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.farmer import Farmer
 from app.schemas.all import FarmerCreate
 from app.core.security import get_password_hash, encrypt_data
@@ -9,6 +11,12 @@ def get_farmer_by_phone(db: Session, phone_number: str):
 def get_farmer_by_email(db: Session, email: str):
     return db.query(Farmer).filter(Farmer.email == email).first()
 
+async def get_farmer_by_phone_async(db: AsyncSession, phone_number: str):
+    return await db.scalar(select(Farmer).where(Farmer.phone_number == phone_number).limit(1))
+
+async def get_farmer_by_email_async(db: AsyncSession, email: str):
+    return await db.scalar(select(Farmer).where(Farmer.email == email).limit(1))
+
 def create_farmer(db: Session, farmer: FarmerCreate):
     db_farmer = Farmer(
         full_name=farmer.full_name,
@@ -29,3 +37,13 @@ def authenticate_farmer(db: Session, phone_number: str, password: str):
     if not verify_password(password, farmer.hashed_password):
         return None
     return farmer
+
+async def authenticate_farmer_async(db: AsyncSession, phone_number: str, password: str):
+    # Both halves stay off the event loop: the lookup is awaited, bcrypt runs in the hashing pool
+    from app.core.security import verify_password_async
+    farmer = await get_farmer_by_phone_async(db, phone_number)
+    if not farmer:
+        return None
+    if not await verify_password_async(password, farmer.hashed_password):
+        return None
+    return farmer
@@ -0,0 +1,100 @@
+from dataclasses import dataclass, field
+from typing import List, Optional
+from sqlalchemy import Integer, and_, cast, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.models.document import Document
+from app.models.loan_application import LoanApplication
+from app.repositories.consent_repo import ConsentDecision
+
+# --- Admin Access Policy ---
+# An admin reading a farmer's documents needs: the resource to exist, to belong to the admin's
+# service domain, a valid consent from the farmer to that service, and the documents to belong to
+# the farmer. The queries below resolve the resource, its domain and its documents in one
+# statement. The consent half is a ConsentDecision from consent_service.get_decision, which is
+# cached per pair and evicted through LISTEN/NOTIFY on revocation; apply_consent() folds it in.
+# So a check costs one round trip with a warm cache and two on a miss. The verdict comes back as
+# a structured reason; the routers turn it into their own HTTP errors.
+
+# Denial reasons
+NOT_FOUND = "NOT_FOUND"
+WRONG_SERVICE = "WRONG_SERVICE"
+CONSENT_MISSING = "CONSENT_MISSING"
+CONSENT_REVOKED = "CONSENT_REVOKED"
+CONSENT_EXPIRED = "CONSENT_EXPIRED"
+CONSENT_NOT_TIME_BOUND = "CONSENT_NOT_TIME_BOUND" # Loan access requires an expiring consent
+
+@dataclass
+class AccessCheck:
+    denial: Optional[str] = None # None = allowed
+    farmer_id: Optional[int] = None
+    service_id: Optional[int] = None
+    consent: ConsentDecision = ConsentDecision("NONE")
+    documents: List[Document] = field(default_factory=list)
+
+    @property
+    def allowed(self) -> bool:
+        return self.denial is None
+
+def apply_consent(check: AccessCheck, decision: ConsentDecision, time_bound: bool) -> AccessCheck:
+    """Deny check unless decision (the farmer's consent to check.service_id) is valid; denied checks carry no documents."""
+    if not check.allowed:
+        return check
+    check.consent = decision
+    state = decision.state()
+    if state == "NONE":
+        check.denial = CONSENT_MISSING
+    elif state == "REVOKED":
+        check.denial = CONSENT_REVOKED
+    elif state == "EXPIRED":
+        check.denial = CONSENT_EXPIRED
+    elif time_bound and decision.expires_at is None:
+        check.denial = CONSENT_NOT_TIME_BOUND
+    if not check.allowed:
+        check.documents = []
+    return check
+
+async def loan_application_access(db: AsyncSession, application_id: int, admin_service_id: int,
+                                  doc_id: int = None) -> AccessCheck:
+    """
+    An admin's access to a loan application's documents (all of the snapshot, or just doc_id from
+    it), in one round trip. Consent is not checked yet: pass the result to apply_consent.
+    """
+    app = (
+        select(LoanApplication.farmer_id, LoanApplication.service_id, LoanApplication.documents_snapshot)
+        .where(LoanApplication.id == application_id)
+        .cte("app")
+    )
+    snapshot = func.jsonb_array_elements_text(app.c.documents_snapshot).table_valued("value")
+    document_filter = [
+        Document.id.in_(select(cast(snapshot.c.value, Integer)).scalar_subquery()),
+        Document.farmer_id == app.c.farmer_id, # Ownership: snapshots only ever list the farmer's own documents
+        app.c.service_id == admin_service_id, # Other domains' documents are never loaded
+    ]
+    if doc_id is not None:
+        document_filter.append(Document.id == doc_id)
+
+    stmt = (
+        select(app.c.farmer_id, app.c.service_id, Document)
+        .select_from(app)
+        .outerjoin(Document, and_(*document_filter))
+        .order_by(Document.id)
+    )
+    rows = (await db.execute(stmt)).all()
+    if not rows:
+        return AccessCheck(denial=NOT_FOUND)
+    check = AccessCheck(farmer_id=rows[0].farmer_id, service_id=rows[0].service_id)
+    if check.service_id != admin_service_id:
+        check.denial = WRONG_SERVICE
+    else:
+        check.documents = [row.Document for row in rows if row.Document is not None]
+    return check
+
+async def farmer_document_access(db: AsyncSession, doc_id: int, admin_service_id: int) -> AccessCheck:
+    """
+    An admin's access to one farmer document. The consent that counts is the admin's own service's,
+    so there is no domain to mismatch; pass the result to apply_consent.
+    """
+    doc = await db.scalar(select(Document).where(Document.id == doc_id))
+    if doc is None:
+        return AccessCheck(denial=NOT_FOUND)
+    return AccessCheck(farmer_id=doc.farmer_id, service_id=admin_service_id, documents=[doc])
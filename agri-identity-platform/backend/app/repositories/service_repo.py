@@ -1,4 +1,6 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.models.service import Service
 from app.schemas.all import ServiceCreate
 import secrets
@@ -31,3 +33,6 @@ def verify_client(db: Session, client_id: str, client_secret: str = None) -> Ser
     # If secret is provided, check it (usually for token exchange)
     # For now we might just check ID for the initial authorize GET
     return service
+
+async def verify_client_async(db: AsyncSession, client_id: str, client_secret: str = None) -> Service:
+    return await db.scalar(select(Service).where(Service.client_id == client_id).limit(1))
@@ -0,0 +1,58 @@
+from datetime import datetime, timedelta
+from typing import Optional
+from sqlalchemy import select, update, delete, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import set_committed_value
+from app.models.upload_session import UploadSession
+
+async def get_session(db: AsyncSession, upload_id: str, farmer_id: int) -> Optional[UploadSession]:
+    return await db.scalar(
+        select(UploadSession).where(UploadSession.id == upload_id, UploadSession.farmer_id == farmer_id)
+    )
+
+async def claim_lease(db: AsyncSession, upload_id: str, farmer_id: int, lease_seconds: int) -> Optional[UploadSession]:
+    """
+    Take the session's write lease in one statement and commit it, so no row lock is held while
+    the chunk crawls in over a slow link. None if the session is missing or another writer holds it.
+    """
+    now = datetime.utcnow()
+    stmt = (
+        update(UploadSession)
+        .where(
+            UploadSession.id == upload_id,
+            UploadSession.farmer_id == farmer_id,
+            or_(UploadSession.lease_until.is_(None), UploadSession.lease_until < now),
+        )
+        .values(lease_until=now + timedelta(seconds=lease_seconds))
+        .returning(UploadSession)
+    )
+    session = (await db.scalars(stmt, execution_options={"populate_existing": True})).one_or_none()
+    await db.commit()
+    return session
+
+async def renew_lease(db: AsyncSession, session: UploadSession, lease_seconds: int) -> bool:
+    """Extend a held lease. False if it expired and someone else took over."""
+    lease_until = datetime.utcnow() + timedelta(seconds=lease_seconds)
+    result = await db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.lease_until == session.lease_until)
+        .values(lease_until=lease_until)
+    )
+    await db.commit()
+    if result.rowcount != 1:
+        return False
+    set_committed_value(session, "lease_until", lease_until) # Not a pending change: nothing to flush later
+    return True
+
+async def release_lease(db: AsyncSession, session: UploadSession, received_bytes: int) -> bool:
+    """Record progress and free the lease. False if the lease expired and someone else took over."""
+    result = await db.execute(
+        update(UploadSession)
+        .where(UploadSession.id == session.id, UploadSession.lease_until == session.lease_until)
+        .values(received_bytes=received_bytes, lease_until=None, updated_at=datetime.utcnow())
+    )
+    await db.commit()
+    return result.rowcount == 1
+
+async def delete_session(db: AsyncSession, upload_id: str):
+    await db.execute(delete(UploadSession).where(UploadSession.id == upload_id))
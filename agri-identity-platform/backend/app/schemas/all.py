@@ -1,5 +1,13 @@
-from typing import Optional, List, Dict, Any
-from pydantic import BaseModel, EmailStr
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Generic, TypeVar
+from pydantic import BaseModel, EmailStr, Field
+
+T = TypeVar("T")
+
+# --- Pagination ---
+class Page(BaseModel, Generic[T]):
+    items: List[T]
+    next_cursor: Optional[str] = None # Pass back as ?after= to fetch the next page
 
 # --- Token Schemas ---
 class Token(BaseModel):
@@ -12,6 +20,16 @@ class Token(BaseModel):
 class TokenData(BaseModel):
     id: Optional[str] = None
 
+class TokenIntrospection(BaseModel):
+    # RFC 7662 section 2.2; an inactive token gets {"active": false} and nothing else
+    active: bool
+    scope: Optional[str] = None
+    client_id: Optional[str] = None
+    token_type: Optional[str] = None
+    sub: Optional[str] = None
+    exp: Optional[int] = None
+    iat: Optional[int] = None
+
 # --- Farmer Schemas ---
 class FarmerBase(BaseModel):
     full_name: str
@@ -108,11 +126,40 @@ class DocumentResponse(BaseModel):
     storage_path: str # Added to allow accessing the actual file
     mime_type: str
     is_sensitive: bool
+    sha256: Optional[str] = None
+    size_bytes: Optional[int] = None
+    is_encrypted: bool = False
+    ingest_status: Optional[str] = None # RECEIVED / PROCESSING until ingest_worker.py has inspected the file
+    page_count: Optional[int] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
     created_at: Any
     
     class Config:
         from_attributes = True
 
+class AdminDocumentResponse(DocumentResponse):
+    download_url: Optional[str] = None # Short-lived; issued only after the consent check
+    preview_url: Optional[str] = None # API path (admin token) of a small JPEG; None for types without a preview
+
+class DownloadLink(BaseModel):
+    url: str
+    expires_in: int # Seconds
+
+class UploadSessionCreate(BaseModel):
+    title: str
+    doc_type: str = "OTHER"
+    filename: str
+    mime_type: str = "application/octet-stream"
+    is_sensitive: bool = False
+    total_bytes: int = Field(..., ge=0)
+
+class UploadSessionResponse(BaseModel):
+    id: str
+    offset: int # Bytes received so far = where the next PUT starts
+    total_bytes: int
+    expires_at: datetime # Dropped if untouched until then
+
 # --- Loan Schemas ---
 class LoanApplicationCreate(BaseModel):
     service_id: int
@@ -0,0 +1,192 @@
+import queue
+import threading
+import time
+from datetime import datetime
+from sqlalchemy import insert
+from sqlalchemy.exc import DataError, IntegrityError
+from starlette.concurrency import run_in_threadpool
+from app.core.config import settings
+from app.db import session
+from app.models.access_log import AccessLog
+
+# --- Audit Sink ---
+# Read endpoints used to INSERT + COMMIT their AccessLog row inline, paying a round-trip and a
+# WAL fsync per request. With AUDIT_DURABILITY="async" they enqueue the row instead and a
+# background thread writes batches with one multi-row INSERT every AUDIT_FLUSH_INTERVAL_MS or
+# AUDIT_BATCH_SIZE rows, whichever comes first.
+#
+# Trade-off: a crash loses at most the rows still in the queue (one flush interval's worth).
+# Deployments that cannot accept that set AUDIT_DURABILITY="sync" to get the old behaviour.
+
+_STOP = object()
+MAX_WRITE_ATTEMPTS = 8 # Per batch, for transient errors (~1 minute of backoff) before its rows are dead-lettered
+
+class AuditSink:
+    def __init__(self, max_queue: int, batch_size: int, flush_interval_ms: int):
+        self._queue = queue.Queue(maxsize=max_queue)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval_ms / 1000
+        self._thread = None
+        self._lock = threading.Lock()
+        self.enqueued = 0
+        self.written = 0
+        self.batches = 0
+        self.write_errors = 0
+        self.dead_lettered = 0
+        self.backpressure_waits = 0
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="audit-sink", daemon=True)
+                self._thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        """Flush everything already queued, then stop the writer thread."""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is None:
+            return
+        try:
+            self._queue.put(_STOP, timeout=timeout) # Blocks if full; a healthy writer frees up room
+        except queue.Full:
+            print(f"⚠️ Audit sink stuck with a full queue; {self._queue.qsize()} events unwritten")
+            return
+        thread.join(timeout)
+        if thread.is_alive():
+            print(f"⚠️ Audit sink did not drain within {timeout}s; {self._queue.qsize()} events unwritten")
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None
+
+    def submit_nowait(self, row: dict) -> bool:
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            return False
+        self.enqueued += 1
+        return True
+
+    def submit_blocking(self, row: dict, timeout: float) -> bool:
+        try:
+            self._queue.put(row, timeout=timeout)
+        except queue.Full:
+            return False
+        self.enqueued += 1
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "running": self.running,
+            "queued": self._queue.qsize(),
+            "max_queue": self._queue.maxsize,
+            "enqueued": self.enqueued,
+            "written": self.written,
+            "batches": self.batches,
+            "write_errors": self.write_errors,
+            "dead_lettered": self.dead_lettered,
+            "backpressure_waits": self.backpressure_waits,
+        }
+
+    def _run(self):
+        batch = []
+        stopping = False
+        deadline = time.monotonic() + self.flush_interval
+        while not stopping:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                if item is _STOP:
+                    stopping = True
+                else:
+                    batch.append(item)
+            except queue.Empty:
+                pass
+
+            if batch and (stopping or len(batch) >= self.batch_size or time.monotonic() >= deadline):
+                self._write(batch, retry=not stopping)
+                batch = []
+            if time.monotonic() >= deadline:
+                deadline = time.monotonic() + self.flush_interval
+
+        # Drain whatever producers managed to enqueue behind the stop marker
+        leftover = []
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP:
+                leftover.append(item)
+        for i in range(0, len(leftover), self.batch_size):
+            self._write(leftover[i:i + self.batch_size], retry=False)
+
+    def _write(self, batch: list, retry: bool):
+        delay = 0.5
+        attempts = MAX_WRITE_ATTEMPTS if retry else 1
+        for attempt in range(1, attempts + 1):
+            try:
+                with session.engine.begin() as conn:
+                    # executemany with a single statement: SQLAlchemy sends it as a multi-row INSERT
+                    conn.execute(insert(AccessLog), batch)
+                self.written += len(batch)
+                self.batches += 1
+                return
+            except (IntegrityError, DataError) as e:
+                # The rows are at fault (FK to a deleted farmer, oversized value): retrying never helps.
+                # Split the batch until the bad rows are isolated, write the rest.
+                self.write_errors += 1
+                if len(batch) == 1:
+                    self._dead_letter(batch, e)
+                    return
+                middle = len(batch) // 2
+                self._write(batch[:middle], retry)
+                self._write(batch[middle:], retry)
+                return
+            except Exception as e:
+                # Connection lost, database restarting, ...: keep the batch and retry with backoff,
+                # meanwhile the bounded queue pushes back on producers
+                self.write_errors += 1
+                print(f"❌ Audit sink failed to write {len(batch)} events (attempt {attempt}/{attempts}): {e}")
+                if attempt < attempts:
+                    time.sleep(delay)
+                    delay = min(delay * 2, 10.0)
+        self._dead_letter(batch, "gave up after repeated failures")
+
+    def _dead_letter(self, rows: list, reason):
+        # Last resort: the event goes to the process log so it is not lost without a trace
+        self.dead_lettered += len(rows)
+        for row in rows:
+            print(f"💀 Audit event dropped ({reason}): {row}")
+
+audit_sink = AuditSink(
+    max_queue=settings.AUDIT_QUEUE_MAX,
+    batch_size=settings.AUDIT_BATCH_SIZE,
+    flush_interval_ms=settings.AUDIT_FLUSH_INTERVAL_MS,
+)
+
+def start():
+    if settings.AUDIT_DURABILITY == "async":
+        audit_sink.start()
+
+def stop():
+    audit_sink.stop()
+
+async def record_access(db, **fields):
+    """
+    Record an AccessLog event. In async durability mode it is queued for the batch writer;
+    in sync mode (or if the sink is not running) it is committed on the caller's session.
+    """
+    fields.setdefault("timestamp", datetime.utcnow()) # Event time, not flush time
+
+    if settings.AUDIT_DURABILITY == "async" and audit_sink.running:
+        if audit_sink.submit_nowait(fields):
+            return
+        # Queue full: the writer is behind. Wait (off the event loop) for room rather than drop the event.
+        audit_sink.backpressure_waits += 1
+        if await run_in_threadpool(audit_sink.submit_blocking, fields, settings.AUDIT_ENQUEUE_TIMEOUT):
+            return
+        print("⚠️ Audit queue still full; writing event synchronously")
+
+    db.add(AccessLog(**fields))
+    await db.commit()
@@ -0,0 +1,288 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Optional, Tuple
+import anyio
+from sqlalchemy import exists, or_, select, tuple_, update
+from sqlalchemy.exc import IntegrityError
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.consent import Consent
+from app.models.crop_advisory import CropAdvisory
+from app.models.loan_application import LoanApplication
+from app.models.maintenance_checkpoint import MaintenanceCheckpoint
+from app.repositories import consent_repo
+from app.repositories.consent_repo import ConsentDecision
+
+# --- Consent Decision Cache ---
+# Admin document views and applications check the same (farmer, service) consent over and over.
+# Each API worker keeps the last decision per pair in memory: whether an active consent exists,
+# and until when. Expiry is evaluated against the cached expires_at on every check, so only
+# revocations and grants need to reach the cache, and they do through Postgres LISTEN/NOTIFY:
+# every write to consent rows calls consent_repo.notify_consent_changed() before its commit (NOTIFY
+# is transactional, so nothing is announced for a rolled-back write), and each worker's listener,
+# this one included, evicts the pair.
+#
+# The cache is only used while this worker's listener is connected. If the connection drops,
+# notifications may have been missed: the cache is cleared and every check goes to the database
+# until the listener is back. CONSENT_CACHE_TTL_SECONDS bounds the life of an entry regardless.
+
+NOTIFY_CHANNEL = "consent_changed"
+
+class ConsentCache:
+    def __init__(self, max_entries: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[int, int], Tuple[ConsentDecision, float]]" = OrderedDict()
+        self._generation = 0 # Bumped on every eviction; a lookup that raced one does not store its result
+        self.listening = False
+
+    def get(self, key) -> Optional[ConsentDecision]:
+        if not self.listening:
+            return None
+        entry = self._entries.get(key)
+        if entry is None or time.monotonic() - entry[1] > self.ttl_seconds:
+            return None
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def put(self, key, decision: ConsentDecision, generation: int):
+        if not self.listening or generation != self._generation:
+            return
+        self._entries[key] = (decision, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    @property
+    def generation(self) -> int:
+        return self._generation
+
+    def evict(self, key):
+        self._generation += 1
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._generation += 1
+        self._entries.clear()
+
+cache = ConsentCache(settings.CONSENT_CACHE_MAX_ENTRIES, settings.CONSENT_CACHE_TTL_SECONDS)
+
+async def get_decision(db, farmer_id: int, service_id: int) -> ConsentDecision:
+    """The consent decision for (farmer, service), from the cache or in one query."""
+    key = (farmer_id, service_id)
+    decision = cache.get(key)
+    if decision is not None:
+        return decision
+    generation = cache.generation
+    decision = consent_repo.decision_from_row(await consent_repo.get_consent_state(db, farmer_id, service_id))
+    cache.put(key, decision, generation)
+    return decision
+
+# --- Listener ---
+
+_listener_task: Optional[asyncio.Task] = None
+
+def _on_notify(connection, pid, channel, payload):
+    # payload: "<farmer_id>:<service_id>" (consent_repo.notify_consent_changed)
+    try:
+        farmer_id, service_id = (int(part) for part in payload.split(":"))
+    except ValueError:
+        cache.clear()
+        return
+    cache.evict((farmer_id, service_id))
+
+async def _listen_forever():
+    import asyncpg
+    delay = 1.0
+    while True:
+        connection = None
+        try:
+            connection = await asyncpg.connect(settings.SQLALCHEMY_DATABASE_URI)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(NOTIFY_CHANNEL, _on_notify)
+            cache.clear() # Anything cached before (re)connecting may have missed a notification
+            cache.listening = True
+            delay = 1.0
+            while not lost.is_set():
+                try:
+                    await asyncio.wait_for(lost.wait(), timeout=30)
+                except asyncio.TimeoutError:
+                    # A half-open TCP connection never fires the termination callback: ping it
+                    await asyncio.wait_for(connection.fetchval("SELECT 1"), timeout=5)
+            print("⚠️ Consent listener connection lost; consent checks go to the database until it is back")
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Consent listener cannot connect ({e}); retrying in {delay:.0f}s")
+        finally:
+            cache.listening = False
+            cache.clear()
+            if connection is not None and not connection.is_closed():
+                await connection.close()
+        await asyncio.sleep(delay)
+        delay = min(delay * 2, 30.0)
+
+def start_listener():
+    global _listener_task
+    if settings.CONSENT_CACHE_ENABLED and _listener_task is None:
+        _listener_task = asyncio.get_running_loop().create_task(_listen_forever())
+
+async def stop_listener():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        try:
+            await _listener_task
+        except asyncio.CancelledError:
+            pass
+        _listener_task = None
+
+# --- Expiry Sweeper ---
+# Request handlers compare expires_at themselves, but nothing used to flip is_active once a consent
+# ran out, and dependent loans / advisories stayed PENDING until the farmer revoked by hand. The
+# sweeper deactivates expired consents in batches (revoked_at stays NULL: expired, not revoked) and,
+# in the same transaction, closes the PENDING loans and advisories of each (farmer, service) pair
+# that has no other valid consent. Due rows are claimed with FOR UPDATE SKIP LOCKED, so the sweeper
+# can run in every API worker and from cron at once without two instances taking the same consent.
+# Cached decisions need no notification: they already turn EXPIRED on their own expires_at.
+#
+# Sync database: runs from maintenance.py, and from API workers on a thread every
+# CONSENT_SWEEP_INTERVAL_SECONDS.
+
+SWEEP_CHECKPOINT_NAME = "consent_expiry"
+EXPIRED_LOAN_NOTE = "Automatically rejected: consent expired."
+
+def _expire_batch(db, now: datetime, batch_size: int) -> dict:
+    due = (
+        select(Consent.id)
+        .where(Consent.is_active == True, Consent.expires_at <= now) # Served by ix_consent_active_expires
+        .order_by(Consent.expires_at, Consent.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    expired = db.execute(
+        update(Consent)
+        .where(Consent.id.in_(due.scalar_subquery()))
+        .values(is_active=False)
+        .returning(Consent.farmer_id, Consent.service_id, Consent.expires_at)
+        .execution_options(synchronize_session=False)
+    ).all()
+    report = {"consents": len(expired), "loans": 0, "advisories": 0, "latest": None}
+    if not expired:
+        return report
+    report["latest"] = max(row.expires_at for row in expired)
+
+    pairs = list({(row.farmer_id, row.service_id) for row in expired})
+    for model, closed_status, open_statuses, extra in (
+        (LoanApplication, "REJECTED", ("PENDING", "REQUEST_DOC"), {"admin_notes": EXPIRED_LOAN_NOTE}),
+        (CropAdvisory, "EXPIRED", ("PENDING",), {}),
+    ):
+        # A pair can hold another consent that is still valid (re-granted meanwhile): leave its rows alone
+        still_valid = exists().where(
+            Consent.farmer_id == model.farmer_id,
+            Consent.service_id == model.service_id,
+            Consent.is_active == True,
+            or_(Consent.expires_at.is_(None), Consent.expires_at > now),
+        )
+        result = db.execute(
+            update(model)
+            .where(
+                tuple_(model.farmer_id, model.service_id).in_(pairs),
+                model.status.in_(open_statuses),
+                ~still_valid,
+            )
+            .values(status=closed_status, **extra)
+            .execution_options(synchronize_session=False)
+        )
+        report["loans" if model is LoanApplication else "advisories"] += result.rowcount
+    return report
+
+def _advance_checkpoint(db, latest: datetime):
+    # Conditional UPDATE rather than read-modify-write: concurrent sweepers only ever move it forward
+    position = latest.isoformat()
+    db.execute(
+        update(MaintenanceCheckpoint)
+        .where(MaintenanceCheckpoint.name == SWEEP_CHECKPOINT_NAME, MaintenanceCheckpoint.position < position)
+        .values(position=position)
+        .execution_options(synchronize_session=False)
+    )
+
+def _ensure_checkpoint(db):
+    if db.get(MaintenanceCheckpoint, SWEEP_CHECKPOINT_NAME) is None:
+        db.add(MaintenanceCheckpoint(name=SWEEP_CHECKPOINT_NAME, position="", passes_completed=0))
+        try:
+            db.commit()
+        except IntegrityError:
+            db.rollback() # Another sweeper created it first
+
+def sweep_expired_consents(db, batch_size: int = None, max_batches: int = None, dry_run: bool = False) -> dict:
+    """
+    Deactivate consents whose expires_at has passed and close what depended on them, one committed
+    batch at a time, until nothing is due or max_batches is reached. The checkpoint records the
+    latest expires_at swept so far ("all consents expiring up to here are inactive").
+    """
+    batch_size = batch_size or settings.CONSENT_SWEEP_BATCH_SIZE
+    now = datetime.utcnow()
+    report = {"consents": 0, "loans": 0, "advisories": 0, "batches": 0, "caught_up": False}
+    if not dry_run:
+        _ensure_checkpoint(db)
+
+    while max_batches is None or report["batches"] < max_batches:
+        batch = _expire_batch(db, now, batch_size)
+        report["batches"] += 1
+        for counter in ("consents", "loans", "advisories"):
+            report[counter] += batch[counter]
+        if dry_run:
+            db.rollback() # Counts of the first batch only: rolled back, the same rows would come up again
+            report["caught_up"] = batch["consents"] < batch_size
+            break
+        if batch["latest"] is not None:
+            _advance_checkpoint(db, batch["latest"])
+        if batch["consents"] < batch_size:
+            # Rows other sweepers hold are theirs; everything else due as of `now` is done
+            db.execute(
+                update(MaintenanceCheckpoint)
+                .where(MaintenanceCheckpoint.name == SWEEP_CHECKPOINT_NAME)
+                .values(passes_completed=MaintenanceCheckpoint.passes_completed + 1, pass_started_at=now)
+                .execution_options(synchronize_session=False)
+            )
+            db.commit()
+            report["caught_up"] = True
+            break
+        db.commit() # Each batch releases its row locks as soon as it is done
+    return report
+
+_sweeper_task: Optional[asyncio.Task] = None
+
+def _sweep_once() -> dict:
+    with SessionLocal() as db:
+        return sweep_expired_consents(db)
+
+async def _sweep_forever():
+    while True:
+        await asyncio.sleep(settings.CONSENT_SWEEP_INTERVAL_SECONDS)
+        try:
+            report = await anyio.to_thread.run_sync(_sweep_once)
+            if report["consents"]:
+                print(f"⏳ Expired {report['consents']} consents; rejected {report['loans']} loans, "
+                      f"closed {report['advisories']} advisory requests")
+        except Exception as e:
+            print(f"⚠️ Consent expiry sweep failed: {e}")
+
+def start_sweeper():
+    global _sweeper_task
+    if settings.CONSENT_SWEEP_INTERVAL_SECONDS > 0 and _sweeper_task is None:
+        _sweeper_task = asyncio.get_running_loop().create_task(_sweep_forever())
+
+async def stop_sweeper():
+    global _sweeper_task
+    if _sweeper_task is not None:
+        _sweeper_task.cancel()
+        try:
+            await _sweeper_task
+        except asyncio.CancelledError:
+            pass
+        _sweeper_task = None
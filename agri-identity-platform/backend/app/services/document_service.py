@@ -0,0 +1,293 @@
+import hashlib
+import os
+import uuid
+from dataclasses import dataclass
+from typing import AsyncIterator, Optional
+from urllib.parse import quote
+import anyio
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, Response, StreamingResponse
+from app.core import encryption, storage
+from app.core.config import settings
+from app.repositories import blob_repo
+from app.utils import http_range
+
+# --- Streaming Uploads ---
+# Uploads are copied UPLOAD_CHUNK_BYTES at a time into a temp file next to UPLOAD_DIR, hashing,
+# counting and (with VAULT_ENCRYPTION_ENABLED) encrypting as they go, so memory per upload stays
+# at one chunk and disk writes never block the loop.
+#
+# --- Content-Addressed Blobs ---
+# The finished file is published as uploads/blobs/ab/cd/<sha256>.bin, keyed by the plaintext
+# SHA-256 and shared by every Document with the same content (blob table, with a refcount).
+# Re-uploading a scan that is already stored costs a refcount bump and a metadata row; the
+# staged copy is thrown away. Publishing goes through core/storage.py, which never overwrites an
+# existing blob (os.link locally, HEAD + PUT under the blob row lock on S3).
+
+UPLOAD_TMP_DIR = os.path.join(settings.UPLOAD_DIR, ".tmp")
+BLOB_DIR = os.path.join(settings.UPLOAD_DIR, "blobs")
+
+@dataclass
+class StagedFile:
+    tmp_path: str
+    sha256: str # Of the plaintext
+    size_bytes: int # Plaintext size
+    is_encrypted: bool
+
+def ensure_upload_dirs():
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    os.makedirs(UPLOAD_TMP_DIR, exist_ok=True)
+    os.makedirs(BLOB_DIR, exist_ok=True)
+
+def blob_path(sha256: str) -> str:
+    return os.path.join(BLOB_DIR, sha256[:2], sha256[2:4], f"{sha256}.bin")
+
+async def _remove_quietly(path: str):
+    try:
+        await anyio.Path(path).unlink()
+    except FileNotFoundError:
+        pass
+
+async def discard_staged(staged: StagedFile):
+    with anyio.CancelScope(shield=True):
+        await _remove_quietly(staged.tmp_path)
+
+async def _upload_chunks(upload: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await upload.read(settings.UPLOAD_CHUNK_BYTES):
+        yield chunk
+
+async def read_local_file(path: str) -> AsyncIterator[bytes]:
+    async with await anyio.open_file(path, "rb") as f:
+        while chunk := await f.read(settings.UPLOAD_CHUNK_BYTES):
+            yield chunk
+
+def vault_encrypts_uploads() -> bool:
+    """
+    Whether new uploads are vault-encrypted. On a store with server-side encryption they are not
+    (unless S3_VAULT_ENCRYPTION): the bucket keeps them encrypted at rest, and plaintext objects
+    can be presigned, so downloads go straight to the bucket. Files stay encrypted at rest either way.
+    """
+    if not settings.VAULT_ENCRYPTION_ENABLED:
+        return False
+    return settings.S3_VAULT_ENCRYPTION or not storage.get_storage().server_side_encrypted
+
+def stage_upload(upload: UploadFile, max_bytes: int = None, encrypt: bool = None):
+    return stage_stream(_upload_chunks(upload), max_bytes, encrypt)
+
+async def stage_stream(chunks: AsyncIterator[bytes], max_bytes: int = None, encrypt: bool = None) -> StagedFile:
+    """
+    Stream an upload into UPLOAD_TMP_DIR, encrypting it on the way when vault encryption is enabled.
+    Raises HTTPException(413) once it exceeds max_bytes. The caller publishes or discards the result.
+    Used by multipart uploads and by finalized resumable uploads alike.
+    """
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    encrypt = vault_encrypts_uploads() if encrypt is None else encrypt
+    encryptor = encryption.StreamEncryptor() if encrypt else None
+    tmp_path = os.path.join(UPLOAD_TMP_DIR, f"{uuid.uuid4()}.part")
+
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        async with await anyio.open_file(tmp_path, "wb") as out:
+            if encryptor:
+                await out.write(encryptor.header())
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(
+                        status_code=413,
+                        detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit",
+                    )
+                hasher.update(chunk)
+                await out.write(encryptor.update(chunk) if encryptor else chunk)
+            if encryptor:
+                await out.write(encryptor.finalize())
+            # The response promises durable bytes: ingestion happens later, from this file
+            await out.flush()
+            await anyio.to_thread.run_sync(os.fsync, out.wrapped.fileno())
+    except BaseException:
+        # Includes client disconnects / cancellation: never leave a .part file behind
+        with anyio.CancelScope(shield=True):
+            await _remove_quietly(tmp_path)
+        raise
+
+    return StagedFile(tmp_path=tmp_path, sha256=hasher.hexdigest(), size_bytes=size, is_encrypted=encrypt)
+
+async def store_blob(db, staged: StagedFile):
+    """
+    Reference the blob for a staged upload, publishing the staged file if the blob is new.
+    Runs inside the caller's transaction; the staged file is always consumed.
+    """
+    try:
+        blob = await blob_repo.acquire_blob(
+            db, staged.sha256, blob_path(staged.sha256), staged.size_bytes, staged.is_encrypted
+        )
+        backend = storage.get_storage()
+        # No-op when the blob is already stored; also heals a missing blob file
+        if await backend.put_file(staged.tmp_path, blob.storage_path):
+            blob.is_encrypted = staged.is_encrypted
+        elif blob.refcount == 1:
+            # New row over a file left behind by a crash: keep it and record what it actually is
+            magic = await backend.read_head(blob.storage_path, len(encryption.MAGIC))
+            blob.is_encrypted = magic == encryption.MAGIC
+        return blob
+    finally:
+        await discard_staged(staged)
+
+UNVERIFIED_MEDIA_TYPE = "application/octet-stream"
+
+def served_media_type(doc) -> str:
+    # Until ingest_worker.py has sniffed the file, mime_type is only what the client claimed
+    # (text/html, image/svg+xml, ...): never let a browser render that
+    return doc.mime_type if doc.ingest_status == "READY" else UNVERIFIED_MEDIA_TYPE
+
+@dataclass
+class StoredFile:
+    """What a download serves: a stored object plus the headers it goes out with."""
+    storage_path: str
+    media_type: Optional[str] = None
+    filename: Optional[str] = None
+    size_bytes: Optional[int] = None # Plaintext size; None on rows older than migration 003
+    sha256: Optional[str] = None # Plaintext hash, used as a strong ETag
+    is_encrypted: bool = False
+
+    @classmethod
+    def from_document(cls, doc) -> "StoredFile":
+        return cls(doc.storage_path, served_media_type(doc), doc.filename, doc.size_bytes, doc.sha256, doc.is_encrypted)
+
+    @property
+    def etag(self) -> Optional[str]:
+        return http_range.etag_for(self.sha256) if self.sha256 else None
+
+# Browsers may cache but must revalidate: a repeat view costs a 304, and expired links stop working
+DOWNLOAD_CACHE_CONTROL = "private, no-cache"
+
+def download_url(doc, disposition: str = "attachment") -> str:
+    """
+    Short-lived link to a document's plaintext. Callers must have done the ACL / consent check.
+    Plain objects on S3 are presigned; anything else (local files, vault-encrypted objects,
+    including ones uploaded before vault_encrypts_uploads) is a signed link to /files on this API.
+    """
+    expires_in = settings.DOWNLOAD_URL_TTL_SECONDS
+    media_type = served_media_type(doc)
+    if media_type == UNVERIFIED_MEDIA_TYPE:
+        disposition = "attachment" # Not inspected yet: download only, even for admin previews
+    backend = storage.get_storage()
+    if not doc.is_encrypted:
+        url = backend.presigned_url(doc.storage_path, expires_in, doc.filename, media_type, disposition)
+        if url:
+            return url
+    return storage.signed_file_url(
+        doc.storage_path, expires_in, doc.filename, media_type, disposition,
+        decrypt=doc.is_encrypted, size_bytes=doc.size_bytes, sha256=doc.sha256
+    )
+
+def _download_headers(stored: StoredFile, disposition: str) -> dict:
+    headers = {
+        "Content-Disposition": storage.content_disposition(stored.filename, disposition),
+        "Cache-Control": DOWNLOAD_CACHE_CONTROL,
+        "X-Content-Type-Options": "nosniff", # The browser must not second-guess the served type either
+    }
+    if stored.etag:
+        headers["ETag"] = stored.etag
+    return headers
+
+def not_modified_response(request: Request, stored: StoredFile) -> Optional[Response]:
+    """304 when the client already holds this content; decided without touching storage."""
+    if stored.etag and http_range.if_none_match(request.headers.get("if-none-match"), stored.etag):
+        return Response(status_code=304, headers={"ETag": stored.etag, "Cache-Control": DOWNLOAD_CACHE_CONTROL})
+    return None
+
+def offloaded_file_response(stored: StoredFile, disposition: str = "attachment") -> Optional[Response]:
+    """
+    Let the reverse proxy send a local file (DOWNLOAD_OFFLOAD), so the worker returns right after
+    the checks. None when offload is off or cannot serve this file (S3, outside UPLOAD_DIR).
+    Vault-encrypted files are never offloaded: the proxy cannot decrypt them.
+    """
+    backend = storage.get_storage()
+    if settings.DOWNLOAD_OFFLOAD == "none" or stored.is_encrypted or not isinstance(backend, storage.LocalStorage):
+        return None
+    path = backend.path(stored.storage_path)
+    relative = os.path.relpath(path, settings.UPLOAD_DIR)
+    if relative.startswith(".."):
+        return None
+    headers = _download_headers(stored, disposition) # The proxy handles Range itself
+    if settings.DOWNLOAD_OFFLOAD == "x-accel-redirect":
+        headers["X-Accel-Redirect"] = settings.DOWNLOAD_OFFLOAD_PREFIX + quote(relative.replace(os.sep, "/"))
+    else: # "x-sendfile"; Settings rejects any other value at startup
+        headers["X-Sendfile"] = os.path.abspath(path)
+    return Response(media_type=stored.media_type, headers=headers)
+
+async def _decrypted_range(storage_path: str, start: int, end: int, size_bytes: int) -> AsyncIterator[bytes]:
+    """Plaintext bytes start..end of a vault file, reading and opening only the segments they span."""
+    backend = storage.get_storage()
+    opener = encryption.SegmentOpener(await backend.read_head(storage_path, encryption.HEADER_BYTES))
+    segment_size = opener.segment_size
+    first, last = start // segment_size, end // segment_size
+    final = max(size_bytes - 1, 0) // segment_size
+    cipher_end = min(opener.segment_offset(last + 1), encryption.ciphertext_size(size_bytes, segment_size)) - 1
+    chunks = backend.stream(storage_path, start=opener.segment_offset(first), end=cipher_end)
+
+    position = first * segment_size # Plaintext offset of the segment being yielded
+    async for plain in encryption.decrypt_segments(opener, chunks, first, final):
+        lo, hi = max(start - position, 0), min(end + 1 - position, len(plain))
+        if lo < hi:
+            yield plain[lo:hi]
+        position += len(plain)
+
+def plaintext_stream(stored: StoredFile) -> AsyncIterator[bytes]:
+    chunks = storage.get_storage().stream(stored.storage_path)
+    return encryption.decrypt_stream(chunks) if stored.is_encrypted else chunks
+
+async def read_plaintext(stored: StoredFile, max_bytes: int = None) -> bytes:
+    """The whole plaintext in memory, for processing (previews). Capped like uploads."""
+    max_bytes = settings.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    parts = []
+    size = 0
+    async for chunk in plaintext_stream(stored):
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail="Document is too large to process")
+        parts.append(chunk)
+    return b"".join(parts)
+
+def file_response(request: Request, stored: StoredFile, disposition: str = "attachment") -> Response:
+    """
+    Serve a stored file with ETag, If-None-Match, Range and If-Range support, decrypting vault
+    files on the way out. Memory stays at one read chunk plus one segment whatever the size.
+    """
+    not_modified = not_modified_response(request, stored)
+    if not_modified is not None:
+        return not_modified
+    offloaded = offloaded_file_response(stored, disposition)
+    if offloaded is not None:
+        return offloaded
+
+    backend = storage.get_storage()
+    headers = _download_headers(stored, disposition)
+    if not stored.is_encrypted and isinstance(backend, storage.LocalStorage):
+        # Starlette's FileResponse does Range / If-Range itself, against the ETag given here
+        return FileResponse(backend.path(stored.storage_path), media_type=stored.media_type, headers=headers)
+    if stored.size_bytes is None:
+        return StreamingResponse(plaintext_stream(stored), media_type=stored.media_type, headers=headers)
+
+    headers["Accept-Ranges"] = "bytes"
+    try:
+        byte_range = http_range.requested_range(
+            request.headers.get("range"), request.headers.get("if-range"), stored.size_bytes, stored.etag
+        )
+    except http_range.RangeNotSatisfiable:
+        return Response(status_code=416, headers={"Content-Range": f"bytes */{stored.size_bytes}"})
+
+    if byte_range is None:
+        headers["Content-Length"] = str(stored.size_bytes)
+        return StreamingResponse(plaintext_stream(stored), media_type=stored.media_type, headers=headers)
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end}/{stored.size_bytes}"
+    headers["Content-Length"] = str(end - start + 1)
+    if stored.is_encrypted:
+        body = _decrypted_range(stored.storage_path, start, end, stored.size_bytes)
+    else:
+        body = backend.stream(stored.storage_path, start=start, end=end)
+    return StreamingResponse(body, status_code=206, media_type=stored.media_type, headers=headers)
@@ -0,0 +1,194 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+import anyio
+from sqlalchemy import select, update, or_, and_
+from app.core import encryption, storage
+from app.core.config import settings
+from app.db.session import SessionLocal
+from app.models.document import Document
+from app.utils import file_inspect
+
+# --- Document Ingestion ---
+# Uploads return as soon as the file is durable: the request path only streams, hashes and
+# encrypts (bytes it has to touch anyway) and inserts the Document as RECEIVED. Everything else
+# runs here, in ingest_worker.py, off the API hosts:
+#
+#   RECEIVED -> PROCESSING -> READY
+#                          -> RECEIVED (retry, up to INGEST_MAX_ATTEMPTS) -> FAILED
+#
+# Workers claim batches with FOR UPDATE SKIP LOCKED, so any number of them can share the queue.
+# A claimed row that stays PROCESSING past INGEST_TIMEOUT_SECONDS (worker killed mid-file) is
+# simply claimed again. Parsing is CPU-bound and runs in a process pool; reading and decrypting
+# the file and the DB round trips stay on the event loop / threadpool.
+#
+# The sniffed MIME type replaces the one the client sent: files are served inline to admins,
+# and a client-declared text/html must never become a page on our origin.
+
+class IngestError(Exception):
+    """Permanent failure (missing file, hash mismatch, tampered ciphertext): retrying will not help."""
+    pass
+
+# --- Queue (sync: runs on the threadpool with its own Session) ---
+
+def claim_batch(limit: int) -> list:
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=settings.INGEST_TIMEOUT_SECONDS)
+    pending = (
+        select(Document.id)
+        .where(
+            Document.ingest_status.in_(("RECEIVED", "PROCESSING")), # Lets the planner use ix_document_ingest_pending
+            or_(
+                Document.ingest_status == "RECEIVED",
+                and_(Document.ingest_status == "PROCESSING", Document.ingest_started_at < stale),
+            ),
+        )
+        .order_by(Document.id)
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    )
+    stmt = (
+        update(Document)
+        .where(Document.id.in_(pending.scalar_subquery()))
+        .values(ingest_status="PROCESSING", ingest_started_at=now, ingest_attempts=Document.ingest_attempts + 1)
+        .returning(Document.id, Document.storage_path, Document.sha256, Document.is_encrypted,
+                   Document.ingest_attempts, Document.ingest_started_at)
+        .execution_options(synchronize_session=False)
+    )
+    with SessionLocal() as db:
+        rows = db.execute(stmt).all()
+        db.commit()
+    return rows
+
+def find_inspected_twin(sha256: str, doc_id: int):
+    # Same plaintext digest = same bytes: reuse what another upload of this file already yielded
+    if not sha256:
+        return None
+    with SessionLocal() as db:
+        twin = db.execute(
+            select(Document.mime_type, Document.page_count, Document.width, Document.height)
+            .where(Document.sha256 == sha256, Document.ingest_status == "READY", Document.id != doc_id)
+            .limit(1)
+        ).first()
+    return dict(twin._mapping) if twin else None
+
+def _finish(doc_id: int, started_at: datetime, **values) -> bool:
+    # Guarded on ingest_started_at: if this claim timed out and another worker took the row, its result wins
+    with SessionLocal() as db:
+        result = db.execute(
+            update(Document)
+            .where(Document.id == doc_id, Document.ingest_status == "PROCESSING", Document.ingest_started_at == started_at)
+            .values(**values)
+            .execution_options(synchronize_session=False)
+        )
+        db.commit()
+    return result.rowcount == 1
+
+def mark_ready(doc_id: int, started_at: datetime, meta: dict) -> bool:
+    return _finish(doc_id, started_at, ingest_status="READY", ingest_error=None, ingested_at=datetime.utcnow(),
+                   mime_type=meta["mime_type"], page_count=meta["page_count"], width=meta["width"], height=meta["height"])
+
+def mark_failed(doc_id: int, started_at: datetime, attempts: int, error: str, permanent: bool) -> str:
+    status = "FAILED" if permanent or attempts >= settings.INGEST_MAX_ATTEMPTS else "RECEIVED"
+    _finish(doc_id, started_at, ingest_status=status, ingest_error=error[:500])
+    return status
+
+# --- Worker ---
+
+async def read_plaintext(storage_path: str, is_encrypted: bool, sha256: str = None) -> bytes:
+    chunks = storage.get_storage().stream(storage_path)
+    if is_encrypted:
+        chunks = encryption.decrypt_stream(chunks)
+    hasher = hashlib.sha256()
+    parts = []
+    size = 0
+    try:
+        async for chunk in chunks:
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_BYTES:
+                raise IngestError("File is larger than MAX_UPLOAD_BYTES")
+            hasher.update(chunk)
+            parts.append(chunk)
+    except FileNotFoundError:
+        raise IngestError(f"Stored file {storage_path} is missing")
+    except encryption.VaultIntegrityError as e:
+        raise IngestError(f"Vault file failed authentication: {e}")
+    if sha256 and hasher.hexdigest() != sha256:
+        raise IngestError("Stored bytes do not match the recorded SHA-256")
+    return b"".join(parts)
+
+class InspectPool:
+    """Process pool for file_inspect, rebuilt if a child dies (e.g. killed for memory on a hostile PDF)."""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._pool = self._new_pool()
+
+    def _new_pool(self) -> ProcessPoolExecutor:
+        # spawn: children must not inherit the parent's DB connections or event loop
+        return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+
+    async def inspect(self, data: bytes) -> dict:
+        pool = self._pool
+        try:
+            return await asyncio.get_running_loop().run_in_executor(pool, file_inspect.inspect_document, data)
+        except BrokenProcessPool:
+            if self._pool is pool:
+                pool.shutdown(wait=False)
+                self._pool = self._new_pool()
+            raise # This document is retried on a later claim (or FAILED after INGEST_MAX_ATTEMPTS)
+
+    def shutdown(self):
+        self._pool.shutdown(cancel_futures=True)
+
+async def ingest_document(row, pool: InspectPool, reads: anyio.Semaphore) -> str:
+    try:
+        meta = await anyio.to_thread.run_sync(find_inspected_twin, row.sha256, row.id)
+        if meta is None:
+            async with reads: # Bounds how many files sit in memory waiting for a pool slot
+                data = await read_plaintext(row.storage_path, row.is_encrypted, row.sha256)
+                meta = await pool.inspect(data)
+    except Exception as e:
+        status = await anyio.to_thread.run_sync(
+            mark_failed, row.id, row.ingest_started_at, row.ingest_attempts, str(e) or type(e).__name__,
+            isinstance(e, IngestError),
+        )
+        print(f"❌ Document {row.id}: {e} ({status})")
+        return status
+    await anyio.to_thread.run_sync(mark_ready, row.id, row.ingest_started_at, meta)
+    return "READY"
+
+def default_workers() -> int:
+    return settings.INGEST_WORKERS or os.cpu_count() or 1
+
+async def run_worker(workers: int = None, once: bool = False):
+    """Claim and ingest batches until stopped (or, with once, until the queue is empty)."""
+    workers = workers or default_workers()
+    pool = InspectPool(workers)
+    reads = anyio.Semaphore(workers * 2)
+    print(f"🚀 Ingest worker started with {workers} processes")
+    try:
+        while True:
+            rows = await anyio.to_thread.run_sync(claim_batch, settings.INGEST_BATCH_SIZE)
+            if not rows:
+                if once:
+                    break
+                await anyio.sleep(settings.INGEST_POLL_SECONDS)
+                continue
+            started = time.perf_counter()
+            results = []
+
+            async def run_one(row):
+                results.append(await ingest_document(row, pool, reads))
+
+            async with anyio.create_task_group() as tg:
+                for row in rows:
+                    tg.start_soon(run_one, row)
+            print(f"✅ Ingested {results.count('READY')}/{len(rows)} documents in {time.perf_counter() - started:.2f}s")
+    finally:
+        pool.shutdown()
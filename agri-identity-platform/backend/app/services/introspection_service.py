@@ -0,0 +1,80 @@
+import hashlib
+import hmac
+import time
+from typing import Optional, Tuple
+from jose import JWTError
+from sqlalchemy import select
+from app.core import security
+from app.core.config import settings
+from app.models.service import Service
+from app.schemas.all import TokenIntrospection
+from app.services import consent_service
+
+# --- Token Introspection (RFC 7662) ---
+# Relying services ask whether a token minted by /oauth/grant is still good. "Active" means: the
+# signature verifies and exp has not passed (security.decode_access_token, cached per token), the
+# token was issued to the calling service, and the farmer's consent to that service is still valid
+# (consent_service.get_decision, cached per pair and evicted through LISTEN/NOTIFY on revocation).
+# Tokens carrying a "cid" claim must also match the consent they were minted under, so revoking and
+# granting again does not bring old tokens back. With both caches warm a call never reaches Postgres.
+#
+# Service credentials are cached too, for INTROSPECTION_CLIENT_TTL_SECONDS; only a digest of the
+# secret is kept.
+
+INACTIVE = TokenIntrospection(active=False)
+
+_clients = {} # client_id -> (service_id, sha256 of client_secret, fetched at)
+
+def _secret_digest(secret: str) -> bytes:
+    return hashlib.sha256(secret.encode()).digest()
+
+async def authenticate_client(db, client_id: str, client_secret: str) -> Optional[int]:
+    """The service id for valid credentials, else None."""
+    entry = _clients.get(client_id)
+    if entry is None or time.monotonic() - entry[2] > settings.INTROSPECTION_CLIENT_TTL_SECONDS:
+        service = (await db.execute(
+            select(Service.id, Service.client_secret).where(Service.client_id == client_id).limit(1)
+        )).first()
+        if service is None:
+            _clients.pop(client_id, None)
+            return None
+        entry = (service.id, _secret_digest(service.client_secret), time.monotonic())
+        _clients[client_id] = entry
+    service_id, digest, _ = entry
+    # Digests have a fixed length, so the comparison time says nothing about the secret
+    if not hmac.compare_digest(digest, _secret_digest(client_secret or "")):
+        return None
+    return service_id
+
+def _claims(token: str) -> Optional[Tuple[dict, int, int]]:
+    try:
+        claims = security.decode_access_token(token)
+        return claims, int(claims["sub"]), int(claims["azp"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        return None # Bad signature, expired, or not a consent token (farmer / admin session tokens have no azp)
+
+async def introspect(db, token: str, service_id: int, client_id: str) -> TokenIntrospection:
+    parsed = _claims(token)
+    if parsed is None:
+        return INACTIVE
+    claims, farmer_id, issued_to = parsed
+    if issued_to != service_id:
+        return INACTIVE # Services only learn about their own tokens
+
+    decision = await consent_service.get_decision(db, farmer_id, service_id)
+    if not decision.is_valid():
+        return INACTIVE
+    if claims.get("cid") is not None and claims["cid"] != decision.consent_id:
+        return INACTIVE # Minted under a consent that has since been replaced
+    if not decision.allows(claims.get("smask", 0)):
+        return INACTIVE # Claims scopes the consent does not (or no longer) grant
+
+    return TokenIntrospection(
+        active=True,
+        scope=claims.get("scope"),
+        client_id=client_id,
+        token_type="Bearer",
+        sub=claims["sub"],
+        exp=int(claims["exp"]),
+        iat=int(claims["iat"]) if "iat" in claims else None, # Tokens minted before iat was added lack it
+    )
@@ -0,0 +1,193 @@
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import threading
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+import anyio
+from fastapi import HTTPException, Request
+from fastapi.responses import Response
+from app.core import encryption
+from app.core.config import settings
+from app.services import document_service
+from app.utils import http_range, preview_render
+
+# --- Document Previews ---
+# Review screens show downscaled JPEGs (images, first page of PDFs) instead of the full scans.
+# Rendering runs in its own process pool; results go to an on-disk cache on this host, keyed by
+# the document's plaintext SHA-256 and the preview size, so every copy of the same scan shares one
+# entry and entries never go stale. The cache is bounded by PREVIEW_CACHE_MAX_BYTES: hits touch
+# the file's mtime, and when the total grows past the limit the least recently used entries are
+# deleted. Previews of vault documents are vault-encrypted in the cache as well.
+#
+# Callers must do the ACL / consent check first, exactly as for download links.
+
+PREVIEW_SIZES = {"thumb": 256, "preview": 1024} # Longest side in pixels
+PREVIEW_CACHE_CONTROL = "private, max-age=300"
+
+# --- Render Pool ---
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+def get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # "spawn" avoids forking a process that already runs the event loop and DB pool threads
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.PREVIEW_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _executor
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=True, cancel_futures=True)
+            _executor = None
+
+# --- Cache ---
+
+class PreviewCache:
+    """Bytes on disk under root/ab/<key>.jpg, evicted least-recently-used by total size."""
+
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self._total = None # Estimated bytes on disk; other processes share the directory, so eviction rescans
+        self._lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key[:2], f"{key}.jpg")
+
+    def _scan(self) -> list:
+        entries = []
+        for dirpath, _, filenames in os.walk(self.root):
+            for name in filenames:
+                if name.endswith(".jpg"):
+                    try:
+                        stat = os.stat(os.path.join(dirpath, name))
+                    except FileNotFoundError:
+                        continue # Evicted by another process meanwhile
+                    entries.append((stat.st_mtime, stat.st_size, os.path.join(dirpath, name)))
+        return entries
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self.path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path) # Recency for LRU (atime is unreliable on noatime mounts)
+        except FileNotFoundError:
+            return None
+        return data
+
+    def put(self, key: str, data: bytes):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path) # Readers see the old entry or the new one, never half of it
+        with self._lock:
+            if self._total is None:
+                self._total = sum(size for _, size, _ in self._scan())
+            else:
+                self._total += len(data)
+            if self._total <= self.max_bytes:
+                return
+            self._evict()
+
+    def _evict(self):
+        # Down to 90% of the limit, so eviction does not run again on the very next put
+        entries = sorted(self._scan())
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * 0.9
+        for _, size, path in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+        self._total = total
+
+_cache: Optional[PreviewCache] = None
+
+def get_cache() -> PreviewCache:
+    global _cache
+    if _cache is None:
+        _cache = PreviewCache(settings.PREVIEW_CACHE_DIR or os.path.join(settings.UPLOAD_DIR, ".previews"),
+                              settings.PREVIEW_CACHE_MAX_BYTES)
+    return _cache
+
+def _seal(data: bytes) -> bytes:
+    encryptor = encryption.StreamEncryptor()
+    return encryptor.header() + encryptor.update(data) + encryptor.finalize()
+
+def _open_sealed(data: bytes) -> bytes:
+    decryptor = encryption.StreamDecryptor()
+    return decryptor.update(data) + decryptor.finalize()
+
+# --- Previews ---
+
+def has_preview(doc) -> bool:
+    # Decided from the stored MIME type (sniffed by the ingest worker); rendering re-checks the bytes
+    mime = doc.mime_type or ""
+    return mime == "application/pdf" or mime.startswith("image/")
+
+def cache_key(doc, size: str) -> str:
+    # Rows older than the blob store have no sha256; their storage path is unique and immutable too
+    content = doc.sha256 or hashlib.sha256(doc.storage_path.encode()).hexdigest()
+    return f"{content}-{PREVIEW_SIZES[size]}"
+
+_rendering = {} # cache key -> Future, so concurrent requests for one preview render it once
+
+async def _render(doc, size: str, key: str) -> Optional[bytes]:
+    stored = document_service.StoredFile.from_document(doc)
+    data = await document_service.read_plaintext(stored)
+    loop = asyncio.get_running_loop()
+    try:
+        preview = await loop.run_in_executor(get_executor(), preview_render.render_preview, data, PREVIEW_SIZES[size])
+    except preview_render.PreviewUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    except Exception as e:
+        print(f"⚠️ Preview of document {doc.id} failed: {e}")
+        return None # Corrupt or unsupported file: the reviewer falls back to the full download
+    if preview is not None:
+        await anyio.to_thread.run_sync(get_cache().put, key, _seal(preview) if doc.is_encrypted else preview)
+    return preview
+
+async def get_preview(doc, size: str = "thumb") -> Optional[bytes]:
+    """JPEG preview bytes for a document, from the cache or freshly rendered. None if it has none."""
+    key = cache_key(doc, size)
+    cached = await anyio.to_thread.run_sync(get_cache().get, key)
+    if cached is not None:
+        return _open_sealed(cached) if cached.startswith(encryption.MAGIC) else cached
+
+    pending = _rendering.get(key)
+    if pending is None:
+        pending = asyncio.ensure_future(_render(doc, size, key))
+        _rendering[key] = pending
+        pending.add_done_callback(lambda _: _rendering.pop(key, None))
+    return await asyncio.shield(pending) # A reviewer closing the dialog must not cancel it for the others
+
+def preview_etag(doc, size: str) -> str:
+    return http_range.etag_for(cache_key(doc, size))
+
+async def preview_response(request: Request, doc, size: str = "thumb") -> Response:
+    if size not in PREVIEW_SIZES:
+        raise HTTPException(status_code=422, detail=f"size must be one of {', '.join(PREVIEW_SIZES)}")
+    etag = preview_etag(doc, size)
+    headers = {"ETag": etag, "Cache-Control": PREVIEW_CACHE_CONTROL}
+    if http_range.if_none_match(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    preview = await get_preview(doc, size)
+    if preview is None:
+        raise HTTPException(status_code=404, detail="No preview available for this document")
+    return Response(content=preview, media_type="image/jpeg", headers=headers)
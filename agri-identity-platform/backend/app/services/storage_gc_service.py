@@ -0,0 +1,172 @@
+import os
+import time
+from datetime import datetime, timedelta
+from typing import Iterable, Set
+from sqlalchemy import String, column, exists, select, values
+from app.core import storage
+from app.core.config import settings
+from app.models.blob import Blob
+from app.models.document import Document
+from app.models.maintenance_checkpoint import MaintenanceCheckpoint
+
+# --- Orphaned File Collection (maintenance.py orphans) ---
+# Files reach storage before the row that references them commits, so a crash or a failed commit
+# leaves files no Document / Blob points at; so do database resets that never touch disk. The
+# collector walks UPLOAD_DIR in key order, BATCH keys at a time, and anti-joins each batch against
+# document.storage_path and blob.storage_path in one query. Unreferenced files older than the
+# grace period (uploads still in flight are younger) are moved to .quarantine/<YYYYMMDD>/ rather
+# than deleted; each run purges quarantine days older than the retention period, and moves back
+# anything a row references again. The walk position is saved after every batch in
+# maintenance_checkpoint, so a pass over millions of files spreads across many short runs.
+#
+# Sync database, async storage: runs from maintenance.py in its own event loop.
+
+CHECKPOINT_NAME = "orphan_files"
+SKIPPED_DIRS = (".tmp", ".previews", ".quarantine") # Staging files, preview cache, quarantine itself
+_AFTER_EVERYTHING = "\U0010ffff" # Sorts after any key: a position that skips a whole directory
+
+def quarantine_root() -> str:
+    return f"{settings.UPLOAD_DIR}/.quarantine"
+
+def quarantine_key(key: str, day: datetime) -> str:
+    relative = key[len(settings.UPLOAD_DIR) + 1:]
+    return f"{quarantine_root()}/{day:%Y%m%d}/{relative}"
+
+def _split_quarantine_key(qkey: str):
+    day, relative = qkey[len(quarantine_root()) + 1:].split("/", 1)
+    return datetime.strptime(day, "%Y%m%d"), f"{settings.UPLOAD_DIR}/{relative}"
+
+def _reference_key(key: str) -> str:
+    # A .deleting file is referenced through its original name (document delete that never finished)
+    return key[:-len(".deleting")] if key.endswith(".deleting") else key
+
+def _skipped_dir(key: str):
+    top, sep, _ = key[len(settings.UPLOAD_DIR) + 1:].partition("/")
+    return f"{settings.UPLOAD_DIR}/{top}" if sep and top in SKIPPED_DIRS else None
+
+def unreferenced(db, keys: Iterable[str]) -> Set[str]:
+    """The keys no Document or Blob row points at, in one round trip (VALUES list anti-joined twice)."""
+    keys = list(keys)
+    if not keys:
+        return set()
+    batch = values(column("key", String), name="batch").data([(key,) for key in keys])
+    stmt = select(batch.c.key).where(
+        ~exists().where(Document.storage_path == batch.c.key),
+        ~exists().where(Blob.storage_path == batch.c.key),
+    )
+    return set(db.scalars(stmt).all())
+
+def _checkpoint(db) -> MaintenanceCheckpoint:
+    checkpoint = db.get(MaintenanceCheckpoint, CHECKPOINT_NAME)
+    if checkpoint is None:
+        checkpoint = MaintenanceCheckpoint(name=CHECKPOINT_NAME, position="", passes_completed=0)
+        db.add(checkpoint)
+    return checkpoint
+
+async def collect_orphans(db, batch_size: int = None, grace_hours: int = None, max_batches: int = None,
+                          dry_run: bool = False) -> dict:
+    """
+    Continue the walk from the checkpoint for up to max_batches batches (None: to the end of the
+    pass), quarantining orphans. When a pass completes, the next run starts over from the top.
+    """
+    batch_size = batch_size or settings.ORPHAN_GC_BATCH_SIZE
+    grace_hours = settings.ORPHAN_GC_GRACE_HOURS if grace_hours is None else grace_hours
+    backend = storage.get_storage()
+    cutoff = time.time() - grace_hours * 3600
+    today = datetime.utcnow()
+    report = {"scanned": 0, "orphans": 0, "orphan_bytes": 0, "restored": 0, "pass_completed": False}
+
+    checkpoint = _checkpoint(db)
+    position = checkpoint.position
+    if not position:
+        checkpoint.pass_started_at = datetime.utcnow()
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        objects = await backend.list_keys(settings.UPLOAD_DIR, position, batch_size)
+        batches += 1
+        if not objects:
+            report["pass_completed"] = True
+            position = ""
+            checkpoint.passes_completed += 1
+            break
+
+        candidates = []
+        for obj in objects:
+            skipped = _skipped_dir(obj.key)
+            if skipped:
+                position = f"{skipped}/{_AFTER_EVERYTHING}" # Jump over the directory in one step
+                break
+            position = obj.key
+            report["scanned"] += 1
+            if obj.modified < cutoff:
+                candidates.append(obj)
+
+        orphans = unreferenced(db, {_reference_key(obj.key) for obj in candidates})
+        for obj in candidates:
+            if _reference_key(obj.key) not in orphans:
+                if obj.key.endswith(".deleting"):
+                    # The delete rolled back but the file was never renamed back
+                    report["restored"] += 1
+                    if not dry_run:
+                        await backend.restore(obj.key)
+                continue
+            report["orphans"] += 1
+            report["orphan_bytes"] += obj.size
+            if not dry_run:
+                try:
+                    await backend.move(obj.key, quarantine_key(obj.key, today))
+                except FileNotFoundError:
+                    pass # Removed since it was listed
+
+        if not dry_run:
+            checkpoint.position = position
+            db.commit() # Progress survives a crash or a killed cron job
+    if not dry_run:
+        checkpoint.position = position
+        db.commit()
+    else:
+        db.rollback()
+    report["position"] = position
+    return report
+
+async def purge_quarantine(db, retention_days: int = None, batch_size: int = None, dry_run: bool = False) -> dict:
+    """Delete quarantined files past retention; move back any that a row references again."""
+    retention_days = settings.ORPHAN_GC_QUARANTINE_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.ORPHAN_GC_BATCH_SIZE
+    backend = storage.get_storage()
+    expired_before = datetime.utcnow() - timedelta(days=retention_days)
+    report = {"purged": 0, "purged_bytes": 0, "restored": 0, "held": 0}
+
+    position = ""
+    while objects := await backend.list_keys(quarantine_root(), position, batch_size):
+        position = objects[-1].key
+        originals = {obj.key: _split_quarantine_key(obj.key) for obj in objects}
+        orphans = unreferenced(db, {_reference_key(original) for _, original in originals.values()})
+        for obj in objects:
+            day, original = originals[obj.key]
+            target = _reference_key(original)
+            if target not in orphans:
+                report["restored"] += 1
+                if not dry_run:
+                    if await backend.exists(target):
+                        await backend.delete(obj.key) # Already re-uploaded under the same content address
+                    else:
+                        await backend.move(obj.key, target)
+            elif day < expired_before:
+                report["purged"] += 1
+                report["purged_bytes"] += obj.size
+                if not dry_run:
+                    await backend.delete(obj.key)
+            else:
+                report["held"] += 1
+    if not dry_run and isinstance(backend, storage.LocalStorage):
+        _remove_empty_dirs(quarantine_root())
+    return report
+
+def _remove_empty_dirs(root: str):
+    for dirpath, _, _ in sorted(os.walk(root), key=lambda entry: entry[0], reverse=True):
+        if dirpath != root:
+            try:
+                os.rmdir(dirpath) # Only succeeds when empty
+            except OSError:
+                pass
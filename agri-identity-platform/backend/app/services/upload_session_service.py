@@ -0,0 +1,263 @@
+import math
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+import anyio
+from fastapi import HTTPException, Request
+from sqlalchemy import select, delete
+from starlette.requests import ClientDisconnect
+from app.core import encryption
+from app.core.config import settings
+from app.models.document import Document
+from app.models.upload_session import UploadSession
+from app.repositories import upload_session_repo
+from app.services import document_service
+
+# --- Resumable Uploads ---
+# For farmers on flaky links a single multipart POST that dies at 90% loses everything. Here the
+# client creates a session, PUTs the file in chunks at explicit offsets (GET tells it where to
+# resume), then finalizes. Received bytes are sealed (encryption.PartialSealer) and appended to
+# UPLOAD_TMP_DIR/<id>.upload, and kept even if a chunk is cut off half way, so a retry only resends
+# what is missing. Finalizing opens them into the same hash / encrypt / blob-store pipeline as
+# /documents/upload.
+#
+# Only one request writes a session at a time: it takes a short DB lease (no row lock is held
+# while the body streams in), and the file is truncated back to the recorded offset first, so
+# bytes from a writer that died before recording them are dropped. A record only counts towards
+# received_bytes once it is fully written, so the recorded offset always ends on a record. The lease is renewed while
+# bytes keep arriving, so a PUT that stalls (the client's link dropped, but the server has not
+# noticed yet) gives the session up within UPLOAD_CHUNK_LEASE_SECONDS and the client's retry can
+# take over. A writer whose lease was taken never writes again: renewal is checked before each write.
+# Partial files are on the API host's disk: behind several hosts, UPLOAD_DIR must be shared.
+
+def part_path(upload_id: str) -> str:
+    return os.path.join(document_service.UPLOAD_TMP_DIR, f"{upload_id}.upload")
+
+def expires_at(session: UploadSession) -> datetime:
+    return session.updated_at + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+async def create_session(db, farmer_id: int, title: str, doc_type: str, filename: str,
+                         mime_type: str, is_sensitive: bool, total_bytes: int) -> UploadSession:
+    if total_bytes > settings.MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"File exceeds the {settings.MAX_UPLOAD_BYTES // (1024 * 1024)} MB upload limit",
+        )
+    session = UploadSession(
+        id=uuid.uuid4().hex,
+        farmer_id=farmer_id,
+        title=title,
+        doc_type=doc_type,
+        filename=filename,
+        mime_type=mime_type,
+        is_sensitive=is_sensitive,
+        total_bytes=total_bytes,
+        received_bytes=0,
+    )
+    async with await anyio.open_file(part_path(session.id), "wb"):
+        pass
+    db.add(session)
+    await db.commit()
+    return session
+
+async def get_session(db, upload_id: str, farmer_id: int) -> UploadSession:
+    session = await upload_session_repo.get_session(db, upload_id, farmer_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return session
+
+async def _lease(db, upload_id: str, farmer_id: int) -> UploadSession:
+    session = await upload_session_repo.claim_lease(db, upload_id, farmer_id, settings.UPLOAD_CHUNK_LEASE_SECONDS)
+    if session is None:
+        held = await get_session(db, upload_id, farmer_id) # 404 if it does not exist at all
+        remaining = (held.lease_until - datetime.utcnow()).total_seconds() if held.lease_until else 0
+        # Retry-After tells the client this is a wait, not a failure (resumableUpload.js)
+        raise HTTPException(
+            status_code=409,
+            detail="Another request is writing to this upload; retry shortly",
+            headers={"Retry-After": str(max(1, math.ceil(remaining)))},
+        )
+    return session
+
+def _offset_mismatch(session: UploadSession) -> HTTPException:
+    return HTTPException(
+        status_code=409,
+        detail=f"Upload is at offset {session.received_bytes}; resume from there",
+        headers={"Upload-Offset": str(session.received_bytes)},
+    )
+
+async def write_chunk(db, request: Request, upload_id: str, farmer_id: int, offset: int) -> UploadSession:
+    """Append the request body at offset. Whatever arrives before a disconnect is kept."""
+    session = await _lease(db, upload_id, farmer_id)
+    received = session.received_bytes
+    renew_every = settings.UPLOAD_CHUNK_LEASE_SECONDS / 3
+    try:
+        if offset != received:
+            raise _offset_mismatch(session)
+        sealer = encryption.PartialSealer(upload_id)
+        segment = settings.VAULT_SEGMENT_BYTES
+        async with await anyio.open_file(part_path(upload_id), "r+b") as out:
+            end = await _records_end(out, received)
+            await out.truncate(end) # Drop records nobody recorded
+            await out.seek(end)
+            pending = bytearray()
+            renew_at = time.monotonic() + renew_every
+            try:
+                async for chunk in request.stream():
+                    if received + len(pending) + len(chunk) > session.total_bytes:
+                        raise HTTPException(status_code=413, detail="Chunk runs past the declared file size")
+                    if time.monotonic() >= renew_at:
+                        if not await upload_session_repo.renew_lease(db, session, settings.UPLOAD_CHUNK_LEASE_SECONDS):
+                            pending.clear()
+                            break # Taken over after a stall: the new writer owns the file now
+                        renew_at = time.monotonic() + renew_every
+                    pending += chunk
+                    while len(pending) >= segment:
+                        await out.write(sealer.seal(received, pending[:segment]))
+                        received += segment
+                        del pending[:segment]
+            except ClientDisconnect:
+                pass # Keep what arrived; the client resumes from the recorded offset
+            # A disconnect can surface long after a stall: the lease must still be ours for the tail
+            if pending and (time.monotonic() < renew_at
+                            or await upload_session_repo.renew_lease(db, session, settings.UPLOAD_CHUNK_LEASE_SECONDS)):
+                await out.write(sealer.seal(received, pending))
+                received += len(pending)
+            await out.flush()
+    finally:
+        with anyio.CancelScope(shield=True):
+            released = await upload_session_repo.release_lease(db, session, received)
+    if not released:
+        raise HTTPException(status_code=409, detail="Upload lease expired while writing; query the offset and retry")
+    session.received_bytes = received
+    return session
+
+def _damaged_partial() -> HTTPException:
+    # Not a 409: retrying cannot help, the client has to start a new upload
+    return HTTPException(status_code=422, detail="Partial upload is damaged; abort it and start a new upload")
+
+async def _records_end(out, offset: int) -> int:
+    """File position just past the records holding the first offset plaintext bytes."""
+    size = await out.seek(0, os.SEEK_END)
+    position = covered = 0
+    while covered < offset:
+        await out.seek(position)
+        prefix = await out.read(encryption.PARTIAL_LENGTH_BYTES)
+        if len(prefix) < encryption.PARTIAL_LENGTH_BYTES:
+            raise _damaged_partial()
+        length = encryption.partial_record_length(prefix)
+        position += encryption.partial_record_size(length)
+        covered += length
+    if covered != offset or position > size:
+        raise _damaged_partial()
+    return position
+
+async def read_partial(upload_id: str, length: int) -> AsyncIterator[bytes]:
+    """Plaintext of the first length bytes of a partial file, one record per yield."""
+    sealer = encryption.PartialSealer(upload_id)
+    async with await anyio.open_file(part_path(upload_id), "rb") as f:
+        offset = 0
+        while offset < length:
+            prefix = await f.read(encryption.PARTIAL_LENGTH_BYTES)
+            if len(prefix) < encryption.PARTIAL_LENGTH_BYTES:
+                return # Short: finalize's size check rejects it
+            record_length = encryption.partial_record_length(prefix)
+            body = await f.read(encryption.partial_record_size(record_length) - encryption.PARTIAL_LENGTH_BYTES)
+            yield sealer.open(offset, body)
+            offset += record_length
+
+async def finalize(db, upload_id: str, farmer_id: int) -> Document:
+    session = await _lease(db, upload_id, farmer_id)
+    try:
+        if session.received_bytes != session.total_bytes:
+            raise _offset_mismatch(session)
+        # Same pipeline as a multipart upload: hash, encrypt, publish into the blob store
+        try:
+            staged = await document_service.stage_stream(read_partial(upload_id, session.received_bytes))
+        except encryption.VaultIntegrityError:
+            raise _damaged_partial()
+        if staged.size_bytes != session.total_bytes:
+            await document_service.discard_staged(staged)
+            raise HTTPException(status_code=409, detail="Partial file does not match the recorded size")
+        blob = await document_service.store_blob(db, staged)
+        doc = Document(
+            farmer_id=farmer_id,
+            title=session.title,
+            doc_type=session.doc_type,
+            filename=session.filename,
+            storage_path=blob.storage_path,
+            mime_type=session.mime_type,
+            is_sensitive=session.is_sensitive,
+            sha256=blob.sha256,
+            size_bytes=blob.size_bytes,
+            is_encrypted=blob.is_encrypted
+        )
+        db.add(doc)
+        await upload_session_repo.delete_session(db, upload_id)
+        await db.commit()
+    except BaseException:
+        with anyio.CancelScope(shield=True):
+            await db.rollback()
+            await upload_session_repo.release_lease(db, session, session.received_bytes)
+        raise
+    await db.refresh(doc)
+    await _remove_part(upload_id)
+    return doc
+
+async def abort(db, upload_id: str, farmer_id: int):
+    await _lease(db, upload_id, farmer_id) # Not while a chunk is being written
+    await upload_session_repo.delete_session(db, upload_id)
+    await db.commit()
+    await _remove_part(upload_id)
+
+async def _remove_part(upload_id: str):
+    try:
+        await anyio.Path(part_path(upload_id)).unlink()
+    except FileNotFoundError:
+        pass
+
+# --- Garbage Collection (maintenance.py uploads) ---
+
+def collect_stale(db, ttl_hours: int = None, dry_run: bool = False) -> dict:
+    """
+    Delete upload sessions untouched for ttl_hours with their partial files, plus leftover files in
+    UPLOAD_TMP_DIR (.upload without a session, .part staging files from crashed requests) as old.
+    Sync: runs from maintenance.py with a plain Session.
+    """
+    ttl_hours = settings.UPLOAD_SESSION_TTL_HOURS if ttl_hours is None else ttl_hours
+    cutoff = datetime.utcnow() - timedelta(hours=ttl_hours)
+    report = {"sessions": 0, "files": 0, "bytes": 0}
+
+    stale_ids = set(db.scalars(
+        select(UploadSession.id).where(
+            UploadSession.updated_at < cutoff,
+            (UploadSession.lease_until.is_(None)) | (UploadSession.lease_until < datetime.utcnow()),
+        )
+    ).all())
+    if stale_ids and not dry_run:
+        db.execute(delete(UploadSession).where(UploadSession.id.in_(stale_ids)))
+        db.commit()
+    report["sessions"] = len(stale_ids)
+    live_ids = set(db.scalars(select(UploadSession.id)).all()) - stale_ids
+
+    tmp_dir = document_service.UPLOAD_TMP_DIR
+    for entry in os.scandir(tmp_dir) if os.path.isdir(tmp_dir) else []:
+        name, ext = os.path.splitext(entry.name)
+        if ext not in (".upload", ".part") or not entry.is_file():
+            continue
+        stat = entry.stat()
+        if name not in stale_ids:
+            if ext == ".upload" and name in live_ids:
+                continue
+            if stat.st_mtime >= cutoff.timestamp():
+                continue # Recent: a request may still be writing it
+        report["files"] += 1
+        report["bytes"] += stat.st_size
+        if not dry_run:
+            try:
+                os.remove(entry.path)
+            except FileNotFoundError:
+                pass
+    return report
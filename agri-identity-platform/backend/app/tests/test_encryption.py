@@ -0,0 +1,137 @@
+import anyio
+import pytest
+from app.core import encryption
+from app.core.encryption import (
+    HEADER_BYTES, TAG_BYTES, PartialSealer, StreamDecryptor, StreamEncryptor, VaultIntegrityError,
+)
+
+SEGMENT = 16 # Small segments so a few dozen bytes span several of them
+
+def encrypt(plaintext: bytes, segment_size: int = SEGMENT) -> bytes:
+    encryptor = StreamEncryptor(segment_size)
+    return encryptor.header() + encryptor.update(plaintext) + encryptor.finalize()
+
+def decrypt(ciphertext: bytes, read_size: int = 7) -> bytes:
+    decryptor = StreamDecryptor()
+    out = [decryptor.update(ciphertext[i:i + read_size]) for i in range(0, len(ciphertext), read_size)]
+    return b"".join(out) + decryptor.finalize()
+
+def segments(ciphertext: bytes) -> list:
+    body = ciphertext[HEADER_BYTES:]
+    sealed = SEGMENT + TAG_BYTES
+    return [body[i:i + sealed] for i in range(0, len(body), sealed)]
+
+# --- STREAM Vault Files ---
+
+@pytest.mark.parametrize("size", [0, 1, SEGMENT - 1, SEGMENT, SEGMENT + 1, 3 * SEGMENT, 3 * SEGMENT + 5])
+def test_round_trip(size):
+    plaintext = bytes(range(256)) * 2
+    plaintext = plaintext[:size]
+    ciphertext = encrypt(plaintext)
+    assert len(ciphertext) == encryption.ciphertext_size(size, SEGMENT)
+    assert decrypt(ciphertext) == plaintext
+
+def test_round_trip_with_updates_of_any_size():
+    plaintext = bytes(range(100))
+    encryptor = StreamEncryptor(SEGMENT)
+    ciphertext = encryptor.header()
+    for i in range(0, len(plaintext), 3):
+        ciphertext += encryptor.update(plaintext[i:i + 3])
+    ciphertext += encryptor.finalize()
+    assert decrypt(ciphertext, read_size=len(ciphertext)) == plaintext
+
+def test_every_file_gets_its_own_key_and_nonces():
+    plaintext = b"x" * 40
+    assert encrypt(plaintext) != encrypt(plaintext)
+
+def test_truncation_at_a_segment_boundary_is_detected():
+    ciphertext = encrypt(bytes(3 * SEGMENT + 5))
+    # Drop the (short) last segment: the new last one was sealed as "not last"
+    truncated = ciphertext[:HEADER_BYTES] + b"".join(segments(ciphertext)[:-1])
+    with pytest.raises(VaultIntegrityError):
+        decrypt(truncated)
+
+def test_truncation_to_the_header_is_detected():
+    ciphertext = encrypt(bytes(40))
+    with pytest.raises(VaultIntegrityError):
+        decrypt(ciphertext[:HEADER_BYTES])
+    with pytest.raises(VaultIntegrityError):
+        decrypt(ciphertext[:HEADER_BYTES - 1])
+
+def test_reordered_segments_are_detected():
+    ciphertext = encrypt(bytes(range(3 * SEGMENT + 5)))
+    parts = segments(ciphertext)
+    parts[0], parts[1] = parts[1], parts[0]
+    with pytest.raises(VaultIntegrityError):
+        decrypt(ciphertext[:HEADER_BYTES] + b"".join(parts))
+
+def test_modified_ciphertext_and_header_are_detected():
+    ciphertext = bytearray(encrypt(bytes(40)))
+    ciphertext[HEADER_BYTES + 3] ^= 1
+    with pytest.raises(VaultIntegrityError):
+        decrypt(bytes(ciphertext))
+
+    ciphertext = bytearray(encrypt(bytes(40)))
+    ciphertext[HEADER_BYTES - 1] ^= 1 # Last byte of the nonce prefix; the header is bound to every segment
+    with pytest.raises(VaultIntegrityError):
+        decrypt(bytes(ciphertext))
+
+def test_not_a_vault_file():
+    with pytest.raises(VaultIntegrityError):
+        decrypt(b"%PDF-1.7" + bytes(64))
+
+def test_decrypt_file(tmp_path):
+    plaintext = bytes(range(256)) * 4
+    path = tmp_path / "doc.bin"
+    path.write_bytes(encrypt(plaintext))
+
+    async def read():
+        return b"".join([chunk async for chunk in encryption.decrypt_file(str(path), read_size=10)])
+
+    assert anyio.run(read) == plaintext
+
+def test_segment_opener_reads_a_single_segment():
+    plaintext = bytes(range(3 * SEGMENT + 5))
+    ciphertext = encrypt(plaintext)
+    opener = encryption.SegmentOpener(ciphertext)
+    start = opener.segment_offset(1)
+    assert opener.open(1, ciphertext[start:start + opener.sealed_size], last=False) == plaintext[SEGMENT:2 * SEGMENT]
+    with pytest.raises(VaultIntegrityError):
+        opener.open(2, ciphertext[start:start + opener.sealed_size], last=False)
+
+# --- Resumable Upload Partials ---
+
+def open_records(sealer: PartialSealer, data: bytes) -> bytes:
+    out, offset, position = [], 0, 0
+    while position < len(data):
+        length = encryption.partial_record_length(data[position:position + encryption.PARTIAL_LENGTH_BYTES])
+        end = position + encryption.partial_record_size(length)
+        out.append(sealer.open(offset, data[position + encryption.PARTIAL_LENGTH_BYTES:end]))
+        offset += length
+        position = end
+    return b"".join(out)
+
+def test_partial_round_trip():
+    sealer = PartialSealer("a" * 32)
+    records = sealer.seal(0, b"hello ") + sealer.seal(6, b"") + sealer.seal(6, b"world")
+    assert len(records) == sum(encryption.partial_record_size(n) for n in (6, 0, 5))
+    assert open_records(PartialSealer("a" * 32), records) == b"hello world"
+
+def test_partial_records_are_bound_to_offset_and_upload():
+    sealer = PartialSealer("a" * 32)
+    first, second = sealer.seal(0, b"hello "), sealer.seal(6, b"world")
+    with pytest.raises(VaultIntegrityError):
+        open_records(sealer, second + first) # Reordered
+    with pytest.raises(VaultIntegrityError):
+        open_records(sealer, second) # First record dropped
+    with pytest.raises(VaultIntegrityError):
+        open_records(PartialSealer("b" * 32), first) # Moved to another upload
+
+def test_truncated_partial_record_is_detected():
+    sealer = PartialSealer("a" * 32)
+    record = sealer.seal(0, b"hello")
+    body = record[encryption.PARTIAL_LENGTH_BYTES:]
+    with pytest.raises(VaultIntegrityError):
+        sealer.open(0, body[:-1])
+    with pytest.raises(VaultIntegrityError):
+        sealer.open(0, body[:encryption.PARTIAL_NONCE_BYTES])
@@ -0,0 +1,82 @@
+import pytest
+from app.utils.http_range import RangeNotSatisfiable, etag_for, if_none_match, requested_range
+
+SIZE = 100
+ETAG = etag_for("ab" * 32)
+
+def byte_range(header, if_range=None, size=SIZE, etag=ETAG):
+    return requested_range(header, if_range, size, etag)
+
+# --- Range ---
+
+@pytest.mark.parametrize("header, expected", [
+    ("bytes=0-0", (0, 0)),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=0-", (0, 99)),
+    ("bytes=99-99", (99, 99)),
+    ("bytes=99-", (99, 99)),
+    ("bytes=10-20", (10, 20)),
+    ("bytes=50-100", (50, 99)), # Past the end: clamped to the last byte
+    ("bytes=0-100000", (0, 99)),
+    ("bytes=-1", (99, 99)),
+    ("bytes=-100", (0, 99)),
+    ("bytes=-500", (0, 99)), # Suffix longer than the file: the whole file
+    (" Bytes = 5-6 ", (5, 6)),
+])
+def test_satisfiable_ranges(header, expected):
+    assert byte_range(header) == expected
+
+@pytest.mark.parametrize("header", ["bytes=100-", "bytes=100-200", "bytes=-0", "bytes=1000-"])
+def test_unsatisfiable_ranges(header):
+    with pytest.raises(RangeNotSatisfiable):
+        byte_range(header)
+
+def test_empty_file_has_no_satisfiable_range():
+    with pytest.raises(RangeNotSatisfiable):
+        byte_range("bytes=0-", size=0)
+    with pytest.raises(RangeNotSatisfiable):
+        byte_range("bytes=-5", size=0)
+
+@pytest.mark.parametrize("header", [
+    None,
+    "",
+    "bytes=20-10", # end before start
+    "bytes=0-1,5-6", # Multiple ranges: the whole file
+    "items=0-5",
+    "bytes=5",
+    "bytes=a-b",
+    "bytes=-",
+])
+def test_ignored_range_headers(header):
+    assert byte_range(header) is None
+
+# --- If-Range ---
+
+def test_if_range_with_matching_etag_keeps_the_range():
+    assert byte_range("bytes=10-20", if_range=ETAG) == (10, 20)
+    assert byte_range("bytes=10-20", if_range=f" {ETAG} ") == (10, 20)
+
+@pytest.mark.parametrize("if_range", ['"stale"', f"W/{ETAG}", "Wed, 21 Oct 2015 07:28:00 GMT"])
+def test_if_range_mismatch_sends_everything(if_range):
+    assert byte_range("bytes=10-20", if_range=if_range) is None
+
+def test_if_range_without_an_etag_sends_everything():
+    assert byte_range("bytes=10-20", if_range=ETAG, etag=None) is None
+
+def test_stale_if_range_wins_over_an_unsatisfiable_range():
+    assert byte_range("bytes=500-", if_range='"stale"') is None
+
+# --- If-None-Match ---
+
+@pytest.mark.parametrize("header, expected", [
+    (None, False),
+    ("", False),
+    ("*", True),
+    (ETAG, True),
+    (f"W/{ETAG}", True), # Weak comparison
+    (f'"other", {ETAG}', True),
+    ('"other"', False),
+    (ETAG.strip('"'), False), # Unquoted is a different tag
+])
+def test_if_none_match(header, expected):
+    assert if_none_match(header, ETAG) is expected
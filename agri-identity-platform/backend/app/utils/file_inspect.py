@@ -0,0 +1,145 @@
+import re
+import struct
+import zlib
+from typing import Optional, Tuple
+
+# --- Document Inspection ---
+# Pure-Python, dependency-free metadata extraction for the ingest worker (services/ingest_service.py).
+# Runs in a process pool, so everything here takes and returns plain picklable values.
+# The MIME type comes from magic bytes, never from the client's Content-Type.
+
+_SIGNATURES = [
+    (b"%PDF-", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"BM", "image/bmp"),
+    (b"PK\x03\x04", "application/zip"),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", "application/x-ole-storage"), # Legacy .doc / .xls
+]
+
+def sniff_mime(data: bytes) -> str:
+    head = data[:64]
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    if head[4:8] == b"ftyp" and head[8:12] in (b"heic", b"heix", b"mif1", b"msf1"):
+        return "image/heic"
+    # PDFs may carry junk before the header (readers accept it within the first 1 KB)
+    if b"%PDF-" in data[:1024]:
+        return "application/pdf"
+    for magic, mime in _SIGNATURES:
+        if head.startswith(magic):
+            if mime == "application/zip":
+                return _office_type(data)
+            return mime
+    try:
+        data[:4096].decode("utf-8")
+    except UnicodeDecodeError:
+        return "application/octet-stream"
+    return "text/plain"
+
+def _office_type(data: bytes) -> str:
+    # OOXML files are ZIPs; the first entry names tell them apart
+    head = data[:4096]
+    if b"word/" in head:
+        return "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+    if b"xl/" in head:
+        return "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+    return "application/zip"
+
+# --- PDF ---
+_PAGE = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_PAGES_COUNT = re.compile(rb"/Type\s*/Pages\b[^>]*?/Count\s+(\d+)|/Count\s+(\d+)[^>]*?/Type\s*/Pages\b", re.S)
+_OBJSTM = re.compile(rb"/Type\s*/ObjStm.*?stream\r?\n", re.S)
+MAX_INFLATED_BYTES = 16 * 1024 * 1024 # Across all object streams of one PDF: deflate can expand ~1000x
+
+def pdf_page_count(data: bytes) -> Optional[int]:
+    """
+    Page count from the page tree. Scanners and phone apps often pack objects into compressed
+    object streams (PDF 1.5+), so those are inflated and searched too, up to MAX_INFLATED_BYTES
+    in total; a crafted stream cannot make the worker allocate more than that.
+    """
+    bodies = [data]
+    budget = MAX_INFLATED_BYTES
+    for match in _OBJSTM.finditer(data):
+        if budget <= 0:
+            break
+        end = data.find(b"endstream", match.end())
+        if end == -1:
+            continue
+        try:
+            body = zlib.decompressobj().decompress(data[match.end():end], budget)
+        except zlib.error:
+            continue
+        budget -= len(body)
+        bodies.append(body)
+    counts = [int(a or b) for body in bodies for a, b in _PAGES_COUNT.findall(body)]
+    if counts:
+        return max(counts) # The root /Pages node holds the total
+    pages = sum(len(_PAGE.findall(body)) for body in bodies)
+    return pages or None
+
+# --- Images ---
+
+def image_dimensions(data: bytes, mime: str) -> Optional[Tuple[int, int]]:
+    try:
+        if mime == "image/png" and data[12:16] == b"IHDR":
+            return struct.unpack(">II", data[16:24])
+        if mime == "image/gif":
+            return struct.unpack("<HH", data[6:10])
+        if mime == "image/bmp":
+            width, height = struct.unpack("<ii", data[18:26])
+            return width, abs(height)
+        if mime == "image/jpeg":
+            return _jpeg_dimensions(data)
+        if mime == "image/webp":
+            return _webp_dimensions(data)
+    except struct.error:
+        return None
+    return None
+
+def _jpeg_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    i = 2
+    while i + 9 < len(data):
+        if data[i] != 0xFF:
+            i += 1
+            continue
+        marker = data[i + 1]
+        if marker in (0xD8, 0x01) or 0xD0 <= marker <= 0xD7:
+            i += 2
+            continue
+        (length,) = struct.unpack(">H", data[i + 2:i + 4])
+        # SOF0..SOF15 except DHT (C4), JPG (C8) and DAC (CC) carry the frame size
+        if 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC):
+            height, width = struct.unpack(">HH", data[i + 5:i + 9])
+            return width, height
+        i += 2 + length
+    return None
+
+def _webp_dimensions(data: bytes) -> Optional[Tuple[int, int]]:
+    chunk = data[12:16]
+    if chunk == b"VP8 ":
+        width, height = struct.unpack("<HH", data[26:30])
+        return width & 0x3FFF, height & 0x3FFF
+    if chunk == b"VP8L":
+        bits = int.from_bytes(data[21:25], "little")
+        return (bits & 0x3FFF) + 1, ((bits >> 14) & 0x3FFF) + 1
+    if chunk == b"VP8X":
+        return int.from_bytes(data[24:27], "little") + 1, int.from_bytes(data[27:30], "little") + 1
+    return None
+
+def inspect_document(data: bytes) -> dict:
+    """Everything the ingest pipeline records about a file's plaintext."""
+    mime = sniff_mime(data)
+    meta = {"mime_type": mime, "page_count": None, "width": None, "height": None}
+    if mime == "application/pdf":
+        meta["page_count"] = pdf_page_count(data)
+    elif mime.startswith("image/"):
+        dimensions = image_dimensions(data, mime)
+        if dimensions:
+            meta["width"], meta["height"] = dimensions
+        meta["page_count"] = 1
+    return meta
@@ -0,0 +1,56 @@
+from typing import Optional, Tuple
+
+# --- Conditional and Ranged Downloads ---
+# Document ETags are strong and derived from the plaintext SHA-256, so they are identical for every
+# copy of the same content and never change for a stored blob. Only single byte ranges are served
+# as 206; a multi-range request gets the whole file (allowed by RFC 9110), which is all a resuming
+# download manager needs.
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def etag_for(sha256: str) -> str:
+    return f'"{sha256}"'
+
+def if_none_match(header: Optional[str], etag: str) -> bool:
+    """True if the client's If-None-Match already covers etag (weak comparison, RFC 9110 13.1.2)."""
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    tags = (tag.strip() for tag in header.split(","))
+    return any(tag.removeprefix("W/") == etag for tag in tags)
+
+def requested_range(range_header: Optional[str], if_range: Optional[str], size: int,
+                    etag: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    The inclusive (start, end) byte range to send, or None for the full representation.
+    Raises RangeNotSatisfiable when the single range lies entirely past the end of the file.
+    """
+    if not range_header:
+        return None
+    # If-Range needs a strong match; a date or a stale ETag means "send everything"
+    if if_range is not None and (etag is None or if_range.strip() != etag):
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, sep, last = spec.strip().partition("-")
+    if not sep:
+        return None
+    try:
+        if first:
+            start = int(first)
+            end = int(last) if last else size - 1
+            if last and end < start:
+                return None # Malformed: ignore the header
+        else:
+            suffix = int(last)
+            if suffix == 0:
+                raise RangeNotSatisfiable()
+            start, end = max(size - suffix, 0), size - 1
+    except ValueError:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable()
+    return start, min(end, size - 1)
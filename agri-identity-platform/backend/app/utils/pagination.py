@@ -0,0 +1,60 @@
+import base64
+import json
+from datetime import datetime
+from typing import Optional
+from fastapi import HTTPException, Query
+from sqlalchemy import tuple_
+
+# --- Keyset (cursor) Pagination ---
+# Lists are ordered newest first by (created_at, id) and resumed with WHERE (created_at, id) < cursor,
+# so every page is an index range scan no matter how deep into the table the client is.
+# The cursor is opaque to clients: base64 of the last row's sort key.
+# Sort columns must be NOT NULL (migration 013): a NULL would sort first and has no cursor.
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+class PageParams:
+    def __init__(
+        self,
+        after: Optional[str] = Query(None, description="Opaque cursor from a previous page's next_cursor"),
+        limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    ):
+        self.after = after
+        self.limit = limit
+
+def encode_cursor(sort_value: datetime, row_id: int) -> str:
+    raw = json.dumps([sort_value.isoformat(), row_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        sort_value, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        return datetime.fromisoformat(sort_value), int(row_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid pagination cursor")
+
+def keyset(stmt, sort_column, id_column, page: PageParams):
+    """Apply cursor filter, newest-first ordering and limit (+1 row to detect a next page)."""
+    if page.after:
+        sort_value, row_id = decode_cursor(page.after)
+        # The plain bound is redundant with the row comparison but, unlike it, lets Postgres
+        # prune partitions of a table partitioned on sort_column (accesslog)
+        stmt = stmt.where(sort_column <= sort_value, tuple_(sort_column, id_column) < tuple_(sort_value, row_id))
+    return stmt.order_by(sort_column.desc(), id_column.desc()).limit(page.limit + 1)
+
+def make_page(rows, sort_attr: str, page: PageParams) -> dict:
+    """Build the {"items", "next_cursor"} response from rows fetched with keyset()."""
+    rows = list(rows)
+    has_more = len(rows) > page.limit
+    rows = rows[:page.limit]
+    next_cursor = None
+    if has_more:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, sort_attr), last.id)
+    return {"items": rows, "next_cursor": next_cursor}
+
+async def paginate(db, stmt, sort_column, id_column, page: PageParams) -> dict:
+    rows = (await db.scalars(keyset(stmt, sort_column, id_column, page))).all()
+    return make_page(rows, sort_column.key, page)
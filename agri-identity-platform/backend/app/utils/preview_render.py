@@ -0,0 +1,45 @@
+import io
+from typing import Optional
+from app.utils import file_inspect
+
+# --- Preview Rendering ---
+# Runs in the preview process pool (services/preview_service.py): plain bytes in, JPEG bytes out.
+# Pillow and PyMuPDF are optional and imported here, in the child, so the API starts without them.
+
+JPEG_QUALITY = 80
+
+class PreviewUnavailable(Exception):
+    pass
+
+def render_preview(data: bytes, max_px: int) -> Optional[bytes]:
+    """A JPEG no larger than max_px on either side, or None if this file type has no preview."""
+    mime = file_inspect.sniff_mime(data)
+    if mime != "application/pdf" and not mime.startswith("image/"):
+        return None
+    try:
+        from PIL import Image, ImageOps
+    except ImportError:
+        raise PreviewUnavailable("Previews need Pillow (pip install Pillow)")
+
+    if mime == "application/pdf":
+        try:
+            import pymupdf
+        except ImportError:
+            raise PreviewUnavailable("PDF previews need PyMuPDF (pip install PyMuPDF)")
+        with pymupdf.open(stream=data, filetype="pdf") as pdf:
+            if pdf.page_count == 0:
+                return None
+            page = pdf[0]
+            # Rasterise straight at the target size instead of at 72 dpi and scaling down
+            zoom = max_px / max(page.rect.width, page.rect.height, 1)
+            pixmap = page.get_pixmap(matrix=pymupdf.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(io.BytesIO(data))
+        image.draft("RGB", (max_px, max_px)) # JPEGs decode at 1/2../1/8 scale: a phone photo never expands fully
+        image = ImageOps.exif_transpose(image) # Phone scans are often stored sideways with an EXIF flag
+
+    image.thumbnail((max_px, max_px))
+    out = io.BytesIO()
+    image.convert("RGB").save(out, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return out.getvalue()
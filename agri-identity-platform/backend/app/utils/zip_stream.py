@@ -0,0 +1,44 @@
+import zipfile
+from datetime import datetime
+from typing import AsyncIterator, Callable, Iterable, Tuple
+
+# --- Streaming ZIP ---
+# zipfile can write to an unseekable stream: it then puts sizes and CRCs in a data descriptor
+# after each member instead of seeking back into the local header. The sink below is such a
+# stream; whatever zipfile writes is handed to the client after every chunk, so memory stays at
+# one chunk and nothing touches disk. Members are STORED: scans, photos and PDFs are already
+# compressed, and deflating them again only burns CPU on the event loop.
+
+class _Sink:
+    def __init__(self):
+        self._parts = []
+
+    def write(self, data) -> int:
+        self._parts.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def drain(self) -> bytes:
+        data = b"".join(self._parts)
+        self._parts.clear()
+        return data
+
+# (name inside the archive, modification time, factory for the member's byte stream)
+ZipEntry = Tuple[str, datetime, Callable[[], AsyncIterator[bytes]]]
+
+async def stream_zip(entries: Iterable[ZipEntry]) -> AsyncIterator[bytes]:
+    sink = _Sink()
+    with zipfile.ZipFile(sink, mode="w", compression=zipfile.ZIP_STORED) as archive:
+        for name, modified, open_stream in entries:
+            info = zipfile.ZipInfo(name, date_time=(modified or datetime.utcnow()).timetuple()[:6])
+            info.compress_type = zipfile.ZIP_STORED
+            with archive.open(info, mode="w") as member:
+                async for chunk in open_stream():
+                    member.write(chunk)
+                    if data := sink.drain():
+                        yield data
+            if data := sink.drain(): # Data descriptor
+                yield data
+    yield sink.drain() # Central directory
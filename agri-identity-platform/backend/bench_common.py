@@ -0,0 +1,50 @@
+import asyncio
+import time
+
+import httpx
+
+BASE_URL = "http://127.0.0.1:8000/api/v1"
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+async def run_load(send_request, concurrency: int, total_requests: int, base_url: str = BASE_URL):
+    """
+    Fire `total_requests` calls of `send_request(client)` with at most `concurrency` in flight.
+    Returns (latencies_ms, status_counts, wall_seconds).
+    """
+    latencies = []
+    status_counts = {}
+    semaphore = asyncio.Semaphore(concurrency)
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=120) as client:
+        async def one_call():
+            async with semaphore:
+                started = time.perf_counter()
+                try:
+                    response = await send_request(client)
+                    code = response.status_code
+                except httpx.HTTPError as e:
+                    code = type(e).__name__
+                latencies.append((time.perf_counter() - started) * 1000)
+                status_counts[code] = status_counts.get(code, 0) + 1
+
+        wall_started = time.perf_counter()
+        await asyncio.gather(*(one_call() for _ in range(total_requests)))
+        wall = time.perf_counter() - wall_started
+
+    return latencies, status_counts, wall
+
+def print_report(title: str, latencies, status_counts, wall: float):
+    print(f"\n=== {title} ===")
+    print(f"Requests:   {len(latencies)} in {wall:.2f}s ({len(latencies) / wall:.1f} req/s)")
+    print(f"Status:     {status_counts}")
+    print(f"p50:        {percentile(latencies, 50):.1f} ms")
+    print(f"p95:        {percentile(latencies, 95):.1f} ms")
+    print(f"p99:        {percentile(latencies, 99):.1f} ms")
+    print(f"max:        {max(latencies) if latencies else 0:.1f} ms")
@@ -0,0 +1,73 @@
+"""
+Compare the asyncpg AsyncSession path against the sync psycopg2 threadpool path.
+
+Boots one uvicorn worker per mode (DB_ASYNC_ENABLED=true / false) on a scratch port, then
+drives the farmer-portal read endpoints with N concurrent clients:
+    python bench_db_modes.py --farmer-id 1 --concurrency 500 --requests 5000
+
+Needs a reachable database with at least one farmer row (see init.sql / reset_db.py).
+"""
+import argparse
+import asyncio
+import itertools
+import os
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app.core.security import create_access_token
+from bench_common import run_load, print_report
+
+PORT = 8765
+BASE_URL = f"http://127.0.0.1:{PORT}/api/v1"
+ENDPOINTS = ["/loan/my-applications", "/documents/", "/oauth/active", "/user/logs"]
+
+def start_server(async_enabled: bool):
+    env = dict(os.environ, DB_ASYNC_ENABLED="true" if async_enabled else "false")
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning"],
+        env=env,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=1)
+            return proc
+        except httpx.HTTPError:
+            time.sleep(0.3)
+    proc.terminate()
+    raise RuntimeError("uvicorn did not start")
+
+async def drive(token: str, concurrency: int, total: int):
+    headers = {"Authorization": f"Bearer {token}"}
+    paths = itertools.cycle(ENDPOINTS)
+
+    async def call(client):
+        return await client.get(next(paths), headers=headers)
+
+    return await run_load(call, concurrency, total, base_url=BASE_URL)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark async vs sync DB access under load")
+    parser.add_argument("--farmer-id", type=int, required=True)
+    parser.add_argument("--concurrency", type=int, default=500)
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    token = create_access_token(subject=args.farmer_id, claims={"scope": "profile"})
+
+    for async_enabled in (False, True):
+        label = "asyncpg AsyncSession" if async_enabled else "psycopg2 + threadpool"
+        proc = start_server(async_enabled)
+        try:
+            asyncio.run(drive(token, min(args.concurrency, 50), 200)) # warm the pool
+            latencies, statuses, wall = asyncio.run(drive(token, args.concurrency, args.requests))
+            print_report(f"{label} @ {args.concurrency} concurrent", latencies, statuses, wall)
+        finally:
+            proc.terminate()
+            proc.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Before/after query plans for migrations/001_hot_path_indexes.sql at production-like volume.
+
+Builds a throwaway schema (bench_indexes) with synthetic rows, prints EXPLAIN ANALYZE for the
+app's hot predicates, applies the migration's indexes, and prints the plans again:
+    python bench_indexes.py --consents 1000000 --logs 10000000
+
+Nothing outside the bench_indexes schema is touched; it is dropped at the end unless --keep.
+"""
+import argparse
+import time
+from sqlalchemy import text
+from app.db.session import engine
+
+SCHEMA = "bench_indexes"
+TABLES = ["consent", "loan_application", "crop_advisory", "accesslog", "document"]
+
+SETUP = [
+    f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE",
+    f"CREATE SCHEMA {SCHEMA}",
+    f"""CREATE TABLE {SCHEMA}.consent (
+        id SERIAL PRIMARY KEY, farmer_id INTEGER, service_id INTEGER,
+        created_at TIMESTAMP, expires_at TIMESTAMP, is_active BOOLEAN)""",
+    f"""CREATE TABLE {SCHEMA}.loan_application (
+        id SERIAL PRIMARY KEY, farmer_id INTEGER, service_id INTEGER, status VARCHAR(50), created_at TIMESTAMP)""",
+    f"""CREATE TABLE {SCHEMA}.crop_advisory (
+        id SERIAL PRIMARY KEY, farmer_id INTEGER, service_id INTEGER, status VARCHAR, created_at TIMESTAMP)""",
+    f"""CREATE TABLE {SCHEMA}.accesslog (
+        id SERIAL PRIMARY KEY, farmer_id INTEGER, service_id INTEGER, action VARCHAR(255), timestamp TIMESTAMP)""",
+    f"""CREATE TABLE {SCHEMA}.document (
+        id SERIAL PRIMARY KEY, farmer_id INTEGER, title VARCHAR(255), created_at TIMESTAMP)""",
+    # The pre-migration baseline from init.sql
+    f"CREATE INDEX ON {SCHEMA}.consent (farmer_id)",
+    f"CREATE INDEX ON {SCHEMA}.accesslog (farmer_id)",
+]
+
+def populate(consents: int, logs: int, farmers: int, services: int):
+    rows = max(consents // 4, 1)
+    return [
+        # ~10% of consents are active, like a long-running deployment with many revoked/expired ones
+        f"""INSERT INTO {SCHEMA}.consent (farmer_id, service_id, created_at, expires_at, is_active)
+            SELECT (random() * {farmers})::int, (random() * {services})::int,
+                   now() - random() * interval '365 days', now() + (random() - 0.5) * interval '60 days',
+                   random() < 0.1
+            FROM generate_series(1, {consents})""",
+        f"""INSERT INTO {SCHEMA}.loan_application (farmer_id, service_id, status, created_at)
+            SELECT (random() * {farmers})::int, (random() * {services})::int,
+                   (ARRAY['PENDING','APPROVED','REJECTED','REQUEST_DOC','WITHDRAWN'])[1 + (random() * 4)::int],
+                   now() - random() * interval '365 days'
+            FROM generate_series(1, {rows})""",
+        f"""INSERT INTO {SCHEMA}.crop_advisory (farmer_id, service_id, status, created_at)
+            SELECT (random() * {farmers})::int, (random() * {services})::int,
+                   (ARRAY['PENDING','ADVISED','WITHDRAWN'])[1 + (random() * 2)::int],
+                   now() - random() * interval '365 days'
+            FROM generate_series(1, {rows})""",
+        f"""INSERT INTO {SCHEMA}.accesslog (farmer_id, service_id, action, timestamp)
+            SELECT (random() * {farmers})::int, (random() * {services})::int, 'DATA_ACCESS',
+                   now() - random() * interval '365 days'
+            FROM generate_series(1, {logs})""",
+        f"""INSERT INTO {SCHEMA}.document (farmer_id, title, created_at)
+            SELECT (random() * {farmers})::int, 'doc', now() - random() * interval '365 days'
+            FROM generate_series(1, {rows})""",
+    ]
+
+MIGRATION_INDEXES = [
+    f"CREATE INDEX ix_consent_active_farmer_service ON {SCHEMA}.consent (farmer_id, service_id) WHERE is_active",
+    f"CREATE INDEX ix_loan_application_farmer_service_status ON {SCHEMA}.loan_application (farmer_id, service_id, status)",
+    f"CREATE INDEX ix_loan_application_service_created ON {SCHEMA}.loan_application (service_id, created_at, id)",
+    f"CREATE INDEX ix_crop_advisory_farmer_service_status ON {SCHEMA}.crop_advisory (farmer_id, service_id, status)",
+    f"CREATE INDEX ix_crop_advisory_service_created ON {SCHEMA}.crop_advisory (service_id, created_at, id)",
+    f"CREATE INDEX ix_accesslog_farmer_timestamp ON {SCHEMA}.accesslog (farmer_id, timestamp DESC)",
+    f"CREATE INDEX ix_document_farmer_created ON {SCHEMA}.document (farmer_id, created_at, id)",
+]
+
+# The predicates the routers actually issue (farmer 42, service 3)
+QUERIES = {
+    "active consent check": f"""SELECT * FROM {SCHEMA}.consent
+        WHERE farmer_id = 42 AND service_id = 3 AND is_active = true LIMIT 1""",
+    "duplicate loan check": f"""SELECT * FROM {SCHEMA}.loan_application
+        WHERE farmer_id = 42 AND service_id = 3 AND status IN ('PENDING', 'REQUEST_DOC') LIMIT 1""",
+    "loan admin queue page": f"""SELECT * FROM {SCHEMA}.loan_application
+        WHERE service_id = 3 ORDER BY created_at DESC, id DESC LIMIT 51""",
+    "pending advisory check": f"""SELECT * FROM {SCHEMA}.crop_advisory
+        WHERE farmer_id = 42 AND service_id = 3 AND status = 'PENDING' LIMIT 1""",
+    "advisory admin queue page": f"""SELECT * FROM {SCHEMA}.crop_advisory
+        WHERE service_id = 3 ORDER BY created_at DESC, id DESC LIMIT 51""",
+    "/user/logs": f"""SELECT * FROM {SCHEMA}.accesslog
+        WHERE farmer_id = 42 ORDER BY timestamp DESC, id DESC LIMIT 51""",
+    "document vault": f"""SELECT * FROM {SCHEMA}.document
+        WHERE farmer_id = 42 ORDER BY created_at DESC, id DESC LIMIT 51""",
+}
+
+def vacuum_analyze(conn):
+    for table in TABLES:
+        conn.execute(text(f"VACUUM ANALYZE {SCHEMA}.{table}"))
+
+def explain_all(conn, label: str):
+    print(f"\n================ {label} ================")
+    for name, sql in QUERIES.items():
+        plan = conn.execute(text(f"EXPLAIN (ANALYZE, BUFFERS) {sql}")).scalars().all()
+        print(f"\n--- {name} ---")
+        print("\n".join(plan))
+
+def run(consents: int, logs: int, farmers: int, services: int, keep: bool):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SET statement_timeout = 0"))
+        for sql in SETUP:
+            conn.execute(text(sql))
+
+        print(f"🔹 Generating {consents:,} consents and {logs:,} access logs...")
+        started = time.time()
+        for sql in populate(consents, logs, farmers, services):
+            conn.execute(text(sql))
+        vacuum_analyze(conn)
+        print(f"   ✅ Data ready in {time.time() - started:.0f}s")
+
+        explain_all(conn, "BEFORE (init.sql indexes only)")
+
+        print("\n🔹 Building migration indexes...")
+        for sql in MIGRATION_INDEXES:
+            started = time.time()
+            conn.execute(text(sql))
+            print(f"   {sql.split(' ON ')[0].replace('CREATE INDEX ', '')}: {time.time() - started:.1f}s")
+        conn.execute(text(f"DROP INDEX {SCHEMA}.consent_farmer_id_idx"))
+        conn.execute(text(f"DROP INDEX {SCHEMA}.accesslog_farmer_id_idx"))
+        vacuum_analyze(conn)
+
+        explain_all(conn, "AFTER (migration 001)")
+
+        if not keep:
+            conn.execute(text(f"DROP SCHEMA {SCHEMA} CASCADE"))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark hot-path indexes")
+    parser.add_argument("--consents", type=int, default=1_000_000)
+    parser.add_argument("--logs", type=int, default=10_000_000)
+    parser.add_argument("--farmers", type=int, default=200_000)
+    parser.add_argument("--services", type=int, default=20)
+    parser.add_argument("--keep", action="store_true", help="Keep the bench schema for manual inspection")
+    args = parser.parse_args()
+    run(args.consents, args.logs, args.farmers, args.services, args.keep)
@@ -0,0 +1,54 @@
+"""
+Login latency under a burst of concurrent logins.
+
+Start the API first (e.g. `uvicorn app.main:app --workers 1`), then run:
+    python bench_login.py --concurrency 200 --requests 1000
+
+Tune PASSWORD_HASH_WORKERS / PASSWORD_HASH_MAX_QUEUE in .env and re-run to compare.
+A 503 in the status breakdown means the hashing backlog was full and the request was shed.
+"""
+import argparse
+import asyncio
+import random
+
+import httpx
+
+from bench_common import BASE_URL, run_load, print_report
+
+PASSWORD = "benchpassword123"
+
+async def ensure_user(phone: str):
+    async with httpx.AsyncClient(base_url=BASE_URL, timeout=30) as client:
+        await client.post("/auth/register", json={
+            "full_name": "Bench Farmer",
+            "phone_number": phone,
+            "email": f"bench{phone}@example.com",
+            "password": PASSWORD,
+        })
+
+async def main(concurrency: int, total: int, phone: str):
+    await ensure_user(phone)
+
+    async def login(client):
+        return await client.post("/auth/login", data={"username": phone, "password": PASSWORD})
+
+    # Side traffic: a cheap endpoint that must stay responsive while bcrypt runs
+    async def ping(client):
+        return await client.get("/services/")
+
+    latencies, statuses, wall = await run_load(login, concurrency, total)
+    print_report(f"POST /auth/login x{total} @ {concurrency} concurrent", latencies, statuses, wall)
+
+    _, (ping_lat, ping_status, ping_wall) = await asyncio.gather(
+        run_load(login, concurrency, total),
+        run_load(ping, 10, 200),
+    )
+    print_report("GET /services/ while logins are in flight", ping_lat, ping_status, ping_wall)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark login p99 under concurrent load")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--phone", default=f"8{random.randint(100000000, 999999999)}")
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency, args.requests, args.phone))
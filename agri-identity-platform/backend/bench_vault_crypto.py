@@ -0,0 +1,104 @@
+"""
+Throughput of the document vault's chunked AES-GCM (app/core/encryption.py).
+
+Runs offline, no server or database needed:
+    python bench_vault_crypto.py                       # 1 MB, 50 MB, 500 MB files, 64 KB segments
+    python bench_vault_crypto.py --sizes 1 50 --segment-kb 16 64 256
+
+For each size it writes a scratch plaintext file, then times
+  - encrypt: read file -> StreamEncryptor -> write vault file (what an upload pays)
+  - decrypt: encryption.decrypt_file() async generator, as the download endpoint consumes it
+alongside a plain copy and a SHA-256 pass over the same file as baselines.
+Needs ~2x the largest size in free space under --tmp-dir.
+"""
+import argparse
+import asyncio
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+from app.core import encryption
+from app.core.config import settings
+
+MB = 1024 * 1024
+READ_SIZE = settings.UPLOAD_CHUNK_BYTES
+
+def make_plaintext(path: str, size_mb: int):
+    block = os.urandom(MB)
+    with open(path, "wb") as f:
+        for _ in range(size_mb):
+            f.write(block)
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - started, result
+
+def plain_copy(src: str, dst: str):
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        shutil.copyfileobj(fin, fout, READ_SIZE)
+
+def sha256_file(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(READ_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def encrypt_file(src: str, dst: str, segment_size: int):
+    encryptor = encryption.StreamEncryptor(segment_size)
+    with open(src, "rb") as fin, open(dst, "wb") as fout:
+        fout.write(encryptor.header())
+        while chunk := fin.read(READ_SIZE):
+            fout.write(encryptor.update(chunk))
+        fout.write(encryptor.finalize())
+
+def decrypt_file(path: str) -> str:
+    async def consume():
+        hasher = hashlib.sha256()
+        async for chunk in encryption.decrypt_file(path, READ_SIZE):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+    return asyncio.run(consume())
+
+def mbps(size_mb: int, seconds: float) -> str:
+    return f"{size_mb / seconds:8.1f} MB/s" if seconds > 0 else "     inf"
+
+def main(sizes, segment_kbs, tmp_dir):
+    workdir = tempfile.mkdtemp(prefix="vault_bench_", dir=tmp_dir)
+    try:
+        for size_mb in sizes:
+            plain = os.path.join(workdir, f"plain_{size_mb}.bin")
+            make_plaintext(plain, size_mb)
+
+            copy_s, _ = timed(plain_copy, plain, plain + ".copy")
+            os.remove(plain + ".copy")
+            hash_s, expected = timed(sha256_file, plain)
+
+            print(f"\n=== {size_mb} MB ===")
+            print(f"  plain copy        {mbps(size_mb, copy_s)}")
+            print(f"  sha256            {mbps(size_mb, hash_s)}")
+
+            for segment_kb in segment_kbs:
+                vault = os.path.join(workdir, f"vault_{size_mb}_{segment_kb}.bin")
+                enc_s, _ = timed(encrypt_file, plain, vault, segment_kb * 1024)
+                dec_s, digest = timed(decrypt_file, vault)
+                overhead = os.path.getsize(vault) - size_mb * MB
+                status = "ok" if digest == expected else "MISMATCH"
+                print(f"  {segment_kb:>4} KB segments  encrypt {mbps(size_mb, enc_s)}  "
+                      f"decrypt {mbps(size_mb, dec_s)}  (+{overhead:,} bytes, {status})")
+                os.remove(vault)
+
+            os.remove(plain)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark vault encryption throughput")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 50, 500], help="File sizes in MB")
+    parser.add_argument("--segment-kb", type=int, nargs="+", default=[settings.VAULT_SEGMENT_BYTES // 1024])
+    parser.add_argument("--tmp-dir", default=None)
+    args = parser.parse_args()
+    main(args.sizes, args.segment_kb, args.tmp_dir)
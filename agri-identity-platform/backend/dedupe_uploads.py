@@ -0,0 +1,155 @@
+"""
+Move existing uploads into the content-addressed blob store (migration 005) and collapse duplicates.
+
+    python dedupe_uploads.py --dry-run   # report what would be merged / reclaimed
+    python dedupe_uploads.py
+
+For every document whose file is not yet a blob, the script hashes the plaintext (decrypting vault
+files), links the file into uploads/blobs/ab/cd/<sha256>.bin unless that blob already exists,
+re-points the document at the blob and bumps its refcount. Old files are deleted once no document
+references them. Finally it adds the document.sha256 -> blob.sha256 foreign key.
+Safe to re-run; documents already in the store are skipped. Run `python migrate.py` first.
+"""
+import argparse
+import hashlib
+import os
+from sqlalchemy import select, func, text
+from app.core import encryption
+from app.core.config import settings
+from app.db.session import SessionLocal, engine
+from app.models.blob import Blob
+from app.models.document import Document
+from app.services.document_service import blob_path
+
+def hash_plaintext(path: str):
+    """(sha256, plaintext size, is_encrypted) for a stored file."""
+    hasher = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as f:
+        is_encrypted = f.read(len(encryption.MAGIC)) == encryption.MAGIC
+        f.seek(0)
+        decryptor = encryption.StreamDecryptor() if is_encrypted else None
+        while chunk := f.read(settings.UPLOAD_CHUNK_BYTES):
+            plain = decryptor.update(chunk) if decryptor else chunk
+            hasher.update(plain)
+            size += len(plain)
+        if decryptor:
+            plain = decryptor.finalize()
+            hasher.update(plain)
+            size += len(plain)
+    return hasher.hexdigest(), size, is_encrypted
+
+def is_vault_file(path: str) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(encryption.MAGIC)) == encryption.MAGIC
+
+def link_into_store(src: str, dst: str) -> bool:
+    os.makedirs(os.path.dirname(dst), exist_ok=True)
+    try:
+        os.link(src, dst)
+    except FileExistsError:
+        return False
+    return True
+
+def add_foreign_key():
+    with engine.connect() as conn:
+        exists = conn.execute(text("""
+            SELECT 1 FROM pg_constraint
+            WHERE conrelid = 'document'::regclass AND confrelid = 'blob'::regclass AND contype = 'f'
+        """)).first()
+        if exists:
+            return
+        dangling = conn.execute(text("""
+            SELECT count(*) FROM document d
+            WHERE d.sha256 IS NOT NULL AND NOT EXISTS (SELECT 1 FROM blob b WHERE b.sha256 = d.sha256)
+        """)).scalar()
+        if dangling:
+            print(f"⚠️ {dangling} documents reference no blob (missing files?); foreign key not added.")
+            return
+        # NOT VALID + VALIDATE: the scan runs without blocking writes to document
+        conn.execute(text("""
+            ALTER TABLE document ADD CONSTRAINT document_sha256_fkey
+            FOREIGN KEY (sha256) REFERENCES blob (sha256) NOT VALID
+        """))
+        conn.execute(text("ALTER TABLE document VALIDATE CONSTRAINT document_sha256_fkey"))
+        conn.commit()
+        print("✅ Added document.sha256 -> blob foreign key.")
+
+def dedupe(dry_run: bool, batch_size: int):
+    moved = merged = missing = 0
+    reclaimed_bytes = 0
+    seen_in_dry_run = set()
+    last_id = 0
+
+    with SessionLocal() as db:
+        while True:
+            docs = db.scalars(
+                select(Document).where(Document.id > last_id).order_by(Document.id).limit(batch_size)
+            ).all()
+            if not docs:
+                break
+            last_id = docs[-1].id
+            retired_paths = set()
+
+            for doc in docs:
+                if doc.sha256 and doc.storage_path == blob_path(doc.sha256):
+                    continue # Already in the store
+                if not os.path.isfile(doc.storage_path):
+                    print(f"⚠️ Document #{doc.id}: file missing at {doc.storage_path}")
+                    missing += 1
+                    continue
+
+                sha256, size, is_encrypted = hash_plaintext(doc.storage_path)
+
+                if dry_run:
+                    existing = sha256 in seen_in_dry_run or db.get(Blob, sha256) is not None
+                    seen_in_dry_run.add(sha256)
+                    if existing:
+                        merged += 1
+                        reclaimed_bytes += os.path.getsize(doc.storage_path)
+                    else:
+                        moved += 1
+                    continue
+
+                blob = db.scalar(select(Blob).where(Blob.sha256 == sha256).with_for_update())
+                if blob is None:
+                    path = blob_path(sha256)
+                    if not link_into_store(doc.storage_path, path):
+                        is_encrypted = is_vault_file(path) # Left over from a crash; keep what is there
+                    blob = Blob(sha256=sha256, storage_path=path, size_bytes=size, is_encrypted=is_encrypted, refcount=0)
+                    db.add(blob)
+                    moved += 1
+                else:
+                    merged += 1
+
+                retired_paths.add(doc.storage_path)
+                blob.refcount += 1
+                doc.sha256 = sha256
+                doc.size_bytes = blob.size_bytes
+                doc.is_encrypted = blob.is_encrypted
+                doc.storage_path = blob.storage_path
+                db.flush()
+
+            if dry_run:
+                continue
+            db.commit()
+
+            # Old copies go once nothing points at them any more (the store holds its own hard link)
+            for path in retired_paths:
+                still_used = db.scalar(select(func.count(Document.id)).where(Document.storage_path == path))
+                if not still_used and os.path.isfile(path):
+                    reclaimed_bytes += os.path.getsize(path) if os.stat(path).st_nlink == 1 else 0
+                    os.remove(path)
+
+    prefix = "[dry-run] " if dry_run else ""
+    print(f"{prefix}✅ {moved} files moved into the blob store, {merged} duplicates merged, {missing} missing.")
+    print(f"{prefix}💾 {reclaimed_bytes / (1024 * 1024):.1f} MB reclaimed.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Deduplicate uploads into the content-addressed blob store")
+    parser.add_argument("--dry-run", action="store_true")
+    parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+    dedupe(args.dry_run, args.batch_size)
+    if not args.dry_run:
+        add_foreign_key()
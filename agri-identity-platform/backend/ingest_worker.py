@@ -0,0 +1,21 @@
+"""
+Document ingestion worker: MIME sniffing, PDF page counts and image dimensions for uploaded
+documents (see app/services/ingest_service.py). Run one or more next to the API; they share the queue.
+
+    python ingest_worker.py                # poll forever
+    python ingest_worker.py --once         # drain the backlog and exit (e.g. right after migration 007)
+    python ingest_worker.py --workers 4    # inspection processes (default: INGEST_WORKERS, else CPU count)
+"""
+import argparse
+import asyncio
+from app.services import ingest_service
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Background document ingestion")
+    parser.add_argument("--once", action="store_true", help="Exit when no documents are waiting")
+    parser.add_argument("--workers", type=int, default=None, help="Inspection processes")
+    args = parser.parse_args()
+    try:
+        asyncio.run(ingest_service.run_worker(workers=args.workers, once=args.once))
+    except KeyboardInterrupt:
+        print("🛑 Ingest worker stopped")
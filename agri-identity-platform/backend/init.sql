@@ -51,6 +51,7 @@ CREATE TABLE IF NOT EXISTS consent (
 );
 
 -- 4. Access Logs Table (Audit Trail)
+-- (migrations/002 converts it into a monthly range-partitioned table)
 CREATE TABLE IF NOT EXISTS accesslog (
     id SERIAL PRIMARY KEY,
     farmer_id INTEGER REFERENCES farmer(id) ON DELETE CASCADE,
@@ -100,5 +101,4 @@ CREATE TABLE IF NOT EXISTS loan_application (
 -- Indexes for performance
 CREATE INDEX IF NOT EXISTS idx_farmer_phone ON farmer(phone_number);
 CREATE INDEX IF NOT EXISTS idx_service_client_id ON service(client_id);
-CREATE INDEX IF NOT EXISTS idx_consent_farmer ON consent(farmer_id);
-CREATE INDEX IF NOT EXISTS idx_accesslog_farmer ON accesslog(farmer_id);
+-- Composite / partial indexes for the hot paths live in migrations/ (run: python migrate.py)
@@ -0,0 +1,112 @@
+"""
+Periodic database maintenance. Run from cron / a scheduled job.
+
+    python maintenance.py partitions               # create upcoming accesslog months, retire expired ones
+    python maintenance.py partitions --dry-run     # only print what would change
+    python maintenance.py partitions --retention-action drop
+    python maintenance.py uploads                  # drop abandoned resumable uploads and temp files
+    python maintenance.py orphans                  # quarantine files no row references, purge old quarantine
+    python maintenance.py orphans --max-batches 50 # bounded slice of the walk (resumes from the checkpoint)
+    python maintenance.py consents                 # deactivate expired consents, close dependent loans / advisories
+"""
+import argparse
+from app.db.session import engine, SessionLocal
+from app.db import partitions
+
+def run_partitions(args):
+    report = partitions.maintain_partitions(
+        engine, ahead=args.ahead, retention_action=args.retention_action, dry_run=args.dry_run
+    )
+    prefix = "[dry-run] " if args.dry_run else ""
+    for name in report["created"]:
+        print(f"{prefix}✅ Created partition {name}")
+    for name in report["detached"]:
+        action = "Dropped" if name in report["dropped"] else "Detached"
+        print(f"{prefix}🗑️ {action} partition {name}")
+    if report["moved_from_default"]:
+        print(f"🔹 Moved {report['moved_from_default']} rows out of {partitions.DEFAULT_PARTITION}")
+    if report.get("dropped_default_rows"):
+        print(f"🗑️ Deleted {report['dropped_default_rows']} expired rows from {partitions.DEFAULT_PARTITION}")
+    if report["default_rows"]:
+        print(f"⚠️ {report['default_rows']} rows sit in {partitions.DEFAULT_PARTITION} (outside every monthly range)")
+    if not (report["created"] or report["detached"]):
+        print("✅ Partitions up to date.")
+
+def run_uploads(args):
+    from app.services import upload_session_service
+    with SessionLocal() as db:
+        report = upload_session_service.collect_stale(db, ttl_hours=args.ttl_hours, dry_run=args.dry_run)
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"{prefix}🗑️ Removed {report['sessions']} stale upload sessions and "
+          f"{report['files']} temp files ({report['bytes'] / (1024 * 1024):.1f} MB)")
+
+def run_orphans(args):
+    import asyncio
+    from app.services import storage_gc_service
+
+    async def collect():
+        with SessionLocal() as db:
+            walk = await storage_gc_service.collect_orphans(
+                db, batch_size=args.batch_size, grace_hours=args.grace_hours,
+                max_batches=args.max_batches, dry_run=args.dry_run
+            )
+            purge = await storage_gc_service.purge_quarantine(db, retention_days=args.quarantine_days, dry_run=args.dry_run)
+        return walk, purge
+
+    walk, purge = asyncio.run(collect())
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"{prefix}🔹 Scanned {walk['scanned']} files, quarantined {walk['orphans']} orphans "
+          f"({walk['orphan_bytes'] / (1024 * 1024):.1f} MB)")
+    if walk["restored"] or purge["restored"]:
+        print(f"{prefix}♻️ Restored {walk['restored'] + purge['restored']} files that are referenced again")
+    print(f"{prefix}🗑️ Purged {purge['purged']} quarantined files ({purge['purged_bytes'] / (1024 * 1024):.1f} MB), "
+          f"{purge['held']} still within retention")
+    if walk["pass_completed"]:
+        print("✅ Pass complete; the next run starts from the top.")
+    else:
+        print(f"⏸️ Paused at {walk['position']}")
+
+def run_consents(args):
+    from app.services import consent_service
+    with SessionLocal() as db:
+        report = consent_service.sweep_expired_consents(
+            db, batch_size=args.batch_size, max_batches=args.max_batches, dry_run=args.dry_run
+        )
+    prefix = "[dry-run] " if args.dry_run else ""
+    print(f"{prefix}⏳ Expired {report['consents']} consents in {report['batches']} batches; "
+          f"rejected {report['loans']} loans, closed {report['advisories']} advisory requests")
+    if not report["caught_up"]:
+        print("⏸️ More consents are due; run again to continue.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Database maintenance tasks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    p = subparsers.add_parser("partitions", help="Maintain monthly accesslog partitions")
+    p.add_argument("--ahead", type=int, default=None, help="Future months to pre-create (default: ACCESSLOG_PARTITIONS_AHEAD)")
+    p.add_argument("--retention-action", choices=["detach", "drop"], default=None,
+                   help="What to do with months past ACCESSLOG_RETENTION_MONTHS (default: ACCESSLOG_RETENTION_ACTION)")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=run_partitions)
+
+    p = subparsers.add_parser("uploads", help="Garbage-collect abandoned resumable uploads")
+    p.add_argument("--ttl-hours", type=int, default=None, help="Idle time before a session is dropped (default: UPLOAD_SESSION_TTL_HOURS)")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=run_uploads)
+
+    p = subparsers.add_parser("orphans", help="Quarantine and purge stored files no document references")
+    p.add_argument("--batch-size", type=int, default=None, help="Keys per batch (default: ORPHAN_GC_BATCH_SIZE)")
+    p.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches (default: finish the pass)")
+    p.add_argument("--grace-hours", type=int, default=None, help="Minimum file age (default: ORPHAN_GC_GRACE_HOURS)")
+    p.add_argument("--quarantine-days", type=int, default=None, help="Quarantine retention (default: ORPHAN_GC_QUARANTINE_DAYS)")
+    p.add_argument("--dry-run", action="store_true")
+    p.set_defaults(func=run_orphans)
+
+    p = subparsers.add_parser("consents", help="Deactivate expired consents and cascade to loans / advisories")
+    p.add_argument("--batch-size", type=int, default=None, help="Consents per transaction (default: CONSENT_SWEEP_BATCH_SIZE)")
+    p.add_argument("--max-batches", type=int, default=None, help="Stop after this many batches (default: until caught up)")
+    p.add_argument("--dry-run", action="store_true", help="Count the first batch, change nothing")
+    p.set_defaults(func=run_consents)
+
+    args = parser.parse_args()
+    args.func(args)
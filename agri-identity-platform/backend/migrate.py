@@ -0,0 +1,73 @@
+"""
+Apply versioned SQL migrations from migrations/ in filename order.
+
+    python migrate.py            # apply pending migrations
+    python migrate.py --status   # list applied / pending
+
+Each file runs statement by statement in autocommit mode, so CREATE INDEX CONCURRENTLY works.
+Applied versions are recorded in the schema_migrations table.
+"""
+import argparse
+import os
+import re
+from sqlalchemy import text
+from app.db.session import engine
+
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+def split_statements(sql_script: str):
+    """Split on ';' at end of line, ignoring semicolons inside $$-quoted bodies (DO blocks, functions)."""
+    statements, current, in_dollar_block = [], [], False
+    for line in sql_script.splitlines():
+        stripped = line.strip()
+        if not current and (not stripped or stripped.startswith("--")):
+            continue
+        current.append(line)
+        if line.count("$$") % 2 == 1:
+            in_dollar_block = not in_dollar_block
+        if not in_dollar_block and stripped.endswith(";"):
+            statements.append("\n".join(current))
+            current = []
+    if current and "".join(current).strip():
+        statements.append("\n".join(current))
+    return statements
+
+def list_migrations():
+    return sorted(f for f in os.listdir(MIGRATIONS_DIR) if re.match(r"^\d+_.*\.sql$", f))
+
+def applied_versions(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(255) PRIMARY KEY,
+            applied_at TIMESTAMP DEFAULT (now() at time zone 'utc')
+        )
+    """))
+    return {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+def migrate(show_status: bool = False):
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("SET statement_timeout = 0")) # Index builds and backfills outlive the app's timeout
+        done = applied_versions(conn)
+
+        for filename in list_migrations():
+            version = filename.split("_", 1)[0]
+            if version in done:
+                print(f"✅ {filename} (applied)")
+                continue
+            if show_status:
+                print(f"⏳ {filename} (pending)")
+                continue
+
+            print(f"🔹 Applying {filename}...")
+            with open(os.path.join(MIGRATIONS_DIR, filename), "r") as f:
+                statements = split_statements(f.read())
+            for statement in statements:
+                conn.exec_driver_sql(statement)
+            conn.execute(text("INSERT INTO schema_migrations (version) VALUES (:v)"), {"v": version})
+            print(f"   ✅ {len(statements)} statements applied.")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply SQL migrations")
+    parser.add_argument("--status", action="store_true", help="Only show which migrations are pending")
+    args = parser.parse_args()
+    migrate(show_status=args.status)
@@ -0,0 +1,32 @@
+-- 001: Composite / partial indexes for the hot lookup predicates.
+-- Built CONCURRENTLY so live traffic keeps writing; migrate.py runs each statement outside a transaction.
+-- If a concurrent build is interrupted it leaves an INVALID index behind: DROP it and re-run.
+
+-- Active-consent checks: (farmer_id, service_id, is_active = TRUE) in loan, crop advisory and consent routes
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_consent_active_farmer_service
+    ON consent (farmer_id, service_id) WHERE is_active;
+
+-- Duplicate-application checks and the farmer's own list
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_loan_application_farmer_service_status
+    ON loan_application (farmer_id, service_id, status);
+
+-- Admin queue for one service, in (created_at, id) order
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_loan_application_service_created
+    ON loan_application (service_id, created_at, id);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crop_advisory_farmer_service_status
+    ON crop_advisory (farmer_id, service_id, status);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_crop_advisory_service_created
+    ON crop_advisory (service_id, created_at, id);
+
+-- /user/logs index: created by 002_partition_accesslog.sql (CONCURRENTLY is not allowed on partitioned tables)
+
+-- Document vault listing
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_farmer_created
+    ON document (farmer_id, created_at, id);
+
+-- Superseded by the composites above (same leading column). The consent one is partial, so lookups
+-- that include inactive consents are covered by ix_consent_farmer_service_created (012) instead.
+DROP INDEX CONCURRENTLY IF EXISTS idx_consent_farmer;
+DROP INDEX CONCURRENTLY IF EXISTS idx_accesslog_farmer;
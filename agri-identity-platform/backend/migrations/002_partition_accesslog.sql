@@ -0,0 +1,72 @@
+-- 002: Turn accesslog into a table range-partitioned by month on timestamp.
+-- Old months can then be detached/dropped whole instead of DELETEd and vacuumed, and /user/logs
+-- only touches the partitions its time window overlaps. Ongoing partition creation and retention:
+--     python maintenance.py partitions
+--
+-- The conversion copies the existing rows inside one DO block while holding an EXCLUSIVE lock on
+-- the old table: reads keep working, audit writes wait until the copy commits. Run it off-peak.
+-- The old table is kept as accesslog_unpartitioned; drop it once the copy has been checked.
+
+DO $$
+DECLARE
+    relkind_ "char";
+    first_month TIMESTAMP;
+    month_start TIMESTAMP;
+BEGIN
+    SELECT c.relkind INTO relkind_ FROM pg_class c
+    WHERE c.oid = to_regclass('accesslog');
+
+    IF relkind_ = 'p' THEN
+        RETURN; -- Already partitioned (fresh install through init_db.py / create_all)
+    END IF;
+
+    LOCK TABLE accesslog IN EXCLUSIVE MODE;
+
+    ALTER TABLE accesslog RENAME TO accesslog_unpartitioned;
+    ALTER TABLE accesslog_unpartitioned RENAME CONSTRAINT accesslog_pkey TO accesslog_unpartitioned_pkey;
+    ALTER INDEX IF EXISTS ix_accesslog_farmer_timestamp RENAME TO ix_accesslog_unpartitioned_farmer_timestamp;
+    ALTER INDEX IF EXISTS ix_accesslog_id RENAME TO ix_accesslog_unpartitioned_id;
+
+    CREATE TABLE accesslog (
+        id INTEGER NOT NULL DEFAULT nextval('accesslog_id_seq'),
+        farmer_id INTEGER REFERENCES farmer(id) ON DELETE CASCADE,
+        service_id INTEGER REFERENCES service(id) ON DELETE CASCADE,
+        action VARCHAR(255),
+        resource TEXT,
+        ip_address VARCHAR(50),
+        timestamp TIMESTAMP NOT NULL DEFAULT (now() at time zone 'utc'),
+        status VARCHAR(50),
+        details TEXT,
+        PRIMARY KEY (id, timestamp)
+    ) PARTITION BY RANGE (timestamp);
+
+    -- One partition per month that has data, through three months ahead
+    SELECT date_trunc('month', COALESCE(min(timestamp), now() at time zone 'utc'))
+    INTO first_month FROM accesslog_unpartitioned;
+
+    month_start := first_month;
+    WHILE month_start <= date_trunc('month', now() at time zone 'utc') + interval '3 months' LOOP
+        EXECUTE format(
+            'CREATE TABLE %I PARTITION OF accesslog FOR VALUES FROM (%L) TO (%L)',
+            'accesslog_' || to_char(month_start, 'YYYY_MM'), month_start, month_start + interval '1 month'
+        );
+        month_start := month_start + interval '1 month';
+    END LOOP;
+
+    INSERT INTO accesslog (id, farmer_id, service_id, action, resource, ip_address, timestamp, status, details)
+    SELECT id, farmer_id, service_id, action, resource, ip_address,
+           COALESCE(timestamp, now() at time zone 'utc'), status, details
+    FROM accesslog_unpartitioned;
+
+    ALTER TABLE accesslog_unpartitioned ALTER COLUMN id DROP DEFAULT;
+    ALTER SEQUENCE accesslog_id_seq OWNED BY accesslog.id;
+END $$;
+
+-- Catch-all for rows outside the monthly ranges (e.g. if maintenance has not run);
+-- maintenance.py moves such rows into a proper partition when it creates one.
+CREATE TABLE IF NOT EXISTS accesslog_default PARTITION OF accesslog DEFAULT;
+
+-- /user/logs: one farmer's trail, newest first, with the keyset tie-breaker.
+-- Created on the parent, so every partition (current and future) gets its own copy.
+DROP INDEX IF EXISTS ix_accesslog_farmer_timestamp;
+CREATE INDEX ix_accesslog_farmer_timestamp ON accesslog (farmer_id, timestamp DESC, id DESC);
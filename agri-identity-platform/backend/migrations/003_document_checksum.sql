@@ -0,0 +1,5 @@
+-- 003: Content hash and size for uploaded documents, computed while the upload streams to disk.
+-- Nullable: rows uploaded before this migration have neither.
+
+ALTER TABLE document ADD COLUMN IF NOT EXISTS sha256 VARCHAR(64);
+ALTER TABLE document ADD COLUMN IF NOT EXISTS size_bytes BIGINT;
@@ -0,0 +1,4 @@
+-- 004: Flag documents stored in the encrypted vault format (app/core/encryption.py).
+-- Existing files stay plaintext and keep is_encrypted = FALSE.
+
+ALTER TABLE document ADD COLUMN IF NOT EXISTS is_encrypted BOOLEAN NOT NULL DEFAULT FALSE;
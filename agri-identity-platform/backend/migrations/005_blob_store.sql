@@ -0,0 +1,15 @@
+-- 005: Content-addressed blob store. Documents with identical plaintext share one file,
+-- uploads/blobs/ab/cd/<sha256>.bin, reference-counted in this table.
+-- Existing files are moved into the store and deduplicated by `python dedupe_uploads.py`,
+-- which also adds the document.sha256 -> blob foreign key once every hashed row has its blob.
+
+CREATE TABLE IF NOT EXISTS blob (
+    sha256 VARCHAR(64) PRIMARY KEY,
+    storage_path VARCHAR NOT NULL,
+    size_bytes BIGINT NOT NULL,
+    is_encrypted BOOLEAN NOT NULL DEFAULT FALSE,
+    refcount INTEGER NOT NULL DEFAULT 0,
+    created_at TIMESTAMP DEFAULT (now() at time zone 'utc')
+);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_sha256 ON document (sha256);
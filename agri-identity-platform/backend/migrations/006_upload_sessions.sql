@@ -0,0 +1,19 @@
+-- 006: Resumable uploads. One row per upload in progress; the received bytes live in
+-- uploads/.tmp/<id>.upload. Abandoned sessions are removed by `python maintenance.py uploads`.
+
+CREATE TABLE IF NOT EXISTS upload_session (
+    id VARCHAR(32) PRIMARY KEY,
+    farmer_id INTEGER NOT NULL REFERENCES farmer (id),
+    title VARCHAR NOT NULL,
+    doc_type VARCHAR DEFAULT 'OTHER',
+    filename VARCHAR NOT NULL,
+    mime_type VARCHAR NOT NULL,
+    is_sensitive BOOLEAN DEFAULT FALSE,
+    total_bytes BIGINT NOT NULL,
+    received_bytes BIGINT NOT NULL DEFAULT 0,
+    lease_until TIMESTAMP,
+    created_at TIMESTAMP DEFAULT (now() at time zone 'utc'),
+    updated_at TIMESTAMP DEFAULT (now() at time zone 'utc')
+);
+
+CREATE INDEX IF NOT EXISTS ix_upload_session_updated ON upload_session (updated_at);
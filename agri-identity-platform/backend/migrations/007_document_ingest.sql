@@ -0,0 +1,15 @@
+-- 007: Background ingestion. Uploads are stored as RECEIVED and ingest_worker.py fills in the
+-- sniffed MIME type, page count and image dimensions. Existing rows start as RECEIVED too, so the
+-- worker backfills them on its first runs.
+
+ALTER TABLE document ADD COLUMN IF NOT EXISTS ingest_status VARCHAR(16) NOT NULL DEFAULT 'RECEIVED';
+ALTER TABLE document ADD COLUMN IF NOT EXISTS ingest_attempts INTEGER NOT NULL DEFAULT 0;
+ALTER TABLE document ADD COLUMN IF NOT EXISTS ingest_started_at TIMESTAMP;
+ALTER TABLE document ADD COLUMN IF NOT EXISTS ingest_error VARCHAR;
+ALTER TABLE document ADD COLUMN IF NOT EXISTS ingested_at TIMESTAMP;
+ALTER TABLE document ADD COLUMN IF NOT EXISTS page_count INTEGER;
+ALTER TABLE document ADD COLUMN IF NOT EXISTS width INTEGER;
+ALTER TABLE document ADD COLUMN IF NOT EXISTS height INTEGER;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_ingest_pending ON document (id)
+    WHERE ingest_status IN ('RECEIVED', 'PROCESSING');
@@ -0,0 +1,14 @@
+-- 008: Orphaned file collection (`python maintenance.py orphans`). The collector walks storage in
+-- key order and records how far it got here, so a pass over millions of files can be spread across
+-- many short runs. The storage_path indexes serve its anti-join against document and blob.
+
+CREATE TABLE IF NOT EXISTS maintenance_checkpoint (
+    name VARCHAR(64) PRIMARY KEY,
+    position VARCHAR NOT NULL DEFAULT '',
+    pass_started_at TIMESTAMP,
+    passes_completed INTEGER NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT (now() at time zone 'utc')
+);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_document_storage_path ON document (storage_path);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_blob_storage_path ON blob (storage_path);
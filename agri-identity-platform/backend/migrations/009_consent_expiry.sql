@@ -0,0 +1,10 @@
+-- 009: Consent expiry sweeper (services/consent_service.py, `python maintenance.py consents`).
+-- The sweeper picks active consents whose expires_at has passed, oldest first; this partial index
+-- holds exactly the time-bound active rows, so each batch is an index range scan. Rows leave the
+-- index as they are deactivated.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_consent_active_expires
+    ON consent (expires_at, id) WHERE is_active AND expires_at IS NOT NULL;
+
+-- Consents that had already run out before the sweeper existed are deactivated by its first runs
+-- (batched, so no single long transaction here).
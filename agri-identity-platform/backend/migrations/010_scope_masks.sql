@@ -0,0 +1,34 @@
+-- 010: Compiled scope bitmasks (app/core/scopes.py). service.allowed_scope_mask and
+-- consent.granted_scope_mask mirror the JSONB scope lists as integers; the models keep them in
+-- step on every write. The backfill below maps names to bits exactly as REGISTRY does there:
+-- if a scope is ever appended to the registry, existing rows listing it need a new migration.
+
+ALTER TABLE service ADD COLUMN IF NOT EXISTS allowed_scope_mask BIGINT NOT NULL DEFAULT 0;
+ALTER TABLE consent ADD COLUMN IF NOT EXISTS granted_scope_mask BIGINT NOT NULL DEFAULT 0;
+
+CREATE OR REPLACE FUNCTION pg_temp.scope_mask(scopes JSONB) RETURNS BIGINT AS $$
+    SELECT COALESCE(bit_or(r.bit), 0)
+    FROM jsonb_array_elements_text(CASE WHEN jsonb_typeof(scopes) = 'array' THEN scopes ELSE '[]'::jsonb END) AS s(name)
+    JOIN (VALUES
+        ('profile', 1::BIGINT), ('aadhaar', 2), ('land_records', 4), ('documents', 8),
+        ('location', 16), ('crop_data', 32), ('land_data', 64), ('bank_details', 128)
+    ) AS r(name, bit) ON r.name = s.name
+$$ LANGUAGE sql IMMUTABLE;
+
+UPDATE service SET allowed_scope_mask = pg_temp.scope_mask(allowed_scopes);
+
+-- consent can be large: backfill in batches of 10000 ids, committing each, so no long lock or transaction
+DO $$
+DECLARE
+    last_id INTEGER := 0;
+    max_id INTEGER;
+BEGIN
+    SELECT COALESCE(max(id), 0) INTO max_id FROM consent;
+    WHILE last_id < max_id LOOP
+        UPDATE consent SET granted_scope_mask = pg_temp.scope_mask(granted_scopes)
+        WHERE id > last_id AND id <= last_id + 10000;
+        last_id := last_id + 10000;
+        COMMIT;
+    END LOOP;
+END
+$$;
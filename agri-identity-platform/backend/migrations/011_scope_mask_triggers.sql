@@ -0,0 +1,55 @@
+-- 011: Derive the scope masks in the database. Until now only the ORM validators (models/service.py,
+-- models/consent.py) kept service.allowed_scope_mask / consent.granted_scope_mask in step, so rows
+-- written with raw SQL (reset_db.py, init_crop_service.py) got a mask of 0 and every scope was
+-- refused for them. BEFORE triggers now recompute the mask from the JSONB list on every insert and
+-- on every update of the list. scope_mask() maps names to bits exactly as REGISTRY in
+-- app/core/scopes.py does: when a scope is appended there, replace the function here too.
+
+CREATE OR REPLACE FUNCTION scope_mask(scopes JSONB) RETURNS BIGINT AS $$
+    SELECT COALESCE(bit_or(r.bit), 0)
+    FROM jsonb_array_elements_text(CASE WHEN jsonb_typeof(scopes) = 'array' THEN scopes ELSE '[]'::jsonb END) AS s(name)
+    JOIN (VALUES
+        ('profile', 1::BIGINT), ('aadhaar', 2), ('land_records', 4), ('documents', 8),
+        ('location', 16), ('crop_data', 32), ('land_data', 64), ('bank_details', 128)
+    ) AS r(name, bit) ON r.name = s.name
+$$ LANGUAGE sql IMMUTABLE;
+
+CREATE OR REPLACE FUNCTION service_scope_mask_sync() RETURNS trigger AS $$
+BEGIN
+    NEW.allowed_scope_mask := scope_mask(NEW.allowed_scopes);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION consent_scope_mask_sync() RETURNS trigger AS $$
+BEGIN
+    NEW.granted_scope_mask := scope_mask(NEW.granted_scopes);
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_service_scope_mask ON service;
+CREATE TRIGGER trg_service_scope_mask BEFORE INSERT OR UPDATE OF allowed_scopes, allowed_scope_mask ON service
+    FOR EACH ROW EXECUTE FUNCTION service_scope_mask_sync();
+
+DROP TRIGGER IF EXISTS trg_consent_scope_mask ON consent;
+CREATE TRIGGER trg_consent_scope_mask BEFORE INSERT OR UPDATE OF granted_scopes, granted_scope_mask ON consent
+    FOR EACH ROW EXECUTE FUNCTION consent_scope_mask_sync();
+
+-- Repair rows written with raw SQL since 010 ran
+UPDATE service SET allowed_scopes = allowed_scopes WHERE allowed_scope_mask <> scope_mask(allowed_scopes);
+
+DO $$
+DECLARE
+    last_id INTEGER := 0;
+    max_id INTEGER;
+BEGIN
+    SELECT COALESCE(max(id), 0) INTO max_id FROM consent;
+    WHILE last_id < max_id LOOP
+        UPDATE consent SET granted_scopes = granted_scopes
+        WHERE id > last_id AND id <= last_id + 10000 AND granted_scope_mask <> scope_mask(granted_scopes);
+        last_id := last_id + 10000;
+        COMMIT;
+    END LOOP;
+END
+$$;
@@ -0,0 +1,9 @@
+-- 012: Full (farmer_id, service_id) index on consent.
+-- 001 dropped idx_consent_farmer in favour of ix_consent_active_farmer_service, but that index is
+-- partial (WHERE is_active), so lookups that also need inactive rows lost their index: the current
+-- consent of a pair (consent_repo.get_consent_state, policy_repo, active row first, else the latest
+-- revoked / expired one) and any farmer_id-only scan. This one covers all rows; created_at lets the
+-- pair's latest row come straight off the index.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_consent_farmer_service_created
+    ON consent (farmer_id, service_id, created_at);
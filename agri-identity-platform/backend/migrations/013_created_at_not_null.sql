@@ -0,0 +1,26 @@
+-- 013: NOT NULL created_at on the tables lists page through (utils/pagination.py).
+-- created_at only had a Python-side default, so rows inserted by SQL scripts could carry NULL.
+-- Under ORDER BY created_at DESC those sort first, a NULL on a page boundary broke the next cursor,
+-- and the (created_at, id) < cursor comparison skipped them on every later page. Rows of unknown age
+-- are backfilled to the epoch (last page), and the database now fills the column itself.
+-- SET NOT NULL scans each table once under an exclusive lock; these are the small tables, not accesslog.
+
+UPDATE service SET created_at = '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE service ALTER COLUMN created_at SET DEFAULT (now() at time zone 'utc');
+ALTER TABLE service ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE consent SET created_at = '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE consent ALTER COLUMN created_at SET DEFAULT (now() at time zone 'utc');
+ALTER TABLE consent ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE document SET created_at = '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE document ALTER COLUMN created_at SET DEFAULT (now() at time zone 'utc');
+ALTER TABLE document ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE loan_application SET created_at = '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE loan_application ALTER COLUMN created_at SET DEFAULT (now() at time zone 'utc');
+ALTER TABLE loan_application ALTER COLUMN created_at SET NOT NULL;
+
+UPDATE crop_advisory SET created_at = '1970-01-01' WHERE created_at IS NULL;
+ALTER TABLE crop_advisory ALTER COLUMN created_at SET DEFAULT (now() at time zone 'utc');
+ALTER TABLE crop_advisory ALTER COLUMN created_at SET NOT NULL;
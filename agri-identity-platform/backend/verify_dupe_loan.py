@@ -78,7 +78,7 @@ def run_verification():
     print("\n--- 2. Check Existing Loans (Table Data Verification) ---")
     resp = requests.get(f"{BASE_URL}/loan/my-applications", headers=headers)
     if resp.status_code == 200:
-        loans = resp.json()
+        loans = resp.json()["items"]
         print(f"✅ Fetched {len(loans)} applications.")
         if isinstance(loans, list):
              print("✅ Correct Data Type: List (Array)")
@@ -108,7 +108,7 @@ def run_verification():
     # Check List AGAIN to verify it appears
     print("\n--- 3.5 Re-Check Loan List (Should have 1 loan) ---")
     resp = requests.get(f"{BASE_URL}/loan/my-applications", headers=headers)
-    loans = resp.json()
+    loans = resp.json()["items"]
     print(f"✅ Fetched {len(loans)} applications after creation. Data: {loans}")
 
     # 3b. Second Application (Should Fail)
@@ -1,7 +1,7 @@
 
 import React, { useState, useEffect } from 'react';
 import { Box, Container, Typography, Paper, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Button, Chip, Dialog, DialogTitle, DialogContent, TextField, DialogActions, Tabs, Tab } from '@mui/material';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import { toast } from 'react-toastify';
 
 const AdminDashboard = () => {
@@ -22,15 +22,13 @@ const AdminDashboard = () => {
         setLoading(true);
         try {
             // Fetch Loans
-            const loanRes = await api.get('/loan/admin/applications').catch(() => ({ data: [] }));
-            setLoanApps(loanRes.data);
+            setLoanApps(await fetchAllPages('/loan/admin/applications').catch(() => []));
 
             // Fetch Advisory
             // Note: In real app, we'd check which admin is logged in. 
             // For hackathon simplicity, we try to fetch both if backend allows, or just ignore 403.
             try {
-                const advRes = await api.get('/crop-advisory/admin/requests');
-                setAdvisoryReqs(advRes.data);
+                setAdvisoryReqs(await fetchAllPages('/crop-advisory/admin/requests'));
             } catch (e) {
                 console.warn("Could not fetch advisory requests (maybe not admin for it)");
             }
@@ -208,14 +206,20 @@ const AdminDashboard = () => {
                                         <Chip label={req.status} color={req.status === 'ADVISED' ? 'success' : 'default'} />
                                     </TableCell>
                                     <TableCell>
-                                        <Button
-                                            variant="contained"
-                                            size="small"
-                                            color="primary"
-                                            onClick={() => openAdviceDialog(req.id)}
-                                        >
-                                            {req.status === 'ADVISED' ? 'Update Advice' : 'Provide Advice'}
-                                        </Button>
+                                        {req.status === 'PENDING' || req.status === 'ADVISED' ? (
+                                            <Button
+                                                variant="contained"
+                                                size="small"
+                                                color="primary"
+                                                onClick={() => openAdviceDialog(req.id)}
+                                            >
+                                                {req.status === 'ADVISED' ? 'Update Advice' : 'Provide Advice'}
+                                            </Button>
+                                        ) : (
+                                            <Typography variant="caption" color="textSecondary">
+                                                {{ EXPIRED: 'Consent expired', WITHDRAWN: 'Withdrawn by farmer' }[req.status] || 'Closed'}
+                                            </Typography>
+                                        )}
                                     </TableCell>
                                 </TableRow>
                             ))}
@@ -241,10 +245,7 @@ const AdminDashboard = () => {
                                         <Typography variant="subtitle2">{doc.doc_type}</Typography>
                                         <Typography variant="body2">{doc.filename}</Typography>
                                     </Box>
-                                    <Button variant="contained" size="small" onClick={() => {
-                                        const actualFilename = doc.storage_path.split(/[/\\]/).pop();
-                                        window.open(`http://localhost:8000/uploads/${actualFilename}`, '_blank');
-                                    }}>View</Button>
+                                    <Button variant="contained" size="small" onClick={() => window.open(doc.download_url, '_blank')}>View</Button>
                                 </Paper>
                             ))}
                         </Box>
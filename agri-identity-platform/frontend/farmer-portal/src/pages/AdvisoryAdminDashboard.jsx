@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Box, Container, Typography, Paper, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Button, Chip, Dialog, DialogTitle, DialogContent, TextField, DialogActions, Avatar, IconButton } from '@mui/material';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import { toast } from 'react-toastify';
 import { useNavigate } from 'react-router-dom';
 import LogoutIcon from '@mui/icons-material/Logout';
@@ -23,6 +23,10 @@ const glassStyle = {
 
 const gradientBg = 'linear-gradient(135deg, #00695c 0%, #00897b 100%)';
 
+// Requests the admin can still answer (ADVISED = update). WITHDRAWN / EXPIRED are closed.
+const ADVISABLE = ['PENDING', 'ADVISED'];
+const CLOSED_LABELS = { WITHDRAWN: 'Withdrawn by farmer', EXPIRED: 'Consent expired' };
+
 const AdvisoryAdminDashboard = () => {
     const navigate = useNavigate();
     const [advisoryReqs, setAdvisoryReqs] = useState([]);
@@ -35,8 +39,7 @@ const AdvisoryAdminDashboard = () => {
     const fetchData = async () => {
         setLoading(true);
         try {
-            const advRes = await api.get('/crop-advisory/admin/requests');
-            setAdvisoryReqs(advRes.data);
+            setAdvisoryReqs(await fetchAllPages('/crop-advisory/admin/requests'));
         } catch (error) {
             if (error.response?.status === 403) {
                 toast.error("Access Denied: Domain Mismatch.");
@@ -89,8 +92,7 @@ const AdvisoryAdminDashboard = () => {
     const handleViewDoc = async (docId) => {
         try {
             const res = await api.get(`/crop-advisory/admin/document/${docId}`);
-            const actualFilename = res.data.storage_path.split(/[/\\]/).pop();
-            window.open(`http://localhost:8000/uploads/${actualFilename}`, '_blank');
+            window.open(res.data.download_url, '_blank');
         } catch (error) {
             toast.error("Failed to fetch document");
         }
@@ -189,23 +191,27 @@ const AdvisoryAdminDashboard = () => {
                                                 label={req.status}
                                                 sx={{
                                                     fontWeight: 'bold',
-                                                    color: req.status === 'ADVISED' ? '#004d40' : '#e65100',
-                                                    bgcolor: req.status === 'ADVISED' ? '#b2dfdb' : '#ffe0b2'
+                                                    color: req.status === 'ADVISED' ? '#004d40' : ADVISABLE.includes(req.status) ? '#e65100' : '#616161',
+                                                    bgcolor: req.status === 'ADVISED' ? '#b2dfdb' : ADVISABLE.includes(req.status) ? '#ffe0b2' : '#eeeeee'
                                                 }}
                                                 size="small"
                                             />
                                         </TableCell>
                                         <TableCell>
-                                            <Button
-                                                variant="contained"
-                                                size="small"
-                                                color="primary"
-                                                startIcon={req.status === 'ADVISED' ? <EditIcon /> : <SendIcon />}
-                                                onClick={() => openAdviceDialog(req.id)}
-                                                sx={{ borderRadius: 2, bgcolor: '#00695c' }}
-                                            >
-                                                {req.status === 'ADVISED' ? 'Update' : 'Advise'}
-                                            </Button>
+                                            {ADVISABLE.includes(req.status) ? (
+                                                <Button
+                                                    variant="contained"
+                                                    size="small"
+                                                    color="primary"
+                                                    startIcon={req.status === 'ADVISED' ? <EditIcon /> : <SendIcon />}
+                                                    onClick={() => openAdviceDialog(req.id)}
+                                                    sx={{ borderRadius: 2, bgcolor: '#00695c' }}
+                                                >
+                                                    {req.status === 'ADVISED' ? 'Update' : 'Advise'}
+                                                </Button>
+                                            ) : (
+                                                <Typography variant="caption" color="textSecondary">{CLOSED_LABELS[req.status] || 'Closed'}</Typography>
+                                            )}
                                         </TableCell>
                                     </TableRow>
                                 ))}
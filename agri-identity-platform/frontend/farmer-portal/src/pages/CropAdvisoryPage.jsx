@@ -2,7 +2,7 @@
 import React, { useState, useEffect } from 'react';
 import { Box, Container, Typography, Paper, Button, Grid, TextField, MenuItem, Stepper, Step, StepLabel, LinearProgress, Alert, Divider, List, ListItem, ListItemText, ListItemIcon } from '@mui/material';
 import { useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import { motion } from 'framer-motion';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import WarningIcon from '@mui/icons-material/Warning';
@@ -51,8 +51,8 @@ const CropAdvisoryPage = () => {
     const fetchInitialData = async () => {
         try {
             // 1. Fetch Service ID
-            const servicesRes = await api.get('/services/');
-            const cropService = servicesRes.data.find(s => s.client_id === 'CROP_ADVISORY_001');
+            const services = await fetchAllPages('/services/');
+            const cropService = services.find(s => s.client_id === 'CROP_ADVISORY_001');
             if (cropService) {
                 setServiceId(cropService.id);
             } else {
@@ -67,8 +67,8 @@ const CropAdvisoryPage = () => {
             }
 
             // 3. Fetch Documents (For Soil Health)
-            const docRes = await api.get('/documents/');
-            setDocuments(docRes.data.filter(d => d.doc_type === 'SOIL_CARD' || d.doc_type === 'OTHER'));
+            const userDocs = await fetchAllPages('/documents/');
+            setDocuments(userDocs.filter(d => d.doc_type === 'SOIL_CARD' || d.doc_type === 'OTHER'));
 
             setLoading(false);
         } catch (error) {
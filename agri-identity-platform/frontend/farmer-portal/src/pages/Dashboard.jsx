@@ -2,7 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { Box, Typography, Container, Paper, Grid, Button, Divider, List, ListItem, ListItemText, Chip, Avatar, Alert, IconButton } from '@mui/material';
 import { useNavigate } from 'react-router-dom';
 import { motion } from 'framer-motion';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import SecurityIcon from '@mui/icons-material/Security';
 import HistoryIcon from '@mui/icons-material/History';
 import GppGoodIcon from '@mui/icons-material/GppGood';
@@ -52,17 +52,18 @@ const Dashboard = () => {
             });
             if (userRes) setUserData(userRes.data);
 
-            const [logsRes, consentsRes, loanRes, advRes] = await Promise.all([
-                api.get('/user/logs').catch(() => ({ data: [] })),
-                api.get('/oauth/active').catch(() => ({ data: [] })),
-                api.get('/loan/my-applications').catch(() => ({ data: [] })),
-                api.get('/crop-advisory/my-requests').catch(() => ({ data: [] }))
+            // Recent activity shows the newest 5 logs only; the other lists are shown (and counted) in full
+            const [logsRes, consents, loans, advisory] = await Promise.all([
+                api.get('/user/logs', { params: { limit: 5 } }).catch(() => ({ data: { items: [] } })),
+                fetchAllPages('/oauth/active').catch(() => []),
+                fetchAllPages('/loan/my-applications').catch(() => []),
+                fetchAllPages('/crop-advisory/my-requests').catch(() => [])
             ]);
 
-            setLogs(logsRes.data);
-            setConsents(consentsRes.data);
-            setLoanApps(loanRes.data);
-            setAdvisoryReqs(advRes.data);
+            setLogs(logsRes.data.items);
+            setConsents(consents);
+            setLoanApps(loans);
+            setAdvisoryReqs(advisory);
 
         } catch (error) {
             console.error("Dashboard Fetch Error", error);
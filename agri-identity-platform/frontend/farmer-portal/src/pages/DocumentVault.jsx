@@ -1,6 +1,7 @@
 import React, { useEffect, useState } from 'react';
 import { Box, Container, Typography, Paper, Button, List, ListItem, ListItemIcon, ListItemText, Divider, IconButton, CircularProgress, TextField, FormControlLabel, Checkbox, Dialog, DialogTitle, DialogContent, DialogActions, Alert } from '@mui/material';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
+import { uploadResumable } from '../services/resumableUpload';
 import FolderSpecialIcon from '@mui/icons-material/FolderSpecial';
 import UploadFileIcon from '@mui/icons-material/UploadFile';
 import DownloadIcon from '@mui/icons-material/Download';
@@ -11,6 +12,7 @@ import { toast } from 'react-toastify';
 const DocumentVault = () => {
     const [documents, setDocuments] = useState([]);
     const [uploading, setUploading] = useState(false);
+    const [uploadProgress, setUploadProgress] = useState(0);
 
     // Form State
     const [open, setOpen] = useState(false);
@@ -26,8 +28,7 @@ const DocumentVault = () => {
 
     const fetchDocuments = async () => {
         try {
-            const res = await api.get('/documents/');
-            setDocuments(res.data);
+            setDocuments(await fetchAllPages('/documents/'));
         } catch (err) {
             console.error(err);
         }
@@ -68,19 +69,17 @@ const DocumentVault = () => {
             return;
         }
 
-        const formData = new FormData();
-        formData.append('file', selectedFile);
-        formData.append('title', docName);
-        formData.append('doc_type', docType);
-        formData.append('is_sensitive', isSensitive);
-
         setUploading(true);
+        setUploadProgress(0);
         setValidationError("");
 
         try {
-            await api.post('/documents/upload', formData, {
-                headers: { 'Content-Type': 'multipart/form-data' }
-            });
+            // Chunked + resumable, so a dropped connection does not restart the upload from zero
+            await uploadResumable(selectedFile, {
+                title: docName,
+                doc_type: docType,
+                is_sensitive: isSensitive,
+            }, setUploadProgress);
             toast.success("Document Uploaded Successfully!");
             fetchDocuments();
             handleClose();
@@ -94,14 +93,10 @@ const DocumentVault = () => {
 
     const handleDownload = async (doc) => {
         try {
-            const response = await api.get(`/documents/${doc.id}/download`, {
-                responseType: 'blob'
-            });
-
-            // Create Blob URL and trigger download
-            const url = window.URL.createObjectURL(new Blob([response.data]));
+            // Short-lived signed link: the browser downloads straight from storage, not through memory here
+            const response = await api.get(`/documents/${doc.id}/link`);
             const link = document.createElement('a');
-            link.href = url;
+            link.href = response.data.url;
             link.setAttribute('download', doc.filename);
             document.body.appendChild(link);
             link.click();
@@ -156,7 +151,7 @@ const DocumentVault = () => {
                                     </ListItemIcon>
                                     <ListItemText
                                         primary={doc.title}
-                                        secondary={`${doc.doc_type} • ${new Date(doc.created_at).toLocaleString()} ${doc.is_sensitive ? "• Encrypted" : ""}`}
+                                        secondary={`${doc.doc_type} • ${new Date(doc.created_at).toLocaleString()} ${doc.is_sensitive ? "• Encrypted" : ""} ${doc.ingest_status === "RECEIVED" || doc.ingest_status === "PROCESSING" ? "• Processing" : ""}`}
                                     />
                                     <IconButton onClick={() => handleDownload(doc)} color="primary">
                                         <DownloadIcon />
@@ -236,7 +231,7 @@ const DocumentVault = () => {
                         disabled={uploading}
                         startIcon={uploading ? <CircularProgress size={20} color="inherit" /> : null}
                     >
-                        {uploading ? "Uploading..." : "Submit & Upload"}
+                        {uploading ? `Uploading... ${Math.round(uploadProgress * 100)}%` : "Submit & Upload"}
                     </Button>
                 </DialogActions>
             </Dialog>
@@ -1,6 +1,6 @@
 import React, { useState, useEffect } from 'react';
 import { Box, Container, Typography, Paper, Table, TableBody, TableCell, TableContainer, TableHead, TableRow, Button, Chip, Dialog, DialogTitle, DialogContent, DialogActions, Avatar, IconButton } from '@mui/material';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import { toast } from 'react-toastify';
 import { useNavigate } from 'react-router-dom';
 import LogoutIcon from '@mui/icons-material/Logout';
@@ -23,6 +23,31 @@ const glassStyle = {
 
 const gradientBg = 'linear-gradient(135deg, #1b5e20 0%, #43a047 100%)';
 
+/* Preview endpoints need the admin token, so the thumbnail is fetched through the API client */
+const DocumentThumbnail = ({ url }) => {
+    const [src, setSrc] = useState(null);
+
+    useEffect(() => {
+        if (!url) return undefined;
+        let objectUrl = null;
+        let cancelled = false;
+        api.get(url, { responseType: 'blob' })
+            .then((res) => {
+                if (cancelled) return;
+                objectUrl = URL.createObjectURL(res.data);
+                setSrc(objectUrl);
+            })
+            .catch(() => setSrc(null));
+        return () => {
+            cancelled = true;
+            if (objectUrl) URL.revokeObjectURL(objectUrl);
+        };
+    }, [url]);
+
+    if (!src) return <Avatar variant="rounded" sx={{ width: 64, height: 64, bgcolor: '#e8f5e9' }}><DescriptionIcon sx={{ color: '#2e7d32' }} /></Avatar>;
+    return <Box component="img" src={src} alt="" sx={{ width: 64, height: 64, objectFit: 'cover', borderRadius: 1 }} />;
+};
+
 const LoanAdminDashboard = () => {
     const navigate = useNavigate();
     const [loanApps, setLoanApps] = useState([]);
@@ -35,8 +60,7 @@ const LoanAdminDashboard = () => {
     const fetchData = async () => {
         setLoading(true);
         try {
-            const loanRes = await api.get('/loan/admin/applications');
-            setLoanApps(loanRes.data);
+            setLoanApps(await fetchAllPages('/loan/admin/applications'));
         } catch (error) {
             if (error.response?.status === 403) {
                 toast.error("Access Denied: You are not authorized for Loan Services.");
@@ -70,17 +94,36 @@ const LoanAdminDashboard = () => {
     // --- Docs Logic ---
     const [selectedDocs, setSelectedDocs] = useState([]);
     const [viewDocOpen, setViewDocOpen] = useState(false);
+    const [selectedAppId, setSelectedAppId] = useState(null);
 
     const handleViewDocs = async (appId) => {
         try {
             const res = await api.get(`/loan/admin/application/${appId}/documents`);
             setSelectedDocs(res.data);
+            setSelectedAppId(appId);
             setViewDocOpen(true);
         } catch (error) {
             toast.error("Failed to fetch documents.");
         }
     };
 
+    const handleDownloadBundle = async () => {
+        try {
+            // One ZIP of every document, streamed by the server as it is built
+            const res = await api.get(`/loan/admin/application/${selectedAppId}/bundle`, { responseType: 'blob' });
+            const url = window.URL.createObjectURL(res.data);
+            const link = document.createElement('a');
+            link.href = url;
+            link.setAttribute('download', `application-${selectedAppId}-documents.zip`);
+            document.body.appendChild(link);
+            link.click();
+            link.remove();
+            window.URL.revokeObjectURL(url);
+        } catch (error) {
+            toast.error("Failed to download documents.");
+        }
+    };
+
     return (
         <Box sx={{ minHeight: '100vh', background: gradientBg, pt: 4, pb: 8 }}>
             <Container maxWidth="lg">
@@ -220,17 +263,17 @@ const LoanAdminDashboard = () => {
                             <Box sx={{ display: 'flex', flexDirection: 'column', gap: 2 }}>
                                 {selectedDocs.map((doc) => (
                                     <Paper key={doc.id} variant="outlined" sx={{ p: 2, borderRadius: 2, display: 'flex', justifyContent: 'space-between', alignItems: 'center' }}>
-                                        <Box>
-                                            <Typography variant="subtitle2" fontWeight="bold" color="#2e7d32">{doc.doc_type}</Typography>
-                                            <Typography variant="caption" color="textSecondary">{doc.filename}</Typography>
+                                        <Box sx={{ display: 'flex', alignItems: 'center', gap: 2 }}>
+                                            <DocumentThumbnail url={doc.preview_url} />
+                                            <Box>
+                                                <Typography variant="subtitle2" fontWeight="bold" color="#2e7d32">{doc.doc_type}</Typography>
+                                                <Typography variant="caption" color="textSecondary">{doc.filename}</Typography>
+                                            </Box>
                                         </Box>
                                         <Button
                                             variant="contained"
                                             size="small"
-                                            onClick={() => {
-                                                const actualFilename = doc.storage_path.split(/[/\\]/).pop();
-                                                window.open(`http://localhost:8000/uploads/${actualFilename}`, '_blank');
-                                            }}
+                                            onClick={() => window.open(doc.download_url, '_blank')}
                                             sx={{ borderRadius: 4, bgcolor: '#2e7d32' }}
                                         >
                                             View
@@ -241,6 +284,9 @@ const LoanAdminDashboard = () => {
                         )}
                     </DialogContent>
                     <DialogActions sx={{ p: 2 }}>
+                        {selectedDocs.length > 0 && (
+                            <Button onClick={handleDownloadBundle} sx={{ color: '#2e7d32' }}>Download All (ZIP)</Button>
+                        )}
                         <Button onClick={() => setViewDocOpen(false)} color="inherit">Close</Button>
                     </DialogActions>
                 </Dialog>
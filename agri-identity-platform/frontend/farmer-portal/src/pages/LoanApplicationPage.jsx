@@ -2,7 +2,7 @@
 import React, { useState, useEffect } from 'react';
 import { Box, Container, Typography, Paper, Button, Grid, Checkbox, FormControlLabel, Stepper, Step, StepLabel, LinearProgress, Alert, Divider, List, ListItem, ListItemText, ListItemIcon } from '@mui/material';
 import { useNavigate } from 'react-router-dom';
-import api from '../services/api';
+import api, { fetchAllPages } from '../services/api';
 import { motion } from 'framer-motion';
 import CheckCircleIcon from '@mui/icons-material/CheckCircle';
 import WarningIcon from '@mui/icons-material/Warning';
@@ -47,8 +47,7 @@ const LoanApplicationPage = () => {
             setRequirements(reqs);
 
             // 2. Get User Docs
-            const docRes = await api.get('/documents/');
-            const userDocs = docRes.data;
+            const userDocs = await fetchAllPages('/documents/');
             setDocuments(userDocs);
 
             // 3. Check Compliance
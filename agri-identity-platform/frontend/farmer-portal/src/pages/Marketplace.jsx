@@ -2,7 +2,7 @@ import React, { useEffect, useState } from 'react';
 import { useNavigate } from 'react-router-dom';
 import { Box, Container, Typography, Grid, Card, CardContent, CardActions, Button, Chip, Avatar } from '@mui/material';
 import { motion } from 'framer-motion';
-import api from '../services/api';
+import { fetchAllPages } from '../services/api';
 import StorefrontIcon from '@mui/icons-material/Storefront';
 import VerifiedUserIcon from '@mui/icons-material/VerifiedUser';
 
@@ -10,8 +10,8 @@ const Marketplace = () => {
     const [services, setServices] = useState([]);
 
     useEffect(() => {
-        api.get('/services/')
-            .then(res => setServices(res.data))
+        fetchAllPages('/services/')
+            .then(setServices)
             .catch(err => console.error("Err fetching services", err));
     }, []);
 
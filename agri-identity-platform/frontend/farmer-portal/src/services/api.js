@@ -2,6 +2,7 @@ import axios from 'axios';
 
 const api = axios.create({
     baseURL: 'http://localhost:8000/api/v1',
+    withCredentials: true, // Sends the API's last_write cookie, so reads right after a write skip a lagging replica
     headers: {
         'Content-Type': 'application/json',
     },
@@ -33,4 +34,17 @@ api.interceptors.response.use(
     }
 );
 
+// List endpoints return one page ({ items, next_cursor }); follow the cursor where a view needs every row
+export async function fetchAllPages(url, config = {}) {
+    const items = [];
+    let after = null;
+    do {
+        const params = { ...config.params, limit: 200, ...(after ? { after } : {}) };
+        const { data } = await api.get(url, { ...config, params });
+        items.push(...data.items);
+        after = data.next_cursor;
+    } while (after);
+    return items;
+}
+
 export default api;
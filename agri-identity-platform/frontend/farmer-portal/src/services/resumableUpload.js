@@ -0,0 +1,62 @@
+import api from './api';
+
+const CHUNK_SIZE = 512 * 1024; // Small enough to finish between drops on a 2G/3G link
+const MAX_RETRIES = 8;
+const MAX_LEASE_WAIT_MS = 120000; // Server lease is short and renewed only while bytes flow; a stalled PUT of ours frees it well within this
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+// Resumable upload (/documents/uploads): the file goes up in chunks at the server's offset, and
+// after a failure we ask the server where it got to, so only the missing bytes are resent.
+export async function uploadResumable(file, meta, onProgress) {
+    const { data: session } = await api.post('/documents/uploads', {
+        ...meta,
+        filename: file.name,
+        mime_type: file.type || 'application/octet-stream',
+        total_bytes: file.size,
+    });
+
+    let offset = session.offset;
+    let failures = 0;
+    let leaseWaitStart = null;
+    while (offset < file.size) {
+        try {
+            const chunk = file.slice(offset, offset + CHUNK_SIZE);
+            const { data } = await api.put(`/documents/uploads/${session.id}`, chunk, {
+                params: { offset },
+                headers: { 'Content-Type': 'application/octet-stream' },
+            });
+            offset = data.offset;
+            failures = 0;
+            leaseWaitStart = null;
+            if (onProgress) onProgress(offset / file.size);
+        } catch (err) {
+            const status = err.response ? err.response.status : null;
+            const retryAfter = err.response ? Number(err.response.headers['retry-after']) : NaN;
+            // 409 + Retry-After: another PUT (typically our own stalled attempt) still holds the write
+            // lease. That is a wait, not a failure, so it does not use up the retry budget.
+            if (status === 409 && retryAfter > 0) {
+                leaseWaitStart = leaseWaitStart ?? Date.now();
+                if (Date.now() - leaseWaitStart > MAX_LEASE_WAIT_MS) {
+                    throw err;
+                }
+                await sleep(retryAfter * 1000);
+                continue;
+            }
+            // Network errors, 5xx and offset conflicts are retried; anything else is final
+            if ((status && status < 500 && status !== 409) || ++failures > MAX_RETRIES) {
+                throw err;
+            }
+            await sleep(Math.min(1000 * 2 ** failures, 30000));
+            try {
+                const { data } = await api.get(`/documents/uploads/${session.id}`);
+                offset = data.offset;
+            } catch (e) {
+                // Still offline: try the same offset again after the next backoff
+            }
+        }
+    }
+
+    const { data: doc } = await api.post(`/documents/uploads/${session.id}/complete`);
+    return doc;
+}